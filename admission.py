@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+
+MAX_ACTIVE_FLOWS = int(os.environ.get('MAX_ACTIVE_FLOWS', 3))
+MAX_WAITING_FLOWS = int(os.environ.get('MAX_WAITING_FLOWS', 20))
+
+ADMITTED = 'admitted'
+QUEUED = 'queued'
+REJECTED = 'rejected'
+
+
+class AdmissionController:
+    """
+    Caps how many signup flows (live browsers) run at once.
+
+    submit() either admits a chat straight away, parks its start callback in
+    a bounded FIFO, or rejects it when the line is full. When a slot frees up
+    the next waiting chat's callback is handed to `dispatch`, and everyone
+    still waiting is told their new place in line through `on_position`.
+    Slots belong to chats and are released once per chat.
+    """
+
+    def __init__(self, dispatch, on_position=None, max_active=MAX_ACTIVE_FLOWS, max_waiting=MAX_WAITING_FLOWS):
+        self.dispatch = dispatch
+        self.on_position = on_position
+        self.max_active = max(1, max_active)
+        self.max_waiting = max(0, max_waiting)
+        self.admitted = 0
+        self.rejected = 0
+        self._active = set()
+        self._waiting = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, chat_id, start):
+        """Returns ADMITTED (caller runs start now), QUEUED or REJECTED"""
+        with self._lock:
+            if chat_id in self._active:
+                return ADMITTED
+            if len(self._active) < self.max_active and not self._waiting:
+                self._active.add(chat_id)
+                self.admitted += 1
+                return ADMITTED
+            if chat_id not in self._waiting and len(self._waiting) >= self.max_waiting:
+                self.rejected += 1
+                return REJECTED
+            self._waiting[chat_id] = start
+            position = list(self._waiting).index(chat_id) + 1
+        self._notify(chat_id, position)
+        return QUEUED
+
+    def release(self, chat_id):
+        """Free chat_id's slot (or its place in line) and admit whoever is next"""
+        with self._lock:
+            if chat_id in self._waiting:
+                del self._waiting[chat_id]
+            elif chat_id in self._active:
+                self._active.discard(chat_id)
+            else:
+                return False
+        self._admit_waiting()
+        return True
+
+    def _notify(self, chat_id, position):
+        if self.on_position is None:
+            return
+        try:
+            self.on_position(chat_id, position)
+        except Exception as e:
+            print(f"⚠️ Queue position notification failed for {chat_id}: {e}")
+
+    def set_limit(self, max_active):
+        """Change the number of concurrent flows, admitting waiters if it grew"""
+        with self._lock:
+            self.max_active = max(1, max_active)
+        self._admit_waiting()
+
+    def _admit_waiting(self):
+        promoted = []
+        with self._lock:
+            while self._waiting and len(self._active) < self.max_active:
+                next_chat, start = self._waiting.popitem(last=False)
+                self._active.add(next_chat)
+                self.admitted += 1
+                promoted.append((next_chat, start))
+            positions = list(enumerate(self._waiting, start=1))
+        for next_chat, start in promoted:
+            self.dispatch(next_chat, start)
+        for position, waiting_chat in positions:
+            self._notify(waiting_chat, position)
+
+    def holds(self, chat_id):
+        """True while chat_id has a flow running or waiting in line"""
+        with self._lock:
+            return chat_id in self._active or chat_id in self._waiting
+
+    def ready(self):
+        """True while this instance can still take new flows (slot or room in line)"""
+        with self._lock:
+            return len(self._active) < self.max_active or len(self._waiting) < self.max_waiting
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'waiting': len(self._waiting),
+                'max_active': self.max_active,
+                'max_waiting': self.max_waiting,
+                'available': max(0, self.max_active - len(self._active)),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
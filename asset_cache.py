@@ -0,0 +1,332 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import metrics
+
+# Shared by every context and browser in the process; ASSET_CACHE_MAX_MB=0 disables it
+ASSET_CACHE_DIR = os.environ.get(
+    'ASSET_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache/automate/assets')
+)
+ASSET_CACHE_MAX_MB = float(os.environ.get('ASSET_CACHE_MAX_MB', 200))
+# Bodies larger than this are always fetched from the network
+ASSET_CACHE_MAX_ENTRY_MB = float(os.environ.get('ASSET_CACHE_MAX_ENTRY_MB', 10))
+
+CACHEABLE_TYPES = {'script', 'stylesheet', 'font', 'image'}
+
+# Hop-by-hop or encoding headers that no longer match the decoded body we store
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+ASSET_CACHE_REQUESTS = metrics.counter('asset_cache_requests_total', 'Static asset requests by cache result (hit, miss, bypass, error)')
+ASSET_CACHE_BYTES_SAVED = metrics.counter('asset_cache_bytes_saved_total', 'Response bytes served from the asset cache')
+
+_MAX_AGE = re.compile(r'(?:^|,)\s*(s-maxage|max-age)\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+def freshness_lifetime(headers):
+    """Seconds a response may be reused for, or None if it must not be cached"""
+    cache_control = headers.get('cache-control', '').lower()
+    if any(d in cache_control for d in ('no-store', 'no-cache', 'private')):
+        return None
+    vary = headers.get('vary', '').lower()
+    if vary and any(v.strip() not in ('accept-encoding', 'origin') for v in vary.split(',')):
+        return None
+
+    lifetime = None
+    ages = dict((name.lower(), int(value)) for name, value in _MAX_AGE.findall(cache_control))
+    if 's-maxage' in ages:
+        lifetime = ages['s-maxage']
+    elif 'max-age' in ages:
+        lifetime = ages['max-age']
+    elif 'expires' in headers:
+        from email.utils import parsedate_to_datetime
+        try:
+            lifetime = parsedate_to_datetime(headers['expires']).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    if lifetime is None:
+        return None
+
+    try:
+        lifetime -= int(headers.get('age', 0))
+    except ValueError:
+        pass
+    return lifetime if lifetime > 0 else None
+
+
+class AssetCache:
+    """
+    Size-bounded, LRU-evicted store of static responses on disk.
+
+    Each entry is one file: a JSON metadata line followed by the body. Files
+    are written to a temporary name and renamed into place, so readers in
+    other threads always see a complete entry or none at all; a file evicted
+    while someone is reading it stays readable until they close it.
+    """
+
+    def __init__(self, directory=ASSET_CACHE_DIR, max_bytes=int(ASSET_CACHE_MAX_MB * 1024 * 1024),
+                 max_entry_bytes=int(ASSET_CACHE_MAX_ENTRY_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self._index = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from what previous runs left on disk"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        for _mtime, name, size in sorted(entries):
+            self._index[name] = size
+            self._size += size
+        self._evict()
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, url):
+        """(status, headers, body) of a fresh entry for url, or None"""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            self._forget(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        if meta.get('url') != url or meta.get('expires', 0) < time.time() or len(body) != meta.get('size'):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(body)
+        return meta['status'], meta['headers'], body
+
+    def put(self, url, status, headers, body):
+        """Store a response if its headers allow it; returns True when stored"""
+        lifetime = freshness_lifetime(headers)
+        if status != 200 or lifetime is None or len(body) > self.max_entry_bytes:
+            return False
+        key = self._key(url)
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+            'expires': time.time() + lifetime,
+            'size': len(body),
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b'\n')
+                f.write(body)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not cache {url}: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            size = self._index.pop(key, None)
+            if size is not None:
+                self._size -= size
+
+    def _evict(self):
+        # Caller holds the lock (or is still constructing the cache)
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+            }
+
+
+def is_cacheable_request(request):
+    return request.method == 'GET' and request.resource_type in CACHEABLE_TYPES
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_asset_cache():
+    """The process-wide cache, created on first use; None when disabled"""
+    global _shared_cache
+    if ASSET_CACHE_MAX_MB <= 0:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = AssetCache()
+            except OSError as e:
+                print(f"⚠️ Asset cache disabled: {e}")
+                return None
+            metrics.gauge('asset_cache_bytes', 'Bytes held in the on-disk asset cache', lambda: _shared_cache.stats()['bytes'])
+        return _shared_cache
+
+
+def _unresolved(route):
+    """Let the browser load a request we could not fetch, or abort it once its page is gone"""
+    try:
+        route.fallback()
+    except Exception:
+        try:
+            route.abort()
+        except Exception:
+            pass
+
+
+async def _unresolved_async(route):
+    try:
+        await route.fallback()
+    except Exception:
+        try:
+            await route.abort()
+        except Exception:
+            pass
+
+
+def install_asset_cache(context, stats, cache=None):
+    """Serve cacheable static requests of context from the shared cache"""
+    cache = cache or get_asset_cache()
+    if cache is None:
+        return None
+
+    def handle(route):
+        request = route.request
+        if not is_cacheable_request(request):
+            route.fallback()
+            return
+        cached = cache.get(request.url)
+        if cached is not None:
+            status, headers, body = cached
+            stats.record_cache_hit(len(body))
+            ASSET_CACHE_REQUESTS.inc(result='hit')
+            ASSET_CACHE_BYTES_SAVED.inc(len(body))
+            try:
+                route.fulfill(status=status, headers=headers, body=body)
+            except Exception:
+                # The page closed under us; nothing is waiting for the answer
+                pass
+            return
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception as e:
+            # Network error, timeout or closed page: never leave the request hanging
+            print(f"⚠️ Asset fetch failed for {request.url}: {e}")
+            ASSET_CACHE_REQUESTS.inc(result='error')
+            _unresolved(route)
+            return
+        stored = cache.put(request.url, response.status, response.headers, body)
+        stats.record_cache_miss()
+        ASSET_CACHE_REQUESTS.inc(result='miss' if stored else 'bypass')
+        try:
+            route.fulfill(response=response, body=body)
+        except Exception:
+            pass
+
+    context.route('**/*', handle)
+    return cache
+
+
+async def install_asset_cache_async(context, stats, cache=None):
+    """install_asset_cache for playwright.async_api contexts"""
+    cache = cache or get_asset_cache()
+    if cache is None:
+        return None
+
+    async def handle(route):
+        request = route.request
+        if not is_cacheable_request(request):
+            await route.fallback()
+            return
+        cached = cache.get(request.url)
+        if cached is not None:
+            status, headers, body = cached
+            stats.record_cache_hit(len(body))
+            ASSET_CACHE_REQUESTS.inc(result='hit')
+            ASSET_CACHE_BYTES_SAVED.inc(len(body))
+            try:
+                await route.fulfill(status=status, headers=headers, body=body)
+            except Exception:
+                pass
+            return
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception as e:
+            print(f"⚠️ Asset fetch failed for {request.url}: {e}")
+            ASSET_CACHE_REQUESTS.inc(result='error')
+            await _unresolved_async(route)
+            return
+        stored = cache.put(request.url, response.status, response.headers, body)
+        stats.record_cache_miss()
+        ASSET_CACHE_REQUESTS.inc(result='miss' if stored else 'bypass')
+        try:
+            await route.fulfill(response=response, body=body)
+        except Exception:
+            pass
+
+    await context.route('**/*', handle)
+    return cache
@@ -0,0 +1,423 @@
+import os
+import time
+import asyncio
+import threading
+from playwright.async_api import async_playwright
+from browser_pool import (
+    BROWSER_POOL_SIZE, BROWSER_MAX_CONTEXTS, CONTEXT_OPTIONS,
+    BrowserLaunchError, PooledBrowser, launch_attempts, launch_failed,
+)
+from memory_budget import memory_monitor
+import tracing
+from failure_capture import watch_context_async, capture_async as capture_failure_async
+from resource_blocking import install_resource_blocking_async
+from metrics import step_timer
+from navigation_cache import navigation_cache
+from prewarm import prewarm_cache
+import create_account
+import engine_probe
+from create_account import (
+    STEP_TIMEOUTS, SIGNUP_HOME_URL, browser_sessions, shortcut_plan, signup_path_plan, email_plan, otp_plan,
+    flow_result, otp_session, otp_outcome, step1_failure, otp_failure,
+)
+from step_plan import StepFailed, PlanRun, run_plan_async
+
+ASYNC_POOL_HEALTH_INTERVAL = float(os.environ.get('ASYNC_POOL_HEALTH_INTERVAL', 30))
+
+
+class AsyncBrowserLease:
+    """
+    A context from the async pool.
+
+    release() is safe to call from any thread (session eviction does); the
+    context itself is closed on the engine's event loop.
+    """
+
+    def __init__(self, pool, pooled, context):
+        self.pool = pool
+        self.pooled = pooled
+        self.context = context
+        self.released = False
+
+    @property
+    def browser(self):
+        return self.pooled.browser
+
+    async def aclose(self):
+        await self.pool.release(self)
+
+    def release(self):
+        self.pool.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.aclose()))
+
+
+class AsyncBrowserPool:
+    """
+    BrowserPool for playwright.async_api; lives on a single event loop.
+
+    As with BrowserPool, warm() and check_health() launch browsers and
+    acquire() only launches one when nothing usable is left.
+    """
+
+    def __init__(self, loop, size=BROWSER_POOL_SIZE, max_contexts=BROWSER_MAX_CONTEXTS, executable_path=None, engine=None):
+        self.loop = loop
+        self.size = max(1, size)
+        self.max_contexts = max(1, max_contexts)
+        self.executable_path = executable_path
+        self.engine = engine
+        self._playwright = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+        self.launches = 0
+        self.cold_launches = 0
+        self.replacements = 0
+        self.recycled = 0
+
+    async def start(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+        return self
+
+    async def warm(self):
+        await self.start()
+        await self.check_health()
+        return self
+
+    def retarget(self, choice):
+        """BrowserPool.retarget for the current engine choice (None before the first probe)"""
+        if choice is None or (choice['engine'], choice['path']) == (self.engine, self.executable_path):
+            return
+        print(f"🔀 Async browser pool switching to {choice['engine'] or 'guess-and-fallback'} ({choice['path'] or 'bundled'})")
+        self.executable_path = choice['path']
+        self.engine = choice['engine']
+        for pooled in self._usable():
+            pooled.retired = True
+
+    async def _launch_browser(self):
+        attempts = launch_attempts(self.engine, self.executable_path)
+        for index, (engine, kwargs, marker, note) in enumerate(attempts):
+            if note:
+                print(note)
+            try:
+                browser = await getattr(self._playwright, engine).launch(**kwargs)
+            except Exception as e:
+                error = launch_failed(self.engine, attempts, index, e)
+                if error is not None:
+                    raise error
+                continue
+            self.launches += 1
+            return PooledBrowser(browser, engine, marker)
+
+    def _usable(self):
+        return [b for b in self._browsers if not b.retired]
+
+    async def _fill(self):
+        while len(self._usable()) < self.size:
+            if memory_monitor.ceiling_exceeded():
+                return
+            self._browsers.append(await self._launch_browser())
+
+    async def _close_browser(self, pooled):
+        try:
+            await pooled.browser.close()
+        except Exception:
+            pass
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+
+    async def _prune(self):
+        for pooled in list(self._browsers):
+            if not pooled.is_healthy():
+                print(f"⚠️ Pooled {pooled.engine} browser disconnected, replacing it")
+                self.replacements += 1
+                await self._close_browser(pooled)
+            elif pooled.retired and pooled.active == 0:
+                await self._close_browser(pooled)
+
+    async def check_health(self):
+        if self._playwright is None:
+            return
+        async with self._lock:
+            await self._prune()
+            await self._fill()
+
+    async def acquire(self):
+        refused = memory_monitor.ceiling_exceeded()
+        if refused:
+            raise BrowserLaunchError(refused)
+        await self.start()
+
+        async with self._lock:
+            await self._prune()
+            candidates = self._usable()
+            if not candidates:
+                self.cold_launches += 1
+                candidates = [await self._launch_browser()]
+                self._browsers.extend(candidates)
+            pooled = min(candidates, key=lambda b: b.active)
+            pooled.served += 1
+            pooled.active += 1
+            if pooled.served >= self.max_contexts:
+                pooled.retired = True
+                self.recycled += 1
+
+        try:
+            context = await pooled.browser.new_context(**CONTEXT_OPTIONS)
+        except Exception:
+            pooled.active -= 1
+            raise
+        lease = AsyncBrowserLease(self, pooled, context)
+        memory_monitor.track(lease)
+        return lease
+
+    async def release(self, lease):
+        if lease.released:
+            return
+        lease.released = True
+        try:
+            await lease.context.close()
+        except Exception:
+            pass
+
+        pooled = lease.pooled
+        pooled.active = max(0, pooled.active - 1)
+        if pooled.retired and pooled.active == 0:
+            print(f"🔄 Recycling {pooled.engine} browser after {pooled.served} contexts")
+            await self._close_browser(pooled)
+
+    def stats(self):
+        return {
+            'browsers': len(self._browsers),
+            'active_contexts': sum(b.active for b in self._browsers),
+            'launches': self.launches,
+            'cold_launches': self.cold_launches,
+            'replacements': self.replacements,
+            'recycled': self.recycled,
+        }
+
+
+class SignupEngine:
+    """Event loop thread that drives every async signup flow"""
+
+    def __init__(self):
+        self.loop = None
+        self.pool = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name='signup-engine', daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run_loop(self):
+        # Probing uses sync Playwright, which must not see a running loop
+        choice = create_account.get_browser_choice()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pool = AsyncBrowserPool(self.loop, executable_path=choice['path'], engine=choice['engine'])
+        self.loop.create_task(self._maintain_pool())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _maintain_pool(self):
+        # Warm straight away, then replace crashed and recycled browsers between flows
+        while True:
+            try:
+                self.pool.retarget(engine_probe.current_choice())
+                await self.pool.warm()
+            except Exception as e:
+                print(f"⚠️ Async pool health check error: {e}")
+            await asyncio.sleep(ASYNC_POOL_HEALTH_INTERVAL)
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and block until it finishes"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+engine = SignupEngine()
+
+# Pools for callers driving flows from their own event loop
+_loop_pools = {}
+
+
+async def get_async_pool():
+    """Return the pool bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    if engine.loop is loop:
+        return engine.pool
+    pool = _loop_pools.get(loop)
+    if pool is None:
+        # A cold probe drives sync Playwright, which refuses to run on a thread with a running loop
+        choice = await loop.run_in_executor(None, create_account.get_browser_choice)
+        pool = _loop_pools.setdefault(
+            loop, AsyncBrowserPool(loop, executable_path=choice['path'], engine=choice['engine'])
+        )
+    return pool
+
+
+async def _reach_email_form(run):
+    """create_account._reach_email_form for the async engine"""
+    shortcut_url = navigation_cache.get(SIGNUP_HOME_URL)
+    if shortcut_url is not None:
+        started = time.perf_counter()
+        try:
+            await run_plan_async(run, shortcut_plan(shortcut_url))
+            saved = navigation_cache.record_hit(SIGNUP_HOME_URL, time.perf_counter() - started)
+            print(f"⚡ Jumped straight to the email form (saved ~{saved:.1f}s)")
+            return
+        except StepFailed as e:
+            print(f"⚠️ Cached signup URL failed, taking the full path: {e}")
+            navigation_cache.record_miss(SIGNUP_HOME_URL, time.perf_counter() - started)
+
+    path_started = time.perf_counter()
+    await run_plan_async(run, signup_path_plan())
+    navigation_cache.store(SIGNUP_HOME_URL, run.page.url, time.perf_counter() - path_started)
+
+
+async def _open_signup_context(pool):
+    """create_account._open_signup_context for the async engine"""
+    with step_timer('step1', 'launch'):
+        pool.retarget(engine_probe.current_choice())
+        lease = await pool.acquire()
+
+    context = lease.context
+    context.set_default_timeout(STEP_TIMEOUTS['default'])
+    route_stats = await install_resource_blocking_async(context)
+    page = await context.new_page()
+    console = await watch_context_async(context)
+
+    page.on("popup", lambda popup: print(f"Popup opened: {popup.url}"))
+    context.on("dialog", lambda dialog: dialog.accept())
+
+    return {
+        'lease': lease,
+        'browser': lease.browser,
+        'context': context,
+        'route_stats': route_stats,
+        'console': console,
+        'run': PlanRun(context, page, 'step1'),
+    }
+
+
+async def async_prewarm_signup(user_id, pool=None):
+    """create_account.prewarm_signup for the async engine"""
+    tracing.begin(user_id)
+    if not prewarm_cache.reserve():
+        return False
+
+    try:
+        session = await _open_signup_context(pool or await get_async_pool())
+    except BrowserLaunchError as e:
+        print(f"⚠️ Prewarm for {user_id} skipped: {e}")
+        prewarm_cache.abandon()
+        return False
+
+    try:
+        await _reach_email_form(session['run'])
+    except Exception as e:
+        print(f"⚠️ Prewarm for {user_id} failed, step 1 will start from scratch: {e}")
+        await session['lease'].aclose()
+        prewarm_cache.abandon()
+        return False
+
+    prewarm_cache.put(user_id, session)
+    print(f"🔥 Browser parked on the email form for {user_id}")
+    return True
+
+
+async def async_run_uber_signup_step1(email, user_id, pool=None):
+    """
+    Step 1 (async): Navigate to signup, enter email, reach OTP page
+    Keep the context alive in browser_sessions for Step 2
+    """
+    # Tasks get their own context, so bind the trace step 1's caller started
+    tracing.begin(user_id)
+    print(f"🚀 Step 1: Starting automation for email: {email}")
+
+    session = prewarm_cache.take(user_id)
+    prewarmed = session is not None
+    if prewarmed:
+        print("🔥 Using the browser prewarmed on /create")
+    else:
+        try:
+            session = await _open_signup_context(pool or await get_async_pool())
+        except BrowserLaunchError as e:
+            return flow_result("unavailable", str(e))
+
+    lease = session['lease']
+    run = session['run']
+    try:
+        if not prewarmed:
+            await _reach_email_form(run)
+
+        if await run_plan_async(run, email_plan(email)) == 'captcha_required':
+            print("⚠️ CAPTCHA detected")
+            await lease.aclose()
+            return flow_result("captcha_required", "CAPTCHA verification required", session)
+
+        print("🎉 OTP fields appeared! Ready for real OTP...")
+
+        browser_sessions[user_id] = otp_session(session)
+
+        return flow_result("otp_ready", "Reached OTP page successfully", session)
+
+    except Exception as e:
+        result = step1_failure(e, session)
+        await capture_failure_async('step1', user_id, result, run, session['console'])
+        await lease.aclose()
+        return result
+
+
+async def async_run_uber_signup_step2(otp_code, user_id):
+    """
+    Step 2 (async): Enter real OTP and complete signup
+    Use existing browser session from Step 1
+    """
+    tracing.begin(user_id)
+    print(f"🚀 Step 2: Starting with real OTP: {otp_code}")
+
+    session = browser_sessions.get(user_id)
+    if session is None:
+        return flow_result("error", "No active browser session found")
+
+    run = PlanRun(session['context'], session['page'], 'step2', history=session.get('history'))
+    try:
+        print("📍 Step 2: Entering real OTP digits...")
+
+        await run_plan_async(run, otp_plan(otp_code))
+        return otp_outcome(run.page.url, session)
+
+    except Exception as e:
+        result = otp_failure(e)
+        await capture_failure_async('step2', user_id, result, run, session.get('console'))
+        return result
+
+    finally:
+        print("🔄 Cleaning up browser session...")
+        try:
+            browser_sessions.pop(user_id)
+            await session['lease'].aclose()
+            print("✅ Browser session cleaned up")
+        except Exception:
+            pass
+
+
+def run_uber_signup_step1(email, user_id):
+    """Sync wrapper: run async step 1 on the shared engine loop"""
+    return engine.run(async_run_uber_signup_step1(email, user_id))
+
+
+def run_uber_signup_step2(otp_code, user_id):
+    """Sync wrapper: run async step 2 on the shared engine loop"""
+    return engine.run(async_run_uber_signup_step2(otp_code, user_id))
+
+
+def prewarm_signup(user_id):
+    """Sync wrapper: run the speculative step 1 prefix on the shared engine loop"""
+    return engine.run(async_prewarm_signup(user_id))
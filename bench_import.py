@@ -0,0 +1,82 @@
+"""
+Measure cold import time of the bot modules.
+
+    python bench_import.py --runs 10
+
+Each run is a fresh interpreter. "lazy" imports the module as shipped; "eager"
+also pulls in what used to load at import time (Playwright, http.server and
+the browser executable lookup) to show what deferring them saves. The lookup
+runs with ENGINE_PROBE=0 so it only globs for executables like it used to,
+without launching browsers.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+EAGER_EXTRAS = (
+    "import playwright.sync_api, http.server; "
+    "import engine_probe; engine_probe.get_browser_choice()"
+)
+
+
+def time_import(module, eager, env):
+    code = f"import time; t = time.perf_counter(); import {module}; "
+    if eager:
+        code += EAGER_EXTRAS + "; "
+    code += "print(time.perf_counter() - t)"
+    if eager:
+        env = dict(env, ENGINE_PROBE='0')
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(module, env, limit=10):
+    """Slowest cumulative imports from python -X importtime"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         env=env, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative), name))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark import time of the bot')
+    parser.add_argument('--module', default='telbot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', default=None)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    # telebot validates the token format when the bot object is created
+    env.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench-import-token')
+
+    report = {'module': args.module, 'runs': args.runs}
+    for mode in ('lazy', 'eager'):
+        samples = [time_import(args.module, mode == 'eager', env) for _ in range(args.runs)]
+        report[mode] = {'median_ms': statistics.median(samples) * 1000, 'min_ms': min(samples) * 1000}
+    report['saved_ms'] = report['eager']['median_ms'] - report['lazy']['median_ms']
+
+    print(f"⏱️ import {args.module} ({args.runs} runs)")
+    print(f"   lazy:  {report['lazy']['median_ms']:.0f} ms median")
+    print(f"   eager: {report['eager']['median_ms']:.0f} ms median")
+    print(f"   saved: {report['saved_ms']:.0f} ms")
+    print("\nSlowest imports (cumulative µs):")
+    for cumulative, name in top_imports(args.module, env):
+        print(f"   {cumulative:>9}  {name}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
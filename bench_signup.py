@@ -0,0 +1,171 @@
+"""
+Benchmark create_account against the offline fixture site.
+
+    python bench_signup.py --flows 40 --concurrency 8 --latency-ms 50
+    python bench_signup.py --engine async --concurrency 32 --json results.json
+
+Reports p50/p95/p99 per step, throughput and peak RSS of the process tree
+(this process plus its Playwright drivers and browsers).
+"""
+import os
+import sys
+import json
+import math
+import time
+import queue
+import argparse
+import threading
+
+from fixture_site import FixtureSite, add_fixture_arguments, fixture_config_from_args
+from process_memory import process_tree_rss
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile: the smallest value with at least pct% of the values at or below it"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RssSampler:
+    """Samples the RSS of this process tree in the background"""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss())
+        return self.peak
+
+
+def run_benchmark(flows, concurrency, otp='1234'):
+    # Imported here so SIGNUP_* environment set by main() is picked up
+    import metrics
+    from create_account import run_uber_signup_step1, run_uber_signup_step2
+
+    durations = {}
+    statuses = {}
+    lock = threading.Lock()
+
+    def listener(flow, step, seconds):
+        with lock:
+            durations.setdefault((flow, step), []).append(seconds)
+
+    metrics.step_listeners.append(listener)
+
+    jobs = queue.Queue()
+    for i in range(flows):
+        jobs.put(i)
+
+    def worker():
+        while True:
+            try:
+                i = jobs.get_nowait()
+            except queue.Empty:
+                return
+            user_id = f"bench-{i}"
+            result = run_uber_signup_step1(email=f"bench{i}@example.com", user_id=user_id)
+            outcome = [result['status']]
+            if result['status'] == 'otp_ready':
+                result2 = run_uber_signup_step2(otp_code=otp, user_id=user_id)
+                outcome.append(result2['status'])
+            with lock:
+                key = ' -> '.join(outcome)
+                statuses[key] = statuses.get(key, 0) + 1
+
+    sampler = RssSampler().start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"bench-{n}") for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    peak_rss = sampler.stop()
+    metrics.step_listeners.remove(listener)
+
+    steps = {}
+    for (flow, step), values in sorted(durations.items()):
+        steps[f"{flow}.{step}"] = {
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+        }
+
+    return {
+        'flows': flows,
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'throughput_flows_per_second': flows / elapsed if elapsed else 0.0,
+        'peak_rss_bytes': peak_rss,
+        'statuses': statuses,
+        'steps': steps,
+    }
+
+
+def print_report(report):
+    print(f"\n📊 {report['flows']} flows at concurrency {report['concurrency']} "
+          f"in {report['elapsed_seconds']:.1f}s")
+    print(f"   Throughput: {report['throughput_flows_per_second']:.2f} flows/s")
+    print(f"   Peak RSS:   {report['peak_rss_bytes'] / (1024 * 1024):.0f} MiB")
+    print(f"   Outcomes:   {report['statuses']}")
+    print(f"\n{'step':<28}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in report['steps'].items():
+        print(f"{name:<28}{s['count']:>6}{s['p50'] * 1000:>10.0f}{s['p95'] * 1000:>10.0f}{s['p99'] * 1000:>10.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the signup engine against the fixture site')
+    parser.add_argument('--flows', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--profile', default=None, help='resource blocking profile (RESOURCE_PROFILE)')
+    parser.add_argument('--url', default=None, help='benchmark an already running site instead')
+    parser.add_argument('--json', default=None, help='also write the report to this file')
+    add_fixture_arguments(parser)
+    args = parser.parse_args(argv)
+
+    site = None
+    url = args.url
+    if url is None:
+        site = FixtureSite(fixture_config_from_args(args)).start()
+        url = site.url
+        print(f"🧪 Fixture site on {url}")
+
+    os.environ['SIGNUP_HOME_URL'] = url
+    os.environ['SIGNUP_ENGINE'] = args.engine
+    if args.profile:
+        os.environ['RESOURCE_PROFILE'] = args.profile
+
+    try:
+        report = run_benchmark(args.flows, args.concurrency)
+    finally:
+        if site is not None:
+            site.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
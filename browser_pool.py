@@ -0,0 +1,326 @@
+import os
+import time
+import itertools
+import threading
+from collections import deque
+from memory_budget import memory_monitor
+
+# Browsers kept warm by EACH thread that drives flows (see get_browser_pool): with the
+# sync engine the bot runs UPDATE_WORKERS x BROWSER_POOL_SIZE browsers in total
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_CONTEXTS = int(os.environ.get('BROWSER_MAX_CONTEXTS', 50))
+
+# Extra switches for memory tuning, e.g. CHROMIUM_EXTRA_ARGS="--renderer-process-limit=2"
+CHROMIUM_ARGS = ['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'] + os.environ.get('CHROMIUM_EXTRA_ARGS', '').split()
+FIREFOX_ARGS = ['--no-sandbox', '--disable-dev-shm-usage']
+
+CONTEXT_OPTIONS = {
+    'accept_downloads': True,
+    'has_touch': False,
+    'ignore_https_errors': False,
+    'viewport': {'width': 1280, 'height': 800},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+}
+
+
+class BrowserLaunchError(Exception):
+    """Raised when no browser engine could be launched"""
+
+
+_launch_ids = itertools.count(1)
+
+
+def launch_marker():
+    """Inert Chromium switch that lets us find a browser's processes in /proc"""
+    return f"--automate-browser={os.getpid()}-{next(_launch_ids)}"
+
+
+def launch_options(engine, executable_path=None):
+    """(launch kwargs, marker) for engine; only Chromium gets a marker, Firefox rejects unknown switches"""
+    if engine == 'firefox':
+        kwargs, marker = {'headless': True, 'args': list(FIREFOX_ARGS)}, None
+    else:
+        marker = launch_marker()
+        kwargs = {'headless': True, 'args': CHROMIUM_ARGS + [marker]}
+    if executable_path:
+        kwargs['executable_path'] = executable_path
+    return kwargs, marker
+
+
+def chosen_engine_failed(engine, executable_path, error):
+    """BrowserLaunchError for a probed engine that no longer launches; it is re-probed in the background"""
+    import engine_probe
+    engine_probe.invalidate(engine, executable_path)
+    return BrowserLaunchError(f"Could not launch {engine}: {error}")
+
+
+def launch_attempts(engine=None, executable_path=None):
+    """
+    [(engine, launch kwargs, marker, note)] to try in order: the probed
+    engine alone, or the engine guessed from the executable path followed
+    by Playwright's own Firefox. Shared by the sync and async pools.
+    """
+    if engine is not None:
+        return [(engine, *launch_options(engine, executable_path), None)]
+    path = executable_path
+    if path and "chrome" in path:
+        first = ('chromium', *launch_options('chromium', path), f"📍 Launching Chrome browser from: {path}")
+    elif path and "firefox" in path:
+        first = ('firefox', *launch_options('firefox', path), f"📍 Launching Firefox browser from: {path}")
+    else:
+        first = ('chromium', *launch_options('chromium'), "📍 Launching default browser")
+    return [first, ('firefox', *launch_options('firefox'), "📍 Trying Firefox as fallback...")]
+
+
+def launch_failed(engine, attempts, index, error):
+    """Log a failed attempt; returns the BrowserLaunchError to raise, or None to try the next one"""
+    if engine is not None:
+        print(f"❌ Browser launch error: {error}")
+        return chosen_engine_failed(engine, attempts[index][1].get('executable_path'), error)
+    if index + 1 < len(attempts):
+        print(f"❌ Browser launch error: {error}")
+        return None
+    print(f"❌ Firefox fallback also failed: {error}")
+    return BrowserLaunchError(f"Could not launch any browser: {str(error)}")
+
+
+class PooledBrowser:
+    """A pre-launched browser and its usage counters"""
+
+    def __init__(self, browser, engine, marker=None):
+        self.browser = browser
+        self.engine = engine
+        # Only Chromium gets a marker; Firefox rejects unknown switches
+        self.marker = marker
+        self.pid = None
+        self.launched_at = time.time()
+        self.served = 0
+        self.active = 0
+        self.retired = False
+
+    def is_healthy(self):
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class BrowserLease:
+    """An isolated context handed out by the pool"""
+
+    def __init__(self, pool, pooled, context):
+        self.pool = pool
+        self.pooled = pooled
+        self.context = context
+        self.released = False
+
+    @property
+    def browser(self):
+        return self.pooled.browser
+
+    def release(self):
+        self.pool.release(self)
+
+
+class BrowserPool:
+    """
+    Keeps a number of launched browsers warm and hands out fresh contexts.
+
+    Sync Playwright objects are bound to the thread that created them, so a
+    pool must only be used from its owning thread (see get_browser_pool).
+    Leases released from any other thread are queued and closed by the owner
+    on its next acquire() or check_health().
+
+    Browsers are launched by warm() and check_health(), which the owner
+    calls while idle; acquire() only launches one itself when the pool has
+    no usable browser at all.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_contexts=BROWSER_MAX_CONTEXTS, executable_path=None, engine=None):
+        self.size = max(1, size)
+        self.max_contexts = max(1, max_contexts)
+        self.executable_path = executable_path
+        # Set when engine_probe picked one; otherwise guessed from the path with a Firefox fallback
+        self.engine = engine
+        self._playwright = None
+        self._browsers = []
+        self._pending_releases = deque()
+        self.owner = threading.get_ident()
+        self.launches = 0
+        self.cold_launches = 0
+        self.replacements = 0
+        self.recycled = 0
+
+    def start(self):
+        if self._playwright is None:
+            # Deferred so importing the bot doesn't pay for Playwright
+            from playwright.sync_api import sync_playwright
+            self._playwright = sync_playwright().start()
+        return self
+
+    def warm(self):
+        """Start Playwright and launch browsers up to the pool size (call while idle)"""
+        self.start()
+        self.check_health()
+        return self
+
+    def retarget(self, executable_path, engine):
+        """Launch this engine from now on; browsers of the old one close once drained"""
+        if (engine, executable_path) == (self.engine, self.executable_path):
+            return
+        print(f"🔀 Browser pool switching to {engine or 'guess-and-fallback'} ({executable_path or 'bundled'})")
+        self.executable_path = executable_path
+        self.engine = engine
+        for pooled in self._usable():
+            pooled.retired = True
+
+    def _launch_browser(self):
+        """Launch one browser: the probed engine, else the detected executable with a Firefox fallback"""
+        attempts = launch_attempts(self.engine, self.executable_path)
+        for index, (engine, kwargs, marker, note) in enumerate(attempts):
+            if note:
+                print(note)
+            try:
+                browser = getattr(self._playwright, engine).launch(**kwargs)
+            except Exception as e:
+                error = launch_failed(self.engine, attempts, index, e)
+                if error is not None:
+                    raise error
+                continue
+            self.launches += 1
+            return PooledBrowser(browser, engine, marker)
+
+    def _usable(self):
+        return [b for b in self._browsers if not b.retired]
+
+    def _fill(self):
+        """Top the pool up to its configured number of usable browsers"""
+        while len(self._usable()) < self.size:
+            if memory_monitor.ceiling_exceeded():
+                # Launching more would only push the process further over
+                return
+            self._browsers.append(self._launch_browser())
+
+    def _close_browser(self, pooled):
+        try:
+            pooled.browser.close()
+        except Exception:
+            pass
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+
+    def _prune(self):
+        """Close pending releases, crashed browsers and drained retired ones"""
+        self._drain_pending_releases()
+        for pooled in list(self._browsers):
+            if not pooled.is_healthy():
+                print(f"⚠️ Pooled {pooled.engine} browser disconnected, replacing it")
+                self.replacements += 1
+                self._close_browser(pooled)
+            elif pooled.retired and pooled.active == 0:
+                self._close_browser(pooled)
+
+    def check_health(self):
+        """Prune the pool and launch replacements (call while idle, not on the request path)"""
+        if self._playwright is None:
+            return
+        self._prune()
+        self._fill()
+
+    def acquire(self):
+        """Return a BrowserLease holding a brand new context"""
+        refused = memory_monitor.ceiling_exceeded()
+        if refused:
+            raise BrowserLaunchError(refused)
+        self.start()
+        self._prune()
+
+        candidates = self._usable()
+        if not candidates:
+            # Not warmed yet, or every browser crashed or retired since the last idle check
+            self.cold_launches += 1
+            candidates = [self._launch_browser()]
+            self._browsers.extend(candidates)
+        pooled = min(candidates, key=lambda b: b.active)
+        context = pooled.browser.new_context(**CONTEXT_OPTIONS)
+        pooled.served += 1
+        pooled.active += 1
+
+        if pooled.served >= self.max_contexts:
+            # Stop handing out contexts from this browser; it is closed once drained
+            # and replaced by the next check_health()
+            pooled.retired = True
+            self.recycled += 1
+
+        lease = BrowserLease(self, pooled, context)
+        memory_monitor.track(lease)
+        return lease
+
+    def _drain_pending_releases(self):
+        while self._pending_releases:
+            self.release(self._pending_releases.popleft())
+
+    def release(self, lease):
+        """Close the lease's context and return its browser to the pool"""
+        if lease.released:
+            return
+        if threading.get_ident() != self.owner:
+            # Playwright calls must happen on the owning thread
+            self._pending_releases.append(lease)
+            return
+        lease.released = True
+        try:
+            lease.context.close()
+        except Exception:
+            pass
+
+        pooled = lease.pooled
+        pooled.active = max(0, pooled.active - 1)
+        if pooled.retired and pooled.active == 0:
+            print(f"🔄 Recycling {pooled.engine} browser after {pooled.served} contexts")
+            self._close_browser(pooled)
+
+    def stats(self):
+        return {
+            'browsers': len(self._browsers),
+            'active_contexts': sum(b.active for b in self._browsers),
+            'launches': self.launches,
+            'cold_launches': self.cold_launches,
+            'replacements': self.replacements,
+            'recycled': self.recycled,
+        }
+
+    def close(self):
+        for pooled in list(self._browsers):
+            self._close_browser(pooled)
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+def sync_timeout_error():
+    """Playwright's sync TimeoutError, imported on first use (usable in except clauses)"""
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+    return PlaywrightTimeoutError
+
+
+_local = threading.local()
+
+
+def current_browser_pool():
+    """The calling thread's pool if it has one, without creating it"""
+    return getattr(_local, 'pool', None)
+
+
+def get_browser_pool(executable_path=None, engine=None):
+    """Return the calling thread's browser pool, creating it on first use or retargeting it to a new choice"""
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = BrowserPool(executable_path=executable_path, engine=engine)
+        _local.pool = pool
+    else:
+        pool.retarget(executable_path, engine)
+    return pool
@@ -0,0 +1,556 @@
+"""
+Signup flows in worker processes (SIGNUP_ENGINE=process).
+
+Each worker is a separate Python process that drives the sync engine on its
+main thread, so it owns its Playwright instance and every browser session
+started in it. The bot talks to workers over a JSON-lines protocol on
+their stdin/stdout:
+
+    -> {"id": 7, "op": "step1", "args": {"email": "...", "user_id": 42}}
+    <- {"id": 7, "result": {"status": "otp_ready", ...}, "spans": [["step1", "navigate_home", 1.2, "ok"], ...]}
+    <- {"event": "evicted", "user_id": 42, "reason": "memory"}
+    <- {"event": "prewarm_evicted", "user_id": 42, "reason": "expired"}
+    <- {"event": "stats", "prewarm": {...}, "pool": {...}}
+
+Requests without an id ("release", "cancel_prewarm") get no reply. A
+user's step 1, step 2 and prewarm all go to the worker their session is
+pinned to. A worker that exits or does not answer within
+WORKER_CALL_TIMEOUT is killed and restarted; the sessions it held are
+evicted with reason 'worker_lost'. Pins remember which start of the
+worker (its generation) they were made on, so a dead process only takes
+its own sessions with it.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import metrics
+from memory_budget import memory_monitor, MB
+
+BROWSER_WORKER_PROCESSES = int(os.environ.get('BROWSER_WORKER_PROCESSES', min(4, os.cpu_count() or 1)))
+# Longest a worker may take to answer one step before it is treated as hung
+WORKER_CALL_TIMEOUT = float(os.environ.get('WORKER_CALL_TIMEOUT', 300))
+# Pause before restarting a worker that exited, so a crash loop doesn't spin
+WORKER_RESTART_DELAY = float(os.environ.get('WORKER_RESTART_DELAY', 1))
+# A worker with nothing to do health-checks its browser pool this often
+WORKER_IDLE_INTERVAL = float(os.environ.get('WORKER_IDLE_INTERVAL', 30))
+
+WORKER_RESTARTS = metrics.counter('browser_worker_restarts_total', 'Browser worker processes restarted, by cause')
+
+
+class WorkerLost(Exception):
+    """The worker process exited or was killed before answering"""
+
+
+class RemoteLease:
+    """
+    Stands in for a worker's browser lease in the bot's browser_sessions.
+
+    Evicting the session (expiry, /create elsewhere, memory) releases the
+    real context in the worker that holds it.
+    """
+
+    def __init__(self, pool, user_id):
+        self.pool = pool
+        self.user_id = user_id
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.pool.release(self.user_id)
+
+
+class _WorkerProcess:
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.proc = None
+        # Bumped on every (re)start; tagged on proc so pins can name the process they live in
+        self.generation = 0
+        # Latest 'stats' event: the worker's prewarm cache and browser pool
+        self.remote_stats = {}
+        self.busy = False
+        self.calls = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self._killed = False
+        self._pending = {}
+        self._ids = itertools.count(1)
+        # One request at a time: the worker's Playwright objects live on one thread
+        self._call_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._proc_lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._proc_lock:
+            if self.proc is not None and self.proc.poll() is None:
+                return self.proc
+            # The bot enforces the ceiling on all workers together; each worker's own pool stays within its share
+            share = memory_monitor.ceiling / len(self.pool._workers) / MB
+            # Spans come back with each reply and are traced here; one writer per trace file
+            env = dict(os.environ, SIGNUP_ENGINE='sync', MEMORY_CEILING_MB=str(share), TRACE_FILE='')
+            self.proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--serve'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True, bufsize=1,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            self.generation += 1
+            self.proc.generation = self.generation
+            self.remote_stats = {}
+            threading.Thread(target=self._read, args=(self.proc,), name=f"browser-worker-{self.index}-reader",
+                             daemon=True).start()
+            print(f"🧩 Browser worker {self.index} started (pid {self.proc.pid})")
+            return self.proc
+
+    def _send(self, proc, message):
+        with self._send_lock:
+            proc.stdin.write(json.dumps(message) + '\n')
+            proc.stdin.flush()
+
+    def _read(self, proc):
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Browser worker {self.index} sent a non-protocol line: {line.rstrip()[:200]}")
+                continue
+            if 'event' in message:
+                self.pool._on_event(self, proc.generation, message)
+                continue
+            future = self._pending.pop(message.get('id'), None)
+            if future is not None:
+                future.set_result(message)
+        proc.wait()
+        self._on_exit(proc)
+
+    def _on_exit(self, proc):
+        for request_id in list(self._pending):
+            future = self._pending.pop(request_id, None)
+            if future is not None:
+                future.set_exception(WorkerLost(f"exit code {proc.returncode}"))
+        # Its sessions died with it; pins on a replacement a caller already started stay
+        self.pool._on_worker_lost(self, proc.generation)
+        with self._proc_lock:
+            current = self.proc is proc
+            if current:
+                self.proc = None
+            cause = 'hung' if self._killed else 'crashed'
+            self._killed = False
+        if self.pool.closed:
+            return
+        if cause == 'crashed':
+            self.crashes += 1
+        WORKER_RESTARTS.inc(cause=cause)
+        if not current:
+            return
+        print(f"🔁 Browser worker {self.index} (pid {proc.pid}) exited with {proc.returncode}, restarting")
+        time.sleep(WORKER_RESTART_DELAY)
+        if not self.pool.closed:
+            self.ensure_started()
+
+    def kill(self):
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            self._killed = True
+            proc.kill()
+
+    def call(self, op, args, timeout=WORKER_CALL_TIMEOUT):
+        """Run op in the worker; returns (generation that answered, result) or raises WorkerLost or FutureTimeout"""
+        with self._call_lock:
+            self.busy = True
+            self.calls += 1
+            try:
+                proc = self.ensure_started()
+                request_id = next(self._ids)
+                future = Future()
+                self._pending[request_id] = future
+                try:
+                    self._send(proc, {'id': request_id, 'op': op, 'args': args})
+                except OSError as e:
+                    self._pending.pop(request_id, None)
+                    raise WorkerLost(str(e))
+                try:
+                    reply = future.result(timeout)
+                except FutureTimeout:
+                    self._pending.pop(request_id, None)
+                    self.timeouts += 1
+                    self.kill()
+                    raise
+                # Step latencies measured in the worker land in our /metrics and trace file
+                for flow, step, seconds, outcome in reply.get('spans', ()):
+                    metrics.record_step(flow, step, seconds, outcome)
+                if 'error' in reply:
+                    raise RuntimeError(reply['error'])
+                return proc.generation, reply['result']
+            finally:
+                self.busy = False
+
+    def notify(self, op, args):
+        """Send a request that gets no reply; it runs after whatever the worker is doing"""
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return False
+        try:
+            self._send(proc, {'op': op, 'args': args})
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        proc = self.proc
+        return {
+            'pid': proc.pid if proc is not None else None,
+            'generation': self.generation,
+            'browser_pool': self.remote_stats.get('pool'),
+            'alive': proc is not None and proc.poll() is None,
+            'busy': self.busy,
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'crashes': self.crashes,
+        }
+
+
+class BrowserWorkerPool:
+    """
+    Worker processes plus the user -> (worker, generation) pins of their
+    sessions. A pin made before its first answer has generation None; a
+    step 1 or prewarm that leaves a session behind pins it to the process
+    that answered.
+    """
+
+    def __init__(self, processes=BROWSER_WORKER_PROCESSES, call_timeout=WORKER_CALL_TIMEOUT):
+        self.call_timeout = call_timeout
+        self.closed = False
+        self._workers = [_WorkerProcess(self, i) for i in range(max(1, processes))]
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        for worker in self._workers:
+            worker.ensure_started()
+        return self
+
+    def _pin(self, user_id):
+        """The worker holding user_id's session, or the least loaded one (now pinned)"""
+        with self._lock:
+            pinned = self._pins.get(user_id)
+            if pinned is not None:
+                return pinned[0]
+            load = {w.index: 0 for w in self._workers}
+            for worker, _generation in self._pins.values():
+                load[worker.index] += 1
+            worker = min(self._workers, key=lambda w: (w.busy, load[w.index]))
+            self._pins[user_id] = (worker, None)
+            return worker
+
+    def _pinned(self, user_id):
+        with self._lock:
+            pinned = self._pins.get(user_id)
+        return pinned[0] if pinned is not None else None
+
+    def _repin(self, user_id, worker, generation):
+        with self._lock:
+            self._pins[user_id] = (worker, generation)
+
+    def _unpin(self, user_id):
+        with self._lock:
+            pinned = self._pins.pop(user_id, None)
+        return pinned[0] if pinned is not None else None
+
+    def _call(self, worker, op, args):
+        """(generation, result dict); failures become error results without a generation"""
+        try:
+            return worker.call(op, args, timeout=self.call_timeout)
+        except FutureTimeout:
+            return None, {"status": "error", "message": f"Browser worker did not answer within {self.call_timeout:.0f}s and was restarted"}
+        except WorkerLost as e:
+            # Our process died, not the site: kept out of the circuit breaker
+            return None, {"status": "unavailable", "message": f"Browser worker crashed ({e}); please try again"}
+        except Exception as e:
+            return None, {"status": "error", "message": str(e)}
+
+    def step1(self, email, user_id):
+        from create_account import browser_sessions
+        # Our process tree includes every worker and its browsers; a parked prewarm needs no new context
+        refused = None if self.has_prewarm(user_id) else memory_monitor.ceiling_exceeded()
+        if refused:
+            return {"status": "unavailable", "message": refused}
+        worker = self._pin(user_id)
+        generation, result = self._call(worker, 'step1', {'email': email, 'user_id': user_id})
+        if result.get('status') == 'otp_ready':
+            self._repin(user_id, worker, generation)
+            browser_sessions[user_id] = {'lease': RemoteLease(self, user_id), 'worker': worker.index}
+        else:
+            self._unpin(user_id)
+        return result
+
+    def step2(self, otp_code, user_id):
+        from create_account import browser_sessions
+        worker = self._pinned(user_id)
+        if worker is None:
+            return {"status": "error", "message": "No active browser session found"}
+        try:
+            return self._call(worker, 'step2', {'otp_code': otp_code, 'user_id': user_id})[1]
+        finally:
+            self._unpin(user_id)
+            browser_sessions.pop(user_id)
+
+    def prewarm(self, user_id):
+        if memory_monitor.ceiling_exceeded():
+            return False
+        worker = self._pin(user_id)
+        try:
+            generation, parked = worker.call('prewarm', {'user_id': user_id}, timeout=self.call_timeout)
+        except Exception as e:
+            print(f"⚠️ Prewarm for {user_id} failed in browser worker {worker.index}: {e}")
+            parked = False
+        if parked:
+            self._repin(user_id, worker, generation)
+        else:
+            self._unpin(user_id)
+        return parked
+
+    def has_prewarm(self, user_id):
+        """Whether a worker holds a parked prefix for user_id (a pin that answered, without a session)"""
+        from create_account import browser_sessions
+        with self._lock:
+            pinned = self._pins.get(user_id)
+        return pinned is not None and pinned[1] is not None and user_id not in browser_sessions
+
+    def cancel_prewarm(self, user_id, reason='cancelled'):
+        """Close user_id's parked prewarm in its worker; the worker's event drops the pin"""
+        worker = self._pinned(user_id)
+        if worker is None:
+            return False
+        return worker.notify('cancel_prewarm', {'user_id': user_id, 'reason': reason})
+
+    def release(self, user_id):
+        """Close user_id's session in its worker (from RemoteLease.release)"""
+        worker = self._unpin(user_id)
+        if worker is not None:
+            worker.notify('release', {'user_id': user_id})
+
+    def _drop_pin(self, user_id, worker, generation):
+        """Unpin user_id if it is still pinned to that process"""
+        with self._lock:
+            if self._pins.get(user_id) == (worker, generation):
+                del self._pins[user_id]
+                return True
+        return False
+
+    def _on_event(self, worker, generation, message):
+        from create_account import browser_sessions
+        event = message['event']
+        if event == 'stats':
+            worker.remote_stats = message
+            return
+        user_id = message.get('user_id')
+        if event == 'prewarm_evicted':
+            # A parked prefix nobody claimed (expired, cancelled); 'replaced' was re-parked on the spot
+            if message.get('reason') != 'replaced' and user_id not in browser_sessions:
+                self._drop_pin(user_id, worker, generation)
+            return
+        if event != 'evicted':
+            return
+        # The worker closed a session itself (expiry, memory budget); mirror it in the bot
+        self._drop_pin(user_id, worker, generation)
+        session = browser_sessions.get(user_id)
+        if session is not None:
+            session['lease'].released = True
+            browser_sessions.evict(user_id, message.get('reason', 'evicted'))
+
+    def _on_worker_lost(self, worker, generation):
+        from create_account import browser_sessions
+        with self._lock:
+            lost = [user_id for user_id, pinned in self._pins.items() if pinned == (worker, generation)]
+            for user_id in lost:
+                del self._pins[user_id]
+        if self.closed:
+            return
+        for user_id in lost:
+            session = browser_sessions.get(user_id)
+            if session is not None:
+                session['lease'].released = True
+                browser_sessions.evict(user_id, 'worker_lost')
+
+    def close(self):
+        self.closed = True
+        for worker in self._workers:
+            proc = worker.proc
+            if proc is not None and proc.poll() is None:
+                try:
+                    proc.stdin.close()
+                    proc.wait(timeout=5)
+                except Exception:
+                    proc.kill()
+
+    def prewarm_stats(self):
+        """The workers' prewarm caches added up, shaped like PrewarmCache.stats()"""
+        stats = {'started': 0, 'hit': 0, 'wasted': 0, 'failed': 0, 'skipped': 0, 'pending': 0, 'parked': 0}
+        for worker in self._workers:
+            for key, value in (worker.remote_stats.get('prewarm') or {}).items():
+                if key in stats:
+                    stats[key] += value
+        used = stats['hit'] + stats['wasted']
+        stats['hit_ratio'] = stats['hit'] / used if used else 0.0
+        stats['waste_ratio'] = stats['wasted'] / used if used else 0.0
+        return stats
+
+    def stats(self):
+        with self._lock:
+            pinned = len(self._pins)
+        return {'processes': [w.stats() for w in self._workers], 'pinned_sessions': pinned}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserWorkerPool().start()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def run_uber_signup_step1(email, user_id):
+    return get_worker_pool().step1(email, user_id)
+
+
+def run_uber_signup_step2(otp_code, user_id):
+    return get_worker_pool().step2(otp_code, user_id)
+
+
+def prewarm_signup(user_id):
+    return get_worker_pool().prewarm(user_id)
+
+
+def cancel_prewarm(user_id, reason='cancelled'):
+    return get_worker_pool().cancel_prewarm(user_id, reason)
+
+
+def has_prewarm(user_id):
+    return get_worker_pool().has_prewarm(user_id)
+
+
+def prewarm_stats():
+    return get_worker_pool().prewarm_stats()
+
+
+def serve():
+    """Worker side: run requests from stdin on this thread, reply on the original stdout"""
+    # The protocol owns the real stdout; our prints and the browsers' output go to stderr
+    protocol = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+
+    import create_account
+    from browser_pool import current_browser_pool
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            protocol.write(json.dumps(message, default=str) + '\n')
+            protocol.flush()
+
+    def release(user_id):
+        session = create_account.browser_sessions.pop(user_id)
+        if session is not None:
+            session['lease'].release()
+        create_account.prewarm_cache.cancel(user_id)
+
+    def cancel_prewarm(user_id, reason='cancelled'):
+        create_account.prewarm_cache.cancel(user_id, reason)
+
+    def send_stats():
+        pool = current_browser_pool()
+        send({
+            'event': 'stats',
+            'prewarm': create_account.prewarm_cache.stats(),
+            'pool': pool.stats() if pool is not None else None,
+        })
+
+    ops = {
+        'step1': create_account.run_uber_signup_step1,
+        'step2': create_account.run_uber_signup_step2,
+        'prewarm': create_account.prewarm_signup,
+        'release': release,
+        'cancel_prewarm': cancel_prewarm,
+        'ping': lambda: 'pong',
+    }
+
+    # Step spans ride back on the reply; the bot times the whole step ('total') itself
+    spans = []
+
+    def collect_span(flow, step, seconds, outcome):
+        if step != 'total':
+            spans.append((flow, step, seconds, outcome))
+
+    metrics.span_listeners.append(collect_span)
+
+    create_account.browser_sessions.add_listener(
+        lambda user_id, session, reason: send({'event': 'evicted', 'user_id': user_id, 'reason': reason})
+    )
+    create_account.prewarm_cache.sessions.add_listener(
+        lambda user_id, session, reason: send({'event': 'prewarm_evicted', 'user_id': user_id, 'reason': reason})
+    )
+
+    # stdin is read on a side thread so the main thread can do pool upkeep while idle
+    requests = queue.Queue()
+
+    def read_requests():
+        for line in sys.stdin:
+            requests.put(line)
+        requests.put(None)
+
+    threading.Thread(target=read_requests, name='worker-requests', daemon=True).start()
+
+    def upkeep():
+        try:
+            create_account.maintain_browser_pool()
+        except Exception as e:
+            print(f"⚠️ Worker pool upkeep failed: {e}")
+        send_stats()
+
+    # Warm the pool before the first request instead of inside it
+    upkeep()
+    while True:
+        try:
+            line = requests.get(timeout=WORKER_IDLE_INTERVAL)
+        except queue.Empty:
+            upkeep()
+            continue
+        if line is None:
+            # The bot went away
+            break
+        message = json.loads(line)
+        try:
+            reply = {'result': ops[message['op']](**message.get('args', {}))}
+        except Exception as e:
+            reply = {'error': f"{type(e).__name__}: {e}"}
+        if message.get('id') is not None:
+            reply['id'] = message['id']
+            reply['spans'] = spans[:]
+            del spans[:]
+            send(reply)
+            send_stats()
+
+    pool = current_browser_pool()
+    if pool is not None:
+        pool.close()
+
+
+if __name__ == "__main__":
+    if '--serve' in sys.argv[1:]:
+        serve()
+    else:
+        print(__doc__)
@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from collections import deque
+import metrics
+
+# Step 1 results that mean the target site is not letting flows through
+FAILURE_STATUSES = {'error', 'captcha_required', 'exception'}
+# Results that say nothing about the site: no browser could be started here (memory
+# ceiling, missing or broken engine); they are kept out of both trackers
+LOCAL_STATUSES = {'unavailable'}
+
+OUTCOME_WINDOW_SECONDS = float(os.environ.get('OUTCOME_WINDOW_SECONDS', 300))
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.6))
+BREAKER_MIN_SAMPLES = int(os.environ.get('BREAKER_MIN_SAMPLES', 5))
+BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 120))
+# A half-open probe that never reports back stops blocking new probes after this
+BREAKER_PROBE_TIMEOUT = float(os.environ.get('BREAKER_PROBE_TIMEOUT', 180))
+
+ADAPTIVE_MIN_FLOWS = int(os.environ.get('ADAPTIVE_MIN_FLOWS', 1))
+ADAPTIVE_LATENCY_TARGET = float(os.environ.get('ADAPTIVE_LATENCY_TARGET', 45))
+ADAPTIVE_SAMPLES = int(os.environ.get('ADAPTIVE_SAMPLES', 10))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+BREAKER_TRANSITIONS = metrics.counter('signup_breaker_transitions_total', 'Circuit breaker state changes by new state')
+
+
+class OutcomeWindow:
+    """Step results (status, seconds) from the last `seconds` seconds"""
+
+    def __init__(self, seconds=OUTCOME_WINDOW_SECONDS, max_size=1000):
+        self.seconds = seconds
+        self._outcomes = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    def add(self, status, duration):
+        with self._lock:
+            self._outcomes.append((time.time(), status, duration))
+
+    def clear(self):
+        with self._lock:
+            self._outcomes.clear()
+
+    def recent(self, limit=None):
+        cutoff = time.time() - self.seconds
+        with self._lock:
+            while self._outcomes and self._outcomes[0][0] < cutoff:
+                self._outcomes.popleft()
+            outcomes = list(self._outcomes)
+        return outcomes[-limit:] if limit else outcomes
+
+    def summary(self, limit=None):
+        outcomes = self.recent(limit)
+        by_status = {}
+        for _ts, status, _duration in outcomes:
+            by_status[status] = by_status.get(status, 0) + 1
+        failures = sum(n for status, n in by_status.items() if status in FAILURE_STATUSES)
+        durations = sorted(duration for _ts, _status, duration in outcomes)
+        return {
+            'samples': len(outcomes),
+            'by_status': by_status,
+            'failure_rate': failures / len(outcomes) if outcomes else 0.0,
+            'p90_seconds': durations[min(len(durations) - 1, int(len(durations) * 0.9))] if durations else 0.0,
+        }
+
+
+class CircuitBreaker:
+    """
+    Fails new signups fast while the target site keeps failing them.
+
+    Closed: everything is allowed and step 1 results are counted. Once at
+    least min_samples results in the window fail at failure_rate or more,
+    the breaker opens and allow() refuses for `cooldown` seconds. Then one
+    probe flow is let through (half-open); its result closes the breaker or
+    opens it for another cooldown.
+    """
+
+    def __init__(self, window=None, failure_rate=BREAKER_FAILURE_RATE, min_samples=BREAKER_MIN_SAMPLES,
+                 cooldown=BREAKER_COOLDOWN, probe_timeout=BREAKER_PROBE_TIMEOUT):
+        self.window = window or OutcomeWindow()
+        self.failure_rate = failure_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_started_at = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        # Caller holds the lock
+        self.state = state
+        BREAKER_TRANSITIONS.inc(state=state)
+        print(f"🔌 Signup circuit breaker is now {state}")
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.probe_started_at = None
+
+    def allow(self):
+        """True if a new flow may start; in half-open state only the probe may"""
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN and now - self.opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probe_started_at is None or now - self.probe_started_at > self.probe_timeout:
+                    self.probe_started_at = now
+                    return True
+            if self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self):
+        """True while allow() would refuse; unlike allow() it never claims the probe"""
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN:
+                return now - self.opened_at < self.cooldown
+            if self.state == HALF_OPEN:
+                return self.probe_started_at is not None and now - self.probe_started_at <= self.probe_timeout
+            return False
+
+    def retry_after(self):
+        """Seconds until the breaker will next let a flow through"""
+        with self._lock:
+            if self.state == OPEN:
+                return max(0.0, self.opened_at + self.cooldown - time.time())
+            if self.state == HALF_OPEN and self.probe_started_at is not None:
+                return max(0.0, self.probe_started_at + self.probe_timeout - time.time())
+            return 0.0
+
+    def record(self, status, duration):
+        self.window.add(status, duration)
+        failed = status in FAILURE_STATUSES
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._transition(OPEN)
+                else:
+                    self.window.clear()
+                    self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+        summary = self.window.summary()
+        with self._lock:
+            if (self.state == CLOSED and summary['samples'] >= self.min_samples
+                    and summary['failure_rate'] >= self.failure_rate):
+                self._transition(OPEN)
+
+    def stats(self):
+        with self._lock:
+            state, rejected = self.state, self.rejected
+        return {'state': state, 'rejected': rejected, 'retry_after': self.retry_after(), 'window': self.window.summary()}
+
+
+class AdaptiveConcurrency:
+    """
+    Moves the concurrent-flow limit with recent step 1 results (AIMD).
+
+    After every `samples` results it looks at the latest `samples`: a
+    failure rate above 30% or a p90 slower than the latency target cuts the
+    limit by a third, a clean and fast window raises it by one, up to
+    max_limit. Every change is pushed through set_limit.
+    """
+
+    def __init__(self, set_limit, max_limit, min_limit=ADAPTIVE_MIN_FLOWS,
+                 latency_target=ADAPTIVE_LATENCY_TARGET, samples=ADAPTIVE_SAMPLES, window=None):
+        self.set_limit = set_limit
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_target = latency_target
+        self.samples = max(1, samples)
+        self.window = window or OutcomeWindow()
+        self.limit = self.max_limit
+        self.adjustments = 0
+        self._since_adjust = 0
+        self._lock = threading.Lock()
+
+    def record(self, status, duration):
+        self.window.add(status, duration)
+        with self._lock:
+            self._since_adjust += 1
+            if self._since_adjust < self.samples:
+                return
+            self._since_adjust = 0
+            summary = self.window.summary(limit=self.samples)
+            limit = self.limit
+            if summary['failure_rate'] > 0.3 or summary['p90_seconds'] > self.latency_target:
+                limit = max(self.min_limit, int(limit * 2 / 3))
+            elif summary['failure_rate'] < 0.1 and summary['p90_seconds'] < self.latency_target * 0.7:
+                limit = min(self.max_limit, limit + 1)
+            if limit == self.limit:
+                return
+            print(f"🎚️ Signup concurrency {self.limit} -> {limit} "
+                  f"(failure rate {summary['failure_rate']:.0%}, p90 {summary['p90_seconds']:.1f}s)")
+            self.limit = limit
+            self.adjustments += 1
+        self.set_limit(limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'adjustments': self.adjustments,
+                'latency_target': self.latency_target,
+            }
+
+
+def watch_flow(flow, *trackers):
+    """Feed every `flow` result (status, seconds) about the site to the trackers' record()"""
+    def listener(span_flow, step, seconds, outcome):
+        if span_flow == flow and step == 'total' and outcome not in LOCAL_STATUSES:
+            for tracker in trackers:
+                tracker.record(outcome, seconds)
+    metrics.span_listeners.append(listener)
+    return listener
@@ -1,55 +1,284 @@
 import os
-import glob
 import time
 import logging
-from playwright.sync_api import sync_playwright
+from browser_pool import get_browser_pool, BrowserLaunchError
+from session_registry import SessionRegistry
+from resource_blocking import install_resource_blocking, WAIT_UNTIL
+from metrics import step_timer, record_result
+from navigation_cache import navigation_cache
+from prewarm import prewarm_cache
+from step_plan import Target, Step, StepFailed, PlanRun, run_plan
+from memory_budget import memory_monitor
+import tracing
+from engine_probe import get_browser_choice
+from failure_capture import watch_context, capture as capture_failure
 
-# Global storage for browser sessions
-browser_sessions = {}
+MAX_BROWSER_SESSIONS = int(os.environ.get('MAX_BROWSER_SESSIONS', 20))
 
-def find_chrome_executable():
-    """Find the Chrome executable on EC2"""
-    # Find browsers in home directory
-    home_dir = os.path.expanduser('~')
+# Where step 1 starts; point it at fixture_site.py for offline runs
+SIGNUP_HOME_URL = os.environ.get('SIGNUP_HOME_URL', 'https://www.uber.com/in/en/')
+
+# Accessible name of the textbox that marks the end of the navigation path
+EMAIL_FIELD_NAME = 'Enter phone number or email'
+
+# 'sync' drives each flow on its caller's thread, 'async' on one shared event loop,
+# 'stub' fakes both steps without a browser (see stub_signup.py, for load tests),
+# 'process' runs them in browser worker processes (see browser_workers.py)
+SIGNUP_ENGINE = os.environ.get('SIGNUP_ENGINE', 'sync')
+
+def _step_timeout(name, default_ms):
+    return int(os.environ.get(f'SIGNUP_TIMEOUT_{name.upper()}_MS', default_ms))
+
+# Per-step deadlines in milliseconds, e.g. SIGNUP_TIMEOUT_POPUP_MS=8000
+STEP_TIMEOUTS = {
+    'default': _step_timeout('default', 30000),
+    'navigate': _step_timeout('navigate', 30000),
+    'signup_button': _step_timeout('signup_button', 15000),
+    'shortcut': _step_timeout('shortcut', 5000),
+    # Head start a popup gets over links already on the page
+    'popup': _step_timeout('popup', 2000),
+    'ride_link': _step_timeout('ride_link', 5000),
+    'signup_link': _step_timeout('signup_link', 10000),
+    'forward_button': _step_timeout('forward_button', 10000),
+    'email_entry': _step_timeout('email_entry', 15000),
+    'captcha_or_otp': _step_timeout('captcha_or_otp', 30000),
+    'otp_entry': _step_timeout('otp_entry', 10000),
+    'submission': _step_timeout('submission', 10000),
+}
+
+# Global storage for browser sessions (idle ones expire, oldest evicted at capacity)
+browser_sessions = SessionRegistry('browser_sessions', max_size=MAX_BROWSER_SESSIONS)
+
+def _release_evicted_session(user_id, session, reason):
+    """Return an evicted session's context to its pool"""
+    session['lease'].release()
+
+browser_sessions.add_listener(_release_evicted_session)
+# Sessions whose browser outgrows SESSION_MEMORY_BUDGET_MB are evicted with reason 'memory'
+memory_monitor.watch(browser_sessions)
+
+def maintain_browser_pool():
+    """
+    Warm the calling thread's browser pool, or health-check it and launch
+    replacements (call from its owning thread while it is idle)
+    """
+    if SIGNUP_ENGINE != 'sync':
+        return
+    # Also picks up a new engine choice after the old one stopped launching
+    choice = get_browser_choice()
+    get_browser_pool(executable_path=choice['path'], engine=choice['engine']).warm()
+
+# Declarative flow: every step races its alternatives with its own deadline
+EMAIL_FIELD = Target('email textbox', 'role', 'textbox', name=EMAIL_FIELD_NAME)
+FORWARD_BUTTON = Target('forward button', 'test_id', 'forward-button')
+CAPTCHA_FRAME = Target('captcha', 'css', 'iframe[title="Verification challenge"]', state='attached')
+
+def otp_field(index, state='visible'):
+    return Target(f'otp digit {index + 1}', 'css', f'#EMAIL_OTP_CODE-{index}', state=state)
+
+def shortcut_plan(url):
+    """Straight to a cached email form URL"""
+    return [
+        Step('shortcut', 'goto', value=url, timeout=STEP_TIMEOUTS['navigate'], wait_until=WAIT_UNTIL['home']),
+        Step('shortcut_email_field', 'wait', [EMAIL_FIELD], timeout=STEP_TIMEOUTS['shortcut']),
+    ]
+
+def signup_path_plan():
+    """Homepage → signup button → (popup) Ride → Sign up → forward, up to the email textbox"""
+    return [
+        Step('navigate_home', 'goto', value=SIGNUP_HOME_URL, timeout=STEP_TIMEOUTS['navigate'],
+             wait_until=WAIT_UNTIL['home']),
+        Step('signup_button', 'click', [
+            Target('signup button', 'role', 'button', name='Sign up to ride, drive, and'),
+        ], timeout=STEP_TIMEOUTS['signup_button']),
+        # The button may open a popup; its Ride link wins if it shows up within the popup grace
+        Step('ride_link', 'click', [
+            Target('popup Ride link', 'role', 'link', name='Ride undefined'),
+            Target('Ride link', 'text', 'Ride', delay=STEP_TIMEOUTS['popup']),
+        ], timeout=STEP_TIMEOUTS['popup'] + STEP_TIMEOUTS['ride_link'], optional=True, search_popups=True,
+           wait_until=WAIT_UNTIL['popup']),
+        Step('signup_link', 'click', [
+            Target('Sign up link', 'role', 'link', name='Sign up'),
+            EMAIL_FIELD,
+        ], timeout=STEP_TIMEOUTS['signup_link'], optional=True),
+        Step('forward_button', 'click', [FORWARD_BUTTON, EMAIL_FIELD],
+             timeout=STEP_TIMEOUTS['forward_button'], optional=True),
+        Step('email_field', 'wait', [EMAIL_FIELD], timeout=STEP_TIMEOUTS['email_entry'],
+             error='Email entry failed: {detail}'),
+    ]
+
+def email_plan(email):
+    """Enter the email and wait for either a CAPTCHA or the OTP fields"""
+    return [
+        Step('email_entry', 'fill', [EMAIL_FIELD], value=email, timeout=STEP_TIMEOUTS['email_entry'],
+             error='Email entry failed: {detail}'),
+        Step('email_submit', 'click', [FORWARD_BUTTON], timeout=STEP_TIMEOUTS['forward_button'],
+             error='Email entry failed: {detail}'),
+        Step('captcha_or_otp', 'wait', [CAPTCHA_FRAME, otp_field(0, state='attached')],
+             timeout=STEP_TIMEOUTS['captcha_or_otp'], optional=True, outcomes={'captcha': 'captcha_required'}),
+        Step('otp_fields', 'wait', [otp_field(0)], timeout=STEP_TIMEOUTS['otp_entry'],
+             error='Could not reach OTP page'),
+    ]
+
+def otp_plan(otp_code):
+    """Type the OTP digit by digit, then wait for the page to move on"""
+    digits = list(otp_code)[:4]
+    plan = [
+        Step(f'otp_digit_{i + 1}', 'fill', [otp_field(i, state='attached')], value=digit,
+             timeout=STEP_TIMEOUTS['otp_entry'], error='OTP entry failed: {detail}')
+        for i, digit in enumerate(digits)
+    ]
+    plan.append(Step('submission', 'url_change', timeout=STEP_TIMEOUTS['submission'], optional=True))
+    return plan
+
+def _reach_email_form(run):
+    """Use the cached email form URL when it still works, else walk the full path and offer its URL to the cache"""
+    shortcut_url = navigation_cache.get(SIGNUP_HOME_URL)
+    if shortcut_url is not None:
+        started = time.perf_counter()
+        try:
+            run_plan(run, shortcut_plan(shortcut_url))
+            saved = navigation_cache.record_hit(SIGNUP_HOME_URL, time.perf_counter() - started)
+            print(f"⚡ Jumped straight to the email form (saved ~{saved:.1f}s)")
+            return
+        except StepFailed as e:
+            print(f"⚠️ Cached signup URL failed, taking the full path: {e}")
+            navigation_cache.record_miss(SIGNUP_HOME_URL, time.perf_counter() - started)
     
-    # Primary expected path (matches what we found)
-    primary_chromium = os.path.join(home_dir, '.cache/ms-playwright/chromium-1181/chrome-linux/chrome')
+    path_started = time.perf_counter()
+    run_plan(run, signup_path_plan())
+    navigation_cache.store(SIGNUP_HOME_URL, run.page.url, time.perf_counter() - path_started)
+
+def _open_signup_context():
+    """Lease a context and set up blocking, failure capture and popups for a step 1 run"""
+    with step_timer('step1', 'launch'):
+        choice = get_browser_choice()
+        lease = get_browser_pool(executable_path=choice['path'], engine=choice['engine']).acquire()
     
-    if os.path.exists(primary_chromium):
-        print(f"✅ Chrome found at primary path: {primary_chromium}")
-        return primary_chromium
+    context = lease.context
+    context.set_default_timeout(STEP_TIMEOUTS['default'])
+    route_stats = install_resource_blocking(context)
+    page = context.new_page()
+    console = watch_context(context)
     
-    print(f"❌ Chrome not found at expected path: {primary_chromium}")
+    # Handle popups/new windows
+    page.on("popup", lambda popup: print(f"Popup opened: {popup.url}"))
+    context.on("dialog", lambda dialog: dialog.accept())
     
-    # Try to find Chrome in any version directory
-    possible_paths = glob.glob(f"{home_dir}/.cache/ms-playwright/chromium*/chrome-linux/chrome")
-    if possible_paths:
-        chrome_path = possible_paths[0]
-        print(f"✅ Chrome found at alternative path: {chrome_path}")
-        return chrome_path
+    return {
+        'lease': lease,
+        'browser': lease.browser,
+        'context': context,
+        'route_stats': route_stats,
+        'console': console,
+        'run': PlanRun(context, page, 'step1'),
+    }
+
+def flow_result(status, message, session=None):
+    """A step's result dict; a session adds its network and memory reports"""
+    result = {"status": status, "message": message}
+    if session is not None:
+        result["network"] = session['route_stats'].report()
+        result["memory"] = memory_monitor.report(session['lease'])
+    return result
+
+def otp_session(session):
+    """The browser_sessions entry that keeps a step 1 session alive for step 2"""
+    run = session['run']
+    return {
+        'lease': session['lease'],
+        'browser': session['browser'],
+        'context': session['context'],
+        'page': run.page,
+        'route_stats': session['route_stats'],
+        # Kept so a step 2 failure report covers the whole flow
+        'history': run.history,
+        'console': session['console']
+    }
+
+def step1_failure(error, session):
+    """Step 1's result for an exception raised after the context was opened"""
+    if isinstance(error, StepFailed):
+        return flow_result("error", error.message, session)
+    print(f"💥 Step 1 Overall Error: {error}")
+    return flow_result("error", str(error), session)
+
+def otp_failure(error):
+    """Step 2's result for an exception raised while entering the OTP"""
+    if isinstance(error, StepFailed):
+        return flow_result("error", error.message)
+    print(f"❌ Step 2 Error: {error}")
+    return flow_result("error", f"OTP entry failed: {str(error)}")
+
+def otp_outcome(current_url, session):
+    """Step 2's result from where the page went after the OTP"""
+    print(f"📍 Current URL after OTP: {current_url}")
     
-    # Try headless shell as fallback
-    headless_paths = glob.glob(f"{home_dir}/.cache/ms-playwright/chromium*_headless_shell*/chrome-linux/chrome")
-    if headless_paths:
-        chrome_path = headless_paths[0]
-        print(f"✅ Found Chrome headless shell at: {chrome_path}")
-        return chrome_path
-        
-    # Final fallback - try Firefox (matches what we found)
-    firefox_path = glob.glob(f"{home_dir}/.cache/ms-playwright/firefox*/firefox/firefox")
-    if firefox_path:
-        print(f"⚠️ Chrome not found! Using Firefox as fallback: {firefox_path[0]}")
-        return firefox_path[0]
-        
-    print("❌ No browser executables found!")
-    return None
+    if "welcome" in current_url.lower() or "dashboard" in current_url.lower():
+        print("🎉 SUCCESS: Account creation completed!")
+        return flow_result("success", "Account created successfully!", session)
+    print("✅ OTP submitted, process completed")
+    return flow_result("completed", "OTP submitted successfully", session)
 
-# Run the check at module load time
-CHROME_PATH = find_chrome_executable()
+def prewarm_signup(user_id):
+    """
+    Speculative step 1 prefix for a user who just sent /create: lease a
+    context and walk it to the email textbox, so step 1 only has to fill it.
+    
+    With the sync engine this must run on the thread that will run the
+    user's step 1. Returns True if a session was parked.
+    """
+    # The prefix's spans belong to the signup attempt step 1 will finish
+    tracing.begin(user_id, new=True)
+    
+    if SIGNUP_ENGINE == 'async':
+        import async_signup
+        return async_signup.prewarm_signup(user_id)
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.prewarm_signup(user_id)
+    if SIGNUP_ENGINE != 'sync' or not prewarm_cache.reserve():
+        return False
+    
+    try:
+        session = _open_signup_context()
+    except BrowserLaunchError as e:
+        print(f"⚠️ Prewarm for {user_id} skipped: {e}")
+        prewarm_cache.abandon()
+        return False
+    
+    try:
+        _reach_email_form(session['run'])
+    except Exception as e:
+        print(f"⚠️ Prewarm for {user_id} failed, step 1 will start from scratch: {e}")
+        session['lease'].release()
+        prewarm_cache.abandon()
+        return False
+    
+    prewarm_cache.put(user_id, session)
+    print(f"🔥 Browser parked on the email form for {user_id}")
+    return True
+
+def has_prewarm(user_id):
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.has_prewarm(user_id)
+    return prewarm_cache.has(user_id)
+
+def cancel_prewarm(user_id, reason='cancelled'):
+    """Close user_id's parked prefix wherever the engine keeps it"""
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.cancel_prewarm(user_id, reason)
+    return prewarm_cache.cancel(user_id, reason)
 
-# Set environment variable for Playwright
-os.environ["PLAYWRIGHT_BROWSERS_PATH"] = "0"
+def prewarm_stats():
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.prewarm_stats()
+    return prewarm_cache.stats()
 
+@record_result('step1')
 def run_uber_signup_step1(email, user_id):
     """
     Step 1: Navigate to signup, enter email, reach OTP page
@@ -57,171 +286,59 @@ def run_uber_signup_step1(email, user_id):
     """
     global browser_sessions
     
-    print(f"🚀 Step 1: Starting automation for email: {email}")
-    
-    p = sync_playwright().start()
-    
-    try:
-        # Determine which browser to use
-        if CHROME_PATH and "chrome" in CHROME_PATH:
-            print(f"📍 Launching Chrome browser from: {CHROME_PATH}")
-            browser = p.chromium.launch(
-                headless=True,
-                executable_path=CHROME_PATH,
-                args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
-            )
-        elif CHROME_PATH and "firefox" in CHROME_PATH:
-            print(f"📍 Launching Firefox browser from: {CHROME_PATH}")
-            browser = p.firefox.launch(
-                headless=True,
-                executable_path=CHROME_PATH, 
-                args=['--no-sandbox', '--disable-dev-shm-usage']
-            )
-        else:
-            print("📍 Launching default browser")
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
-            )
-    except Exception as e:
-        print(f"❌ Browser launch error: {e}")
-        # Try Firefox as fallback
-        try:
-            print("📍 Trying Firefox as fallback...")
-            browser = p.firefox.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-dev-shm-usage']
-            )
-        except Exception as e2:
-            print(f"❌ Firefox fallback also failed: {e2}")
-            p.stop()
-            return {"status": "error", "message": f"Could not launch any browser: {str(e2)}"}
+    # Every span of this attempt (and of its step 2) carries the same correlation id;
+    # a prewarmed prefix already started it
+    tracing.begin(user_id, new=not has_prewarm(user_id))
     
-    context = browser.new_context(
-        accept_downloads=True,
-        has_touch=False,
-        ignore_https_errors=False,
-        viewport={'width': 1280, 'height': 800},
-        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
-    )
+    if SIGNUP_ENGINE == 'async':
+        import async_signup
+        return async_signup.run_uber_signup_step1(email, user_id)
+    if SIGNUP_ENGINE == 'stub':
+        import stub_signup
+        return stub_signup.run_uber_signup_step1(email, user_id)
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.run_uber_signup_step1(email, user_id)
     
-    context.set_default_timeout(30000)
-    page = context.new_page()
+    print(f"🚀 Step 1: Starting automation for email: {email}")
     
-    # Handle popups/new windows
-    page.on("popup", lambda popup: print(f"Popup opened: {popup.url}"))
-    context.on("dialog", lambda dialog: dialog.accept())
+    session = prewarm_cache.take(user_id)
+    prewarmed = session is not None
+    if prewarmed:
+        print("🔥 Using the browser prewarmed on /create")
+    else:
+        try:
+            session = _open_signup_context()
+        except BrowserLaunchError as e:
+            # Our capacity or install, not the site: kept out of the circuit breaker
+            return flow_result("unavailable", str(e))
     
+    lease = session['lease']
+    run = session['run']
     try:
-        print("📍 Step 1: Navigating to Uber homepage...")
-        page.goto('https://www.uber.com/in/en/', wait_until='networkidle')
-        print(f"✅ Current URL: {page.url}")
-        
-        print("📍 Step 1: Looking for signup button...")
-        signup_button = page.get_by_role('button', name='Sign up to ride, drive, and')
-        print("✅ Found signup button, clicking it...")
-        signup_button.click()
+        if not prewarmed:
+            _reach_email_form(run)
         
-        time.sleep(3)
-        print("📍 Step 1: Checking for popups...")
-        pages = context.pages
-        print(f"✅ Number of pages/windows open: {len(pages)}")
+        if run_plan(run, email_plan(email)) == 'captcha_required':
+            print("⚠️ CAPTCHA detected")
+            lease.release()
+            return flow_result("captcha_required", "CAPTCHA verification required", session)
         
-        if len(pages) > 1:
-            popup_page = pages[1]
-            print(f"✅ Found popup with URL: {popup_page.url}")
-            
-            try:
-                popup_page.get_by_role('link', name='Ride undefined').click()
-                time.sleep(1)
-                print("✅ Clicked 'Ride undefined' in popup")
-            except Exception as e:
-                print(f"⚠️ Ride undefined error: {e}")
-            
-            page = popup_page
-        else:
-            try:
-                ride_link = page.get_by_text("Ride")
-                if ride_link.count() > 0:
-                    print("✅ Found Ride link on current page")
-                    ride_link.first.click()
-                    time.sleep(1)
-            except Exception as e:
-                print(f"⚠️ Ride link error: {e}")
+        print("🎉 OTP fields appeared! Ready for real OTP...")
         
-        print("📍 Step 1: Looking for Sign up link...")
-        try:
-            page.get_by_role('link', name='Sign up').click()
-            print("✅ Clicked Sign up link")
-        except Exception as e:
-            print(f"⚠️ Sign up link error: {e}")
-        
-        time.sleep(1)
-        
-        print("📍 Step 1: Clicking forward button...")
-        try:
-            page.get_by_test_id('forward-button').click()
-            print("✅ Clicked forward button")
-        except Exception as e:
-            print(f"⚠️ Forward button error: {e}")
-        
-        print("📍 Step 1: Entering email...")
-        try:
-            email_field = page.get_by_role('textbox', name='Enter phone number or email')
-            email_field.click()
-            email_field.fill(email)
-            print(f"✅ Entered email: {email}")
-            
-            page.get_by_test_id('forward-button').click()
-            print("✅ Clicked forward button after email")
-        except Exception as e:
-            print(f"❌ Email entry error: {e}")
-            browser.close()
-            p.stop()
-            return {"status": "error", "message": f"Email entry failed: {str(e)}"}
-        
-        print("📍 Step 1: Checking for CAPTCHA...")
-        time.sleep(5)
-        
-        try:
-            captcha_frame = page.locator('iframe[title="Verification challenge"]')
-            if captcha_frame.count() > 0:
-                print("⚠️ CAPTCHA detected")
-                browser.close()
-                p.stop()
-                return {"status": "captcha_required", "message": "CAPTCHA verification required"}
-            else:
-                print("✅ No CAPTCHA detected")
-        except Exception as e:
-            print(f"⚠️ CAPTCHA detection error: {e}")
+        # Store browser session for Step 2
+        browser_sessions[user_id] = otp_session(session)
         
-        print("📍 Step 1: Waiting for OTP fields...")
-        try:
-            page.wait_for_selector('#EMAIL_OTP_CODE-0', timeout=30000)
-            print("🎉 OTP fields appeared! Ready for real OTP...")
-            
-            # Store browser session for Step 2
-            browser_sessions[user_id] = {
-                'playwright': p,
-                'browser': browser,
-                'context': context,
-                'page': page
-            }
-            
-            return {"status": "otp_ready", "message": "Reached OTP page successfully"}
-            
-        except Exception as e:
-            print(f"❌ OTP fields not found: {e}")
-            browser.close()
-            p.stop()
-            return {"status": "error", "message": "Could not reach OTP page"}
-            
+        print(f"📊 Network: {session['route_stats'].report()}")
+        return flow_result("otp_ready", "Reached OTP page successfully", session)
+    
     except Exception as e:
-        print(f"💥 Step 1 Overall Error: {e}")
-        browser.close()
-        p.stop()
-        return {"status": "error", "message": str(e)}
+        result = step1_failure(e, session)
+        capture_failure('step1', user_id, result, run, session['console'])
+        lease.release()
+        return result
 
+@record_result('step2')
 def run_uber_signup_step2(otp_code, user_id):
     """
     Step 2: Enter real OTP and complete signup
@@ -229,46 +346,41 @@ def run_uber_signup_step2(otp_code, user_id):
     """
     global browser_sessions
     
-    print(f"🚀 Step 2: Starting with real OTP: {otp_code}")
+    tracing.begin(user_id)
     
-    if user_id not in browser_sessions:
-        return {"status": "error", "message": "No active browser session found"}
+    if SIGNUP_ENGINE == 'async':
+        import async_signup
+        return async_signup.run_uber_signup_step2(otp_code, user_id)
+    if SIGNUP_ENGINE == 'stub':
+        import stub_signup
+        return stub_signup.run_uber_signup_step2(otp_code, user_id)
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        return browser_workers.run_uber_signup_step2(otp_code, user_id)
+    
+    print(f"🚀 Step 2: Starting with real OTP: {otp_code}")
     
-    session = browser_sessions[user_id]
-    page = session['page']
+    session = browser_sessions.get(user_id)
+    if session is None:
+        return flow_result("error", "No active browser session found")
     
+    run = PlanRun(session['context'], session['page'], 'step2', history=session.get('history'))
     try:
         print("📍 Step 2: Entering real OTP digits...")
         
-        otp_digits = list(otp_code)
-        for i in range(min(4, len(otp_digits))):
-            page.locator(f'#EMAIL_OTP_CODE-{i}').fill(otp_digits[i])
-            print(f"✅ Entered digit {i+1}: {otp_digits[i]}")
-            time.sleep(0.5)
-        
-        print("📍 Step 2: Waiting for submission...")
-        time.sleep(3)
-        
-        current_url = page.url
-        print(f"📍 Current URL after OTP: {current_url}")
-        
-        if "welcome" in current_url.lower() or "dashboard" in current_url.lower():
-            print("🎉 SUCCESS: Account creation completed!")
-            return {"status": "success", "message": "Account created successfully!"}
-        else:
-            print("✅ OTP submitted, process completed")
-            return {"status": "completed", "message": "OTP submitted successfully"}
-            
+        run_plan(run, otp_plan(otp_code))
+        return otp_outcome(run.page.url, session)
+    
     except Exception as e:
-        print(f"❌ Step 2 Error: {e}")
-        return {"status": "error", "message": f"OTP entry failed: {str(e)}"}
+        result = otp_failure(e)
+        capture_failure('step2', user_id, result, run, session.get('console'))
+        return result
         
     finally:
         print("🔄 Cleaning up browser session...")
         try:
-            session['browser'].close()
-            session['playwright'].stop()
-            del browser_sessions[user_id]
+            session['lease'].release()
+            browser_sessions.pop(user_id)
             print("✅ Browser session cleaned up")
         except:
             pass
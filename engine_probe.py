@@ -0,0 +1,284 @@
+"""
+Pick the browser engine by measuring the ones that are installed.
+
+Every candidate executable (full Chromium, the Chromium headless shell,
+Firefox) is launched once and timed, its idle RSS is sampled and a trivial
+page is loaded in it. The fastest engine that works is saved with the
+measurements and reused until the Playwright browsers directory changes,
+so requests launch it directly instead of guessing from the path and
+falling back to Firefox.
+
+    python engine_probe.py           # show the saved choice
+    python engine_probe.py --force   # probe again
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from browser_pool import launch_options
+from process_memory import process_table, find_process, tree_rss, process_tree_rss
+
+# ENGINE_PROBE=0 skips measuring and uses the first executable found
+ENGINE_PROBE = os.environ.get('ENGINE_PROBE', '1') != '0'
+ENGINE_PROBE_FILE = os.environ.get(
+    'ENGINE_PROBE_FILE', os.path.join(os.path.expanduser('~'), '.cache/automate/engine_probe.json')
+)
+ENGINE_PROBE_TIMEOUT_MS = int(os.environ.get('ENGINE_PROBE_TIMEOUT_MS', 15000))
+# Let the browser's helper processes start before sampling idle RSS
+ENGINE_PROBE_SETTLE = float(os.environ.get('ENGINE_PROBE_SETTLE', 0.5))
+# A chosen engine that stops launching is re-probed in the background at most this often
+ENGINE_REPROBE_INTERVAL = float(os.environ.get('ENGINE_REPROBE_INTERVAL', 600))
+
+BROWSERS_DIR = os.path.join(os.path.expanduser('~'), '.cache/ms-playwright')
+PROBE_PAGE = "data:text/html,<title>probe</title><p id='probe'>ok</p>"
+
+_choice = None
+_choice_lock = threading.Lock()
+_reprobe = None
+_reprobed_at = None
+
+
+def candidate_engines(browsers_dir=BROWSERS_DIR):
+    """Installed executables in the old preference order, or Playwright's bundled builds if none"""
+    found = []
+    for name, engine, pattern in (
+        ('chromium', 'chromium', 'chromium-*/chrome-linux/chrome'),
+        ('chromium_headless_shell', 'chromium', 'chromium*_headless_shell*/chrome-linux/chrome'),
+        ('firefox', 'firefox', 'firefox*/firefox/firefox'),
+    ):
+        for path in sorted(glob.glob(os.path.join(browsers_dir, pattern)), reverse=True):
+            found.append({'name': name, 'engine': engine, 'path': path})
+    if not found:
+        found = [
+            {'name': 'chromium_bundled', 'engine': 'chromium', 'path': None},
+            {'name': 'firefox_bundled', 'engine': 'firefox', 'path': None},
+        ]
+    return found
+
+
+def _browser_rss(marker, before):
+    if marker is not None and os.path.isdir('/proc'):
+        table = process_table()
+        pid = find_process(marker, table)
+        if pid is not None:
+            return tree_rss(pid, table)
+    # Firefox has no marker; charge it whatever this process tree grew by
+    return max(0, process_tree_rss() - before)
+
+
+def probe_engine(playwright, candidate):
+    """Launch one candidate, time it and load PROBE_PAGE; returns the measurements"""
+    result = dict(candidate, ok=False, launch_seconds=None, page_seconds=None, idle_rss_bytes=None, error=None)
+    kwargs, marker = launch_options(candidate['engine'], candidate['path'])
+    before = process_tree_rss()
+    browser = None
+    try:
+        started = time.perf_counter()
+        browser = getattr(playwright, candidate['engine']).launch(timeout=ENGINE_PROBE_TIMEOUT_MS, **kwargs)
+        result['launch_seconds'] = time.perf_counter() - started
+
+        time.sleep(ENGINE_PROBE_SETTLE)
+        result['idle_rss_bytes'] = _browser_rss(marker, before)
+
+        started = time.perf_counter()
+        page = browser.new_context().new_page()
+        page.goto(PROBE_PAGE, timeout=ENGINE_PROBE_TIMEOUT_MS)
+        text = page.text_content('#probe', timeout=ENGINE_PROBE_TIMEOUT_MS)
+        result['page_seconds'] = time.perf_counter() - started
+        result['ok'] = text == 'ok'
+        if not result['ok']:
+            result['error'] = f"probe page rendered {text!r}"
+    except Exception as e:
+        result['error'] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    finally:
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+    return result
+
+
+def choose(results):
+    """Fastest working candidate (launch plus page load), or None"""
+    working = [r for r in results if r['ok']]
+    if not working:
+        return None
+    return min(working, key=lambda r: r['launch_seconds'] + r['page_seconds'])
+
+
+def probe(candidates=None):
+    """Measure every candidate with a throwaway sync Playwright; returns the results"""
+    from playwright.sync_api import sync_playwright
+    candidates = candidate_engines() if candidates is None else candidates
+    results = []
+    with sync_playwright() as playwright:
+        for candidate in candidates:
+            result = probe_engine(playwright, candidate)
+            if result['ok']:
+                print(f"🔬 {result['name']}: launch {result['launch_seconds']:.2f}s, "
+                      f"page {result['page_seconds']:.2f}s, idle {(result['idle_rss_bytes'] or 0) / 1048576:.0f} MiB")
+            else:
+                print(f"🔬 {result['name']}: failed ({result['error']})")
+            results.append(result)
+    return results
+
+
+def _browsers_dir_mtime():
+    try:
+        return os.stat(BROWSERS_DIR).st_mtime
+    except OSError:
+        return None
+
+
+def load_choice(mtime=None):
+    """The saved choice if it was made for the current browsers directory"""
+    try:
+        with open(ENGINE_PROBE_FILE) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get('browsers_dir') != BROWSERS_DIR or saved.get('mtime') != mtime:
+        return None
+    path = (saved.get('choice') or {}).get('path')
+    if path and not os.path.exists(path):
+        return None
+    return saved
+
+
+def save_choice(saved):
+    try:
+        os.makedirs(os.path.dirname(ENGINE_PROBE_FILE), exist_ok=True)
+        tmp_path = f"{ENGINE_PROBE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(saved, f, indent=2)
+        os.replace(tmp_path, ENGINE_PROBE_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not save engine choice: {e}")
+
+
+def _guess():
+    """The ENGINE_PROBE=0 choice: no engine, the first executable found as path"""
+    guess = candidate_engines()[0]
+    return {'name': guess['name'], 'engine': None, 'path': guess['path']}
+
+
+def _measure(mtime):
+    """Probe every candidate and save a working choice; returns the saved record"""
+    try:
+        results = probe(candidate_engines())
+    except Exception as e:
+        print(f"⚠️ Engine probe could not run: {e}")
+        results = []
+    choice = choose(results)
+    saved = {
+        'browsers_dir': BROWSERS_DIR,
+        'mtime': mtime,
+        'probed_at': time.time(),
+        'choice': choice,
+        'results': results,
+    }
+    if choice is not None:
+        save_choice(saved)
+    return saved
+
+
+def _reprobe_in_background():
+    global _choice
+    saved = _measure(_browsers_dir_mtime())
+    if saved['choice'] is None:
+        print("❌ No browser engine passed the re-probe, still guessing from the path")
+        return
+    with _choice_lock:
+        _choice = saved['choice']
+    print(f"✅ Browser engine re-probed: {_choice['name']} ({_choice['path'] or 'bundled'})")
+
+
+def invalidate(engine, executable_path):
+    """
+    The chosen engine stopped launching: forget the saved choice, guess
+    from the path (with the Firefox fallback) until a background probe
+    picks again, at most once per ENGINE_REPROBE_INTERVAL. Failures of an
+    engine that is no longer the choice are ignored. Never blocks on a probe.
+    """
+    global _choice, _reprobe, _reprobed_at
+    with _choice_lock:
+        if _choice is None or (_choice['engine'], _choice['path']) != (engine, executable_path):
+            return
+        _choice = _guess()
+        print(f"⚠️ Browser engine {engine} stopped launching, guessing from {_choice['path'] or 'the bundled browsers'}")
+        try:
+            os.unlink(ENGINE_PROBE_FILE)
+        except OSError:
+            pass
+        now = time.monotonic()
+        if _reprobe is not None and _reprobe.is_alive():
+            return
+        if _reprobed_at is not None and now - _reprobed_at < ENGINE_REPROBE_INTERVAL:
+            return
+        _reprobed_at = now
+        # A thread of its own: sync Playwright must not see a running loop, and no request waits on it
+        _reprobe = threading.Thread(target=_reprobe_in_background, name='engine-reprobe', daemon=True)
+        _reprobe.start()
+
+
+def current_choice():
+    """The choice in force, or None before select_engine() ran; never probes"""
+    return _choice
+
+
+def select_engine(force=False):
+    """
+    {'name', 'engine', 'path', ...} to launch, probing on first use.
+
+    Call once at startup from a thread without a running asyncio loop (the
+    probe uses sync Playwright); later calls return the same choice until
+    invalidate() or a background re-probe replaces it. The choice has
+    engine None when nothing worked, or when ENGINE_PROBE=0 (then with the
+    first executable found as path), which leaves the pools to guess from
+    the path and fall back to Firefox as before. Only measured choices are
+    saved.
+    """
+    global _choice
+    with _choice_lock:
+        if _choice is not None and not force:
+            return _choice
+        if not ENGINE_PROBE:
+            _choice = _guess()
+            print(f"📍 Engine probe off, guessing from {_choice['path'] or 'the bundled browsers'}")
+            return _choice
+        mtime = _browsers_dir_mtime()
+        saved = None if force else load_choice(mtime)
+        if saved is None:
+            saved = _measure(mtime)
+        _choice = saved.get('choice') or {'name': None, 'engine': None, 'path': None}
+        if _choice['engine'] is not None:
+            print(f"✅ Browser engine: {_choice['name']} ({_choice['path'] or 'bundled'})")
+        else:
+            print("❌ No browser engine passed the startup probe")
+        return _choice
+
+
+def get_browser_choice():
+    """select_engine() for the bot: Playwright must look for browsers next to the package first"""
+    os.environ["PLAYWRIGHT_BROWSERS_PATH"] = "0"
+    return select_engine()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the installed browser engines and pick one')
+    parser.add_argument('--force', action='store_true', help='probe again even if a choice is saved')
+    args = parser.parse_args(argv)
+
+    choice = select_engine(force=args.force)
+    saved = load_choice(_browsers_dir_mtime())
+    if saved is not None:
+        print(json.dumps(saved, indent=2))
+    return 0 if choice['engine'] is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
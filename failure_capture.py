@@ -0,0 +1,206 @@
+import os
+import gzip
+import json
+import time
+import queue
+import base64
+import shutil
+import threading
+from collections import deque
+import metrics
+import tracing
+
+# 'snapshot' keeps step history and console output in memory and grabs the DOM
+# and a screenshot when a flow fails; 'trace' also records a Playwright trace;
+# 'off' disables capture
+FAILURE_CAPTURE = os.environ.get('FAILURE_CAPTURE', 'snapshot')
+FAILURE_CAPTURE_DIR = os.environ.get(
+    'FAILURE_CAPTURE_DIR', os.path.join(os.path.expanduser('~'), '.cache/automate/failures')
+)
+FAILURE_CAPTURE_MAX_MB = float(os.environ.get('FAILURE_CAPTURE_MAX_MB', 200))
+FAILURE_CAPTURE_CONSOLE = int(os.environ.get('FAILURE_CAPTURE_CONSOLE', 100))
+FAILURE_CAPTURE_SCREENSHOT_MS = int(os.environ.get('FAILURE_CAPTURE_SCREENSHOT_MS', 5000))
+
+FAILURE_CAPTURES = metrics.counter('failure_captures_total', 'Failure reports written, by flow')
+
+
+class FailureWriter:
+    """
+    Background thread that compresses failure reports to disk and keeps the
+    retention directory under max_bytes by deleting the oldest reports.
+    """
+
+    def __init__(self, directory=FAILURE_CAPTURE_DIR, max_bytes=int(FAILURE_CAPTURE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, name, report, trace_path=None):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='failure-writer', daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((name, report, trace_path))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            name, report, trace_path = self._queue.get()
+            try:
+                self._write(name, report, trace_path)
+                self._enforce_retention()
+            except Exception as e:
+                print(f"⚠️ Could not write failure report {name}: {e}")
+
+    def _write(self, name, report, trace_path):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.json.gz")
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(report, f, default=str)
+        os.replace(tmp_path, path)
+        if trace_path and os.path.exists(trace_path):
+            # Playwright trace archives are already zip-compressed
+            shutil.move(trace_path, os.path.join(self.directory, f"{name}.trace.zip"))
+        self.written += 1
+        print(f"🧾 Failure report saved: {path}")
+
+    def _enforce_retention(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'pending': self._queue.qsize()}
+
+
+writer = FailureWriter()
+
+
+def watch_context(context):
+    """
+    Start recording for a new flow's context; returns its console ring buffer.
+
+    Nothing is written unless capture()/capture_async() is called for it.
+    """
+    console = deque(maxlen=FAILURE_CAPTURE_CONSOLE)
+    if FAILURE_CAPTURE == 'off':
+        return console
+    context.on('console', lambda message: console.append({
+        'ts': time.time(), 'type': message.type, 'text': message.text,
+    }))
+    if FAILURE_CAPTURE == 'trace':
+        try:
+            context.tracing.start(snapshots=True, screenshots=True)
+        except Exception as e:
+            print(f"⚠️ Could not start Playwright tracing: {e}")
+    return console
+
+
+async def watch_context_async(context):
+    """watch_context for playwright.async_api contexts"""
+    console = deque(maxlen=FAILURE_CAPTURE_CONSOLE)
+    if FAILURE_CAPTURE == 'off':
+        return console
+    context.on('console', lambda message: console.append({
+        'ts': time.time(), 'type': message.type, 'text': message.text,
+    }))
+    if FAILURE_CAPTURE == 'trace':
+        try:
+            await context.tracing.start(snapshots=True, screenshots=True)
+        except Exception as e:
+            print(f"⚠️ Could not start Playwright tracing: {e}")
+    return console
+
+
+def _report_name(flow, user_id):
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{flow}-{user_id}"
+
+
+def _base_report(flow, user_id, result, run, console, extra):
+    report = {
+        'ts': time.time(),
+        'flow': flow,
+        'user_id': user_id,
+        'trace_id': tracing.current_trace()[0],
+        'result': result,
+        'steps': list(run.history) if run is not None else [],
+        'console': list(console or []),
+    }
+    report.update(extra or {})
+    return report
+
+
+def capture(flow, user_id, result, run=None, console=None, **extra):
+    """
+    Snapshot a failed flow while its page is still open and queue the report.
+
+    Must run on the thread that owns the page, before the context is closed.
+    """
+    if FAILURE_CAPTURE == 'off':
+        return
+    report = _base_report(flow, user_id, result, run, console, extra)
+    page = run.page if run is not None else None
+    trace_path = None
+    if page is not None:
+        try:
+            report['url'] = page.url
+            report['dom'] = page.content()
+            screenshot = page.screenshot(timeout=FAILURE_CAPTURE_SCREENSHOT_MS)
+            report['screenshot_png_b64'] = base64.b64encode(screenshot).decode('ascii')
+        except Exception as e:
+            report['snapshot_error'] = str(e)
+        if FAILURE_CAPTURE == 'trace':
+            trace_path = os.path.join(FAILURE_CAPTURE_DIR, f".{_report_name(flow, user_id)}.trace.zip")
+            try:
+                os.makedirs(FAILURE_CAPTURE_DIR, exist_ok=True)
+                page.context.tracing.stop(path=trace_path)
+            except Exception as e:
+                report['trace_error'] = str(e)
+                trace_path = None
+    FAILURE_CAPTURES.inc(flow=flow)
+    writer.submit(_report_name(flow, user_id), report, trace_path)
+
+
+async def capture_async(flow, user_id, result, run=None, console=None, **extra):
+    """capture for playwright.async_api pages"""
+    if FAILURE_CAPTURE == 'off':
+        return
+    report = _base_report(flow, user_id, result, run, console, extra)
+    page = run.page if run is not None else None
+    trace_path = None
+    if page is not None:
+        try:
+            report['url'] = page.url
+            report['dom'] = await page.content()
+            screenshot = await page.screenshot(timeout=FAILURE_CAPTURE_SCREENSHOT_MS)
+            report['screenshot_png_b64'] = base64.b64encode(screenshot).decode('ascii')
+        except Exception as e:
+            report['snapshot_error'] = str(e)
+        if FAILURE_CAPTURE == 'trace':
+            trace_path = os.path.join(FAILURE_CAPTURE_DIR, f".{_report_name(flow, user_id)}.trace.zip")
+            try:
+                os.makedirs(FAILURE_CAPTURE_DIR, exist_ok=True)
+                await page.context.tracing.stop(path=trace_path)
+            except Exception as e:
+                report['trace_error'] = str(e)
+                trace_path = None
+    FAILURE_CAPTURES.inc(flow=flow)
+    writer.submit(_report_name(flow, user_id), report, trace_path)
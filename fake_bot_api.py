@@ -0,0 +1,207 @@
+"""
+Local stand-in for the Telegram Bot API, for load tests.
+
+Answers the methods the bot calls (sendMessage, editMessageText,
+setWebhook, deleteWebhook, getMe, ...) with plausible results and records
+every call, so a harness can wait for the replies a chat receives. It can
+add latency to every call and answer a fraction of them with 429s.
+
+Point telebot at it with
+    apihelper.API_URL = fake.api_url
+
+Run it directly to watch the traffic of a bot pointed at it:
+    python fake_bot_api.py --port 8081 --latency-ms 50 --rate-limit 0.05
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Methods answered with a Message built from the call's chat_id and text
+MESSAGE_METHODS = {'sendMessage', 'editMessageText'}
+
+
+class FakeApiConfig:
+    def __init__(self, latency_ms=0, rate_limit=0.0, retry_after=1):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+
+
+class CallLog:
+    """Every Bot API call received, with a condition to wait on new ones"""
+
+    def __init__(self):
+        self.calls = []
+        self.by_method = {}
+        self.rate_limited = 0
+        self._by_chat = {}
+        self._message_id = 0
+        self._cond = threading.Condition()
+
+    def record(self, method, params):
+        with self._cond:
+            self._message_id += 1
+            call = {'ts': time.time(), 'method': method, 'params': params, 'message_id': self._message_id}
+            self.calls.append(call)
+            self.by_method[method] = self.by_method.get(method, 0) + 1
+            chat_id = params.get('chat_id')
+            if chat_id is not None:
+                self._by_chat.setdefault(str(chat_id), []).append(call)
+            self._cond.notify_all()
+            return call
+
+    def chat_calls(self, chat_id):
+        with self._cond:
+            return list(self._by_chat.get(str(chat_id), []))
+
+    def wait_for(self, chat_id, predicate, start=0, timeout=60):
+        """
+        First call to chat_id at index >= start that predicate accepts;
+        returns (index, call), or (None, None) after timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                calls = self._by_chat.get(str(chat_id), [])
+                for index in range(start, len(calls)):
+                    if predicate(calls[index]):
+                        return index, calls[index]
+                start = max(start, len(calls))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, None
+                self._cond.wait(remaining)
+
+    def stats(self):
+        with self._cond:
+            return {'calls': len(self.calls), 'by_method': dict(self.by_method), 'rate_limited': self.rate_limited}
+
+
+def _parse_params(handler):
+    params = {k: v[-1] for k, v in parse_qs(handler.path.partition('?')[2]).items()}
+    length = int(handler.headers.get('Content-Length') or 0)
+    if length:
+        body = handler.rfile.read(length).decode('utf-8')
+        if 'json' in (handler.headers.get('Content-Type') or ''):
+            params.update(json.loads(body))
+        else:
+            params.update({k: v[-1] for k, v in parse_qs(body).items()})
+    return params
+
+
+def _result(method, params, call):
+    if method in MESSAGE_METHODS:
+        chat_id = params.get('chat_id')
+        return {
+            'message_id': int(params.get('message_id') or call['message_id']),
+            'date': int(call['ts']),
+            'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit() else chat_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'},
+            'text': params.get('text', ''),
+        }
+    if method == 'getMe':
+        return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+    if method == 'getUpdates':
+        return []
+    return True
+
+
+def make_handler(config, log):
+    class FakeApiHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self):
+            # /bot<token>/<method>
+            method = self.path.partition('?')[0].rstrip('/').rsplit('/', 1)[-1]
+            params = _parse_params(self)
+            if config.latency_ms:
+                time.sleep(config.latency_ms / 1000)
+            if config.rate_limit and random.random() < config.rate_limit:
+                log.rate_limited += 1
+                self._reply(429, {
+                    'ok': False, 'error_code': 429,
+                    'description': f"Too Many Requests: retry after {config.retry_after}",
+                    'parameters': {'retry_after': config.retry_after},
+                })
+                return
+            call = log.record(method, params)
+            self._reply(200, {'ok': True, 'result': _result(method, params, call)})
+
+        do_GET = _handle
+        do_POST = _handle
+
+    return FakeApiHandler
+
+
+class FakeBotApi:
+    """Runs the fake Bot API on a background thread"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or FakeApiConfig()
+        self.log = CallLog()
+        self.server = ThreadingHTTPServer((host, port), make_handler(self.config, self.log))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        """Value for telebot.apihelper.API_URL"""
+        return self.url + "/bot{0}/{1}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_fake_api_arguments(parser):
+    parser.add_argument('--api-latency-ms', type=int, default=0, help='delay of every fake Bot API call')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of Bot API calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after of the injected 429s')
+
+
+def fake_api_config_from_args(args):
+    return FakeApiConfig(latency_ms=args.api_latency_ms, rate_limit=args.rate_limit, retry_after=args.retry_after)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_fake_api_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeBotApi(fake_api_config_from_args(args), host=args.host, port=args.port)
+    print(f"🧪 Fake Bot API serving on {fake.url}")
+    print(f"   Use apihelper.API_URL = {fake.api_url!r}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📨 {fake.log.stats()}")
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,227 @@
+"""
+Offline stand-in for the signup site, exposing the DOM contract create_account
+relies on:
+
+  /         "Sign up to ride, drive, and ..." button (opens a popup, or reveals
+            an inline "Sign up" link with --no-popup)
+  /choose   popup with the "Ride undefined" link
+  /login    "Sign up" link
+  /signup   forward-button -> "Enter phone number or email" textbox ->
+            forward-button -> optional CAPTCHA iframe or #EMAIL_OTP_CODE-{0..3}
+  /welcome  reached once all four OTP digits are filled
+
+Run it directly to click through by hand:
+    python fixture_site.py --port 8765 --latency-ms 200
+"""
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body></html>
+"""
+
+HOME_BODY = """
+<h1>Go anywhere</h1>
+<button id="signup" type="button">Sign up to ride, drive, and more</button>
+<nav id="inline-links" hidden><a href="/signup">Sign up</a></nav>
+<script>
+document.getElementById('signup').addEventListener('click', function () {{
+  setTimeout(function () {{
+    if ({popup}) {{
+      window.open('/choose', '_blank');
+    }} else {{
+      document.getElementById('inline-links').hidden = false;
+    }}
+  }}, {ui_delay});
+}});
+</script>
+"""
+
+CHOOSE_BODY = """
+<h1>Choose an account</h1>
+<a href="/login" aria-label="Ride undefined">Ride</a>
+<a href="/login?drive=1">Drive</a>
+"""
+
+LOGIN_BODY = """
+<h1>Log in</h1>
+<p>No account yet? <a href="/signup">Sign up</a></p>
+"""
+
+SIGNUP_BODY = """
+<h1>Create your account</h1>
+<div id="intro"><p>Let's get started.</p></div>
+<form id="email-form" hidden onsubmit="return false;">
+  <input type="text" aria-label="Enter phone number or email" id="email">
+</form>
+<div id="otp" hidden>
+  <p>Enter the 4-digit code sent to your email</p>
+  <input id="EMAIL_OTP_CODE-0" maxlength="1">
+  <input id="EMAIL_OTP_CODE-1" maxlength="1">
+  <input id="EMAIL_OTP_CODE-2" maxlength="1">
+  <input id="EMAIL_OTP_CODE-3" maxlength="1">
+</div>
+<button type="button" data-testid="forward-button" id="forward">Continue</button>
+<script>
+var stage = 0;
+var forward = document.getElementById('forward');
+forward.addEventListener('click', function () {{
+  if (stage === 0) {{
+    stage = 1;
+    setTimeout(function () {{
+      document.getElementById('intro').hidden = true;
+      document.getElementById('email-form').hidden = false;
+    }}, {ui_delay});
+  }} else if (stage === 1 && document.getElementById('email').value) {{
+    stage = 2;
+    forward.hidden = true;
+    setTimeout(function () {{
+      document.getElementById('email-form').hidden = true;
+      if ({captcha}) {{
+        var frame = document.createElement('iframe');
+        frame.title = 'Verification challenge';
+        frame.src = 'about:blank';
+        document.body.appendChild(frame);
+      }} else {{
+        document.getElementById('otp').hidden = false;
+      }}
+    }}, {otp_delay});
+  }}
+}});
+document.getElementById('otp').addEventListener('input', function () {{
+  for (var i = 0; i < 4; i++) {{
+    if (!document.getElementById('EMAIL_OTP_CODE-' + i).value) return;
+  }}
+  setTimeout(function () {{ window.location.href = '/welcome'; }}, {ui_delay});
+}});
+</script>
+"""
+
+WELCOME_BODY = """
+<h1>Welcome aboard!</h1>
+"""
+
+
+class FixtureConfig:
+    def __init__(self, latency_ms=0, ui_delay_ms=100, otp_delay_ms=300, captcha_rate=0.0, popup=True):
+        self.latency_ms = latency_ms
+        self.ui_delay_ms = ui_delay_ms
+        self.otp_delay_ms = otp_delay_ms
+        self.captcha_rate = captcha_rate
+        self.popup = popup
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+
+def _js_bool(value):
+    return 'true' if value else 'false'
+
+
+def make_handler(config):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _page(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/':
+                return 'Home', HOME_BODY.format(popup=_js_bool(config.popup), ui_delay=config.ui_delay_ms)
+            if path == '/choose':
+                return 'Choose', CHOOSE_BODY
+            if path == '/login':
+                return 'Log in', LOGIN_BODY
+            if path == '/signup':
+                captcha = random.random() < config.captcha_rate
+                return 'Sign up', SIGNUP_BODY.format(
+                    ui_delay=config.ui_delay_ms, otp_delay=config.otp_delay_ms, captcha=_js_bool(captcha)
+                )
+            if path == '/welcome':
+                return 'Welcome', WELCOME_BODY
+            return None
+
+        def do_GET(self):
+            config.count_request()
+            if config.latency_ms:
+                time.sleep(config.latency_ms / 1000.0)
+
+            page = self._page()
+            if page is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            title, body = page
+            payload = PAGE.format(title=title, body=body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FixtureHandler
+
+
+class FixtureSite:
+    """Runs the fixture server on a background thread"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or FixtureConfig()
+        self.server = ThreadingHTTPServer((host, port), make_handler(self.config))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fixture-site', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_fixture_arguments(parser):
+    parser.add_argument('--latency-ms', type=int, default=0, help='server delay per request')
+    parser.add_argument('--ui-delay-ms', type=int, default=100, help='client-side delay before UI changes')
+    parser.add_argument('--otp-delay-ms', type=int, default=300, help='delay before OTP fields or CAPTCHA appear')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='fraction of signups that get a CAPTCHA')
+    parser.add_argument('--no-popup', action='store_true', help='reveal the Sign up link inline instead of a popup')
+
+
+def fixture_config_from_args(args):
+    return FixtureConfig(
+        latency_ms=args.latency_ms,
+        ui_delay_ms=args.ui_delay_ms,
+        otp_delay_ms=args.otp_delay_ms,
+        captcha_rate=args.captcha_rate,
+        popup=not args.no_popup,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline stand-in signup site')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_fixture_arguments(parser)
+    args = parser.parse_args()
+
+    site = FixtureSite(fixture_config_from_args(args), host=args.host, port=args.port)
+    print(f"🧪 Fixture site serving on {site.url}")
+    print(f"   Use SIGNUP_HOME_URL={site.url}")
+    site.server.serve_forever()
@@ -0,0 +1,141 @@
+import os
+import json
+import threading
+from telebot import apihelper
+import metrics
+
+# 'webhook': Telegram POSTs updates to the Flask app; 'polling': we long-poll getUpdates
+INGESTION_MODE = os.environ.get('INGESTION_MODE', 'webhook')
+# Updates per getUpdates call (Telegram allows 1-100)
+POLL_BATCH_SIZE = max(1, min(100, int(os.environ.get('POLL_BATCH_SIZE', 100))))
+# Seconds Telegram holds a getUpdates call open when there is nothing to return
+POLL_TIMEOUT = int(os.environ.get('POLL_TIMEOUT', 25))
+# Wait before retrying after a failed getUpdates call or a full worker queue
+POLL_RETRY_DELAY = float(os.environ.get('POLL_RETRY_DELAY', 1))
+
+UPDATES_INGESTED = metrics.counter('updates_ingested_total', 'Incoming updates by transport and what the pipeline did with them')
+
+ACCEPTED = 'accepted'
+FORWARDED = 'forwarded'
+BUSY = 'busy'
+DUPLICATE = 'duplicate'
+
+
+class WebhookTransport:
+    """
+    Telegram pushes each update to a Flask route.
+
+    handle() hands the raw body to the shared pipeline and answers 503 when
+    it is full, so Telegram redelivers the update later. Duplicates of an
+    update already taken are acknowledged like any other.
+    """
+
+    name = 'webhook'
+
+    def __init__(self, bot, ingest, url):
+        self.bot = bot
+        self.ingest = ingest
+        self.url = url
+
+    def handle(self, raw):
+        result = self.ingest(raw)
+        UPDATES_INGESTED.inc(transport=self.name, result=result)
+        if result == BUSY:
+            return "busy", 503
+        return "!", 200
+
+    def start(self):
+        self.bot.remove_webhook()
+        self.bot.set_webhook(url=self.url)
+        print(f"✅ Webhook set to: {self.url}")
+
+    def stats(self):
+        return {'transport': self.name, 'url': self.url}
+
+
+class PollingTransport:
+    """
+    Long-polls getUpdates and hands every update to the shared pipeline.
+
+    The pipeline only queues updates on the chat workers, so a batch is
+    handed off immediately and its updates run concurrently while the next
+    getUpdates call is already waiting. When the pipeline is full the
+    offset stays on the refused update and it is fetched again after a
+    short pause, which is what a 503 does for the webhook.
+    """
+
+    name = 'polling'
+
+    def __init__(self, bot, ingest, batch_size=POLL_BATCH_SIZE, timeout=POLL_TIMEOUT,
+                 retry_delay=POLL_RETRY_DELAY, allowed_updates=None):
+        self.bot = bot
+        self.ingest = ingest
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.allowed_updates = allowed_updates
+        self.offset = None
+        self.polls = 0
+        self.poll_errors = 0
+        self.received = 0
+        self.refused = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """One getUpdates round; returns how many updates the pipeline took"""
+        self.polls += 1
+        batch = apihelper.get_updates(
+            self.bot.token, offset=self.offset, limit=self.batch_size,
+            allowed_updates=self.allowed_updates, long_polling_timeout=self.timeout,
+        )
+        taken = 0
+        for raw_update in batch:
+            self.received += 1
+            result = self.ingest(json.dumps(raw_update).encode('utf-8'))
+            UPDATES_INGESTED.inc(transport=self.name, result=result)
+            if result == BUSY:
+                # Ask for this update again on the next round
+                self.refused += 1
+                self.offset = raw_update['update_id']
+                return taken
+            self.offset = raw_update['update_id'] + 1
+            taken += 1
+        return taken
+
+    def run(self):
+        # getUpdates is refused while a webhook is set
+        self.bot.remove_webhook()
+        print(f"📥 Long-polling for updates (batch {self.batch_size}, timeout {self.timeout}s)")
+        while not self._stop.is_set():
+            try:
+                received = self.received
+                taken = self.poll_once()
+                if taken < self.received - received:
+                    self._stop.wait(self.retry_delay)
+            except Exception as e:
+                self.poll_errors += 1
+                print(f"⚠️ getUpdates failed: {e}")
+                self._stop.wait(self.retry_delay)
+
+    def start(self):
+        """Poll on a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='update-poller', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'transport': self.name,
+            'batch_size': self.batch_size,
+            'timeout': self.timeout,
+            'offset': self.offset,
+            'polls': self.polls,
+            'poll_errors': self.poll_errors,
+            'received': self.received,
+            'refused': self.refused,
+        }
@@ -0,0 +1,263 @@
+"""
+Load-test telbot's webhook with a fake Bot API and the stub signup engine.
+
+    python load_test.py --chats 40 --concurrency 1,4,16,64
+    python load_test.py --step1-ms 8000 --rate-limit 0.05 --json load.json
+
+Every simulated chat POSTs /create, an email and an OTP as synthetic
+updates to the /<TOKEN> route of telbot.app, and waits for the bot's reply
+to each before sending the next, like a user would. Replies are read from
+the fake Bot API's call log. For each concurrency level it reports webhook
+ack latency, end-to-end flow time, outcomes and throughput.
+
+All levels run against one telbot instance, so circuit breaker and
+adaptive concurrency state carries over from one level to the next.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import itertools
+import threading
+import requests
+
+from bench_signup import percentile
+from fake_bot_api import FakeBotApi, add_fake_api_arguments, fake_api_config_from_args
+
+LOAD_TEST_TOKEN = '123456:load-test'
+
+# Text the bot's reply starts or contains -> what it means for the simulated user
+CREATE_REPLIES = {
+    'send me the email address': 'prompted',
+    'paused new attempts': 'breaker_open',
+}
+EMAIL_REPLIES = {
+    'Send me the 4-digit OTP': 'otp_ready',
+    'CAPTCHA Challenge': 'captcha_required',
+    'Issue during email entry': 'error',
+    "couldn't start a browser": 'unavailable',
+    'waiting line is full': 'rejected',
+    'overloaded right now': 'rejected',
+    'paused new attempts': 'breaker_open',
+    'Unexpected error during automation': 'exception',
+}
+OTP_REPLIES = {
+    'Account Creation Successful': 'success',
+    'Process Completed': 'completed',
+    'Issue during OTP entry': 'error',
+    'Error during OTP processing': 'exception',
+    'Session expired or not found': 'expired',
+}
+
+
+def _classify(call, replies):
+    if call['method'] != 'sendMessage':
+        return None
+    text = call['params'].get('text', '')
+    for marker, meaning in replies.items():
+        if marker in text:
+            return meaning
+    return None
+
+
+class LoadTest:
+    """Drives simulated chats through a running telbot webhook"""
+
+    def __init__(self, webhook_url, fake, reply_timeout=60, max_redeliveries=5):
+        self.webhook_url = webhook_url
+        self.fake = fake
+        self.reply_timeout = reply_timeout
+        self.max_redeliveries = max_redeliveries
+        self._update_ids = itertools.count(1)
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def post_update(self, chat_id, text, acks):
+        """POST one message update; redelivers on 503 like Telegram does"""
+        update_id = next(self._update_ids)
+        update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Load'},
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': text,
+            },
+        }
+        if text.startswith('/'):
+            update['message']['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        for attempt in range(self.max_redeliveries + 1):
+            started = time.perf_counter()
+            response = self._session().post(self.webhook_url, json=update, timeout=30)
+            acks.append((time.perf_counter() - started, response.status_code))
+            if response.status_code != 503:
+                return response.status_code
+            time.sleep(min(2 ** attempt * 0.25, 5))
+        return 503
+
+    def say(self, chat_id, text, replies, cursor, acks):
+        """Send text and wait for the reply replies recognises: (meaning, cursor)"""
+        if self.post_update(chat_id, text, acks) != 200:
+            return 'webhook_busy', cursor
+        index, call = self.fake.log.wait_for(
+            chat_id, lambda call: _classify(call, replies) is not None, start=cursor, timeout=self.reply_timeout
+        )
+        if call is None:
+            return 'timeout', cursor
+        return _classify(call, replies), index + 1
+
+    def run_chat(self, chat_id, acks):
+        """One user's /create -> email -> OTP; returns the outcome"""
+        meaning, cursor = self.say(chat_id, '/create', CREATE_REPLIES, 0, acks)
+        if meaning != 'prompted':
+            return f"create:{meaning}"
+        meaning, cursor = self.say(chat_id, f"load{chat_id}@example.com", EMAIL_REPLIES, cursor, acks)
+        if meaning != 'otp_ready':
+            return f"email:{meaning}"
+        meaning, cursor = self.say(chat_id, '1234', OTP_REPLIES, cursor, acks)
+        return f"otp:{meaning}"
+
+    def run_level(self, chats, concurrency, first_chat_id):
+        jobs = queue.Queue()
+        for chat_id in range(first_chat_id, first_chat_id + chats):
+            jobs.put(chat_id)
+        acks = []
+        flows = []
+        outcomes = {}
+        lock = threading.Lock()
+        api_before = self.fake.log.stats()
+
+        def worker():
+            while True:
+                try:
+                    chat_id = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                started = time.perf_counter()
+                try:
+                    outcome = self.run_chat(chat_id, acks)
+                except Exception as e:
+                    outcome = f"harness_error:{type(e).__name__}"
+                with lock:
+                    flows.append((time.perf_counter() - started, outcome))
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, name=f"load-{n}") for n in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        api_after = self.fake.log.stats()
+        ack_seconds = [seconds for seconds, _status in acks]
+        completed = [seconds for seconds, outcome in flows if outcome == 'otp:success']
+        return {
+            'chats': chats,
+            'concurrency': concurrency,
+            'elapsed_seconds': elapsed,
+            'throughput_flows_per_second': len(completed) / elapsed if elapsed else 0.0,
+            'outcomes': outcomes,
+            'webhook': {
+                'posts': len(acks),
+                'busy_503': sum(1 for _seconds, status in acks if status == 503),
+                'p50_ms': percentile(ack_seconds, 50) * 1000,
+                'p95_ms': percentile(ack_seconds, 95) * 1000,
+                'p99_ms': percentile(ack_seconds, 99) * 1000,
+            },
+            'flow': {
+                'completed': len(completed),
+                'p50_seconds': percentile(completed, 50),
+                'p95_seconds': percentile(completed, 95),
+                'p99_seconds': percentile(completed, 99),
+            },
+            'bot_api': {
+                'calls': api_after['calls'] - api_before['calls'],
+                'rate_limited': api_after['rate_limited'] - api_before['rate_limited'],
+            },
+        }
+
+
+def print_report(levels):
+    print(f"\n{'conc':>5}{'chats':>7}{'ok':>5}{'flows/s':>9}{'ack p50':>9}{'ack p99':>9}"
+          f"{'e2e p50':>9}{'e2e p95':>9}{'503s':>6}{'429s':>6}  outcomes")
+    for r in levels:
+        outcomes = ', '.join(f"{k}={v}" for k, v in sorted(r['outcomes'].items()))
+        print(f"{r['concurrency']:>5}{r['chats']:>7}{r['flow']['completed']:>5}"
+              f"{r['throughput_flows_per_second']:>9.2f}"
+              f"{r['webhook']['p50_ms']:>7.0f}ms{r['webhook']['p99_ms']:>7.0f}ms"
+              f"{r['flow']['p50_seconds']:>8.1f}s{r['flow']['p95_seconds']:>8.1f}s"
+              f"{r['webhook']['busy_503']:>6}{r['bot_api']['rate_limited']:>6}  {outcomes}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the telbot webhook with a fake Bot API and stub engine')
+    parser.add_argument('--chats', type=int, default=20, help='simulated chats per concurrency level')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated concurrent chat counts')
+    parser.add_argument('--engine', choices=['stub', 'sync', 'async'], default='stub',
+                        help='signup engine (sync/async need SIGNUP_HOME_URL, e.g. the fixture site)')
+    parser.add_argument('--step1-ms', type=float, default=2000, help='stub engine step 1 latency')
+    parser.add_argument('--step2-ms', type=float, default=1000, help='stub engine step 2 latency')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='stub engine CAPTCHA rate')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='stub engine error rate')
+    parser.add_argument('--reply-timeout', type=float, default=120, help='seconds to wait for each bot reply')
+    parser.add_argument('--json', default=None, help='also write the report to this file')
+    add_fake_api_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake = FakeBotApi(fake_api_config_from_args(args)).start()
+    print(f"🧪 Fake Bot API on {fake.url}")
+
+    # telbot and create_account read these at import time
+    os.environ['TELEGRAM_BOT_TOKEN'] = LOAD_TEST_TOKEN
+    os.environ['INGESTION_MODE'] = 'webhook'
+    os.environ['SIGNUP_ENGINE'] = args.engine
+    os.environ['STUB_STEP1_MS'] = str(args.step1_ms)
+    os.environ['STUB_STEP2_MS'] = str(args.step2_ms)
+    os.environ['STUB_CAPTCHA_RATE'] = str(args.captcha_rate)
+    os.environ['STUB_ERROR_RATE'] = str(args.error_rate)
+    os.environ.setdefault('SESSION_AFFINITY', '0')
+
+    from telebot import apihelper
+    apihelper.API_URL = fake.api_url
+    from werkzeug.serving import make_server
+    import telbot
+
+    # One access log line per POST would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, telbot.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-webhook', daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{server.server_port}/{LOAD_TEST_TOKEN}"
+    print(f"🌐 telbot webhook on {webhook_url}")
+
+    load = LoadTest(webhook_url, fake, reply_timeout=args.reply_timeout)
+    levels = []
+    first_chat_id = 1000
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(',') if c.strip()):
+            print(f"🚀 {args.chats} chats at concurrency {concurrency}...")
+            levels.append(load.run_level(args.chats, concurrency, first_chat_id))
+            first_chat_id += args.chats
+    finally:
+        server.shutdown()
+        fake.stop()
+
+    print_report(levels)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(levels, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import metrics
+from process_memory import process_table, find_process, tree_rss, process_tree_rss, memory_limit
+
+MB = 1024 * 1024
+
+# Largest RSS a browser's process tree may reach before the sessions on it are closed
+SESSION_MEMORY_BUDGET_MB = float(os.environ.get('SESSION_MEMORY_BUDGET_MB', 1024))
+# No new browser contexts while the whole bot (with its browsers) is above this;
+# defaults to 85% of the container's cgroup limit, or of physical memory without one.
+# With SIGNUP_ENGINE=process the bot checks it over all workers, each of which gets an equal share
+MEMORY_CEILING_MB = float(os.environ.get(
+    'MEMORY_CEILING_MB', (memory_limit() or 0) * 0.85 / MB
+))
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get('MEMORY_SAMPLE_INTERVAL', 5))
+
+MEMORY_EVENTS = metrics.counter('browser_memory_events_total', 'Sessions closed over budget and launches refused at the ceiling')
+
+
+class MemoryMonitor:
+    """
+    Samples the RSS of every leased browser's process tree from /proc.
+
+    Browsers are found through the marker argument they were launched with
+    (see browser_pool.launch_marker); contexts of one browser share its
+    processes, so a session is charged for the whole tree it runs in. A
+    browser over budget is retired and the sessions on it are evicted from
+    the watched registry with reason 'memory'. Peaks are kept on each lease
+    for the flow's result dict.
+
+    Evicting every session on the browser is deliberate. RSS can only be
+    measured per process tree, not per context, so there is no way to tell
+    which session grew it. Closing one guessed session would leave the
+    browser over budget and still growing until the OOM killer takes all
+    of them.
+    """
+
+    def __init__(self, budget=int(SESSION_MEMORY_BUDGET_MB * MB), ceiling=int(MEMORY_CEILING_MB * MB),
+                 interval=MEMORY_SAMPLE_INTERVAL):
+        self.budget = budget
+        self.ceiling = ceiling
+        self.interval = interval
+        self.sessions = None
+        self.over_budget = 0
+        self.refused = 0
+        self._leases = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, sessions):
+        """Evict over-budget sessions from this SessionRegistry"""
+        self.sessions = sessions
+
+    def track(self, lease):
+        lease.peak_rss = 0
+        with self._lock:
+            self._leases.append(lease)
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._sample_forever, name='memory-monitor', daemon=True)
+                self._thread.start()
+
+    def _browser_rss(self, pooled, table):
+        if getattr(pooled, 'marker', None) is None:
+            return None
+        if pooled.pid is None or pooled.pid not in table:
+            pooled.pid = find_process(pooled.marker, table)
+            if pooled.pid is None:
+                return None
+        return tree_rss(pooled.pid, table)
+
+    def sample(self):
+        """Update peaks and enforce the budget; returns {browser pid: rss}"""
+        if not os.path.isdir('/proc'):
+            return {}
+        table = process_table()
+        with self._lock:
+            self._leases = [lease for lease in self._leases if not lease.released]
+            leases = list(self._leases)
+
+        browsers = {}
+        for lease in leases:
+            browsers.setdefault(id(lease.pooled), (lease.pooled, []))[1].append(lease)
+
+        sampled = {}
+        for pooled, group in browsers.values():
+            rss = self._browser_rss(pooled, table)
+            if rss is None:
+                continue
+            sampled[pooled.pid] = rss
+            for lease in group:
+                lease.peak_rss = max(lease.peak_rss, rss)
+            if self.budget and rss > self.budget and not pooled.retired:
+                self._enforce(pooled, rss, group)
+        return sampled
+
+    def _enforce(self, pooled, rss, group):
+        # No new contexts here; the pool closes the browser once its last context is released.
+        # Every session on it goes: the tree's RSS can't be split between them
+        pooled.retired = True
+        self.over_budget += 1
+        MEMORY_EVENTS.inc(kind='over_budget')
+        print(f"🧠 {pooled.engine} browser {pooled.pid} uses {rss / MB:.0f} MiB "
+              f"(budget {self.budget / MB:.0f} MiB), closing its sessions")
+        if self.sessions is None:
+            return
+        for key, session in self.sessions.items():
+            if session.get('lease') in group:
+                self.sessions.evict(key, 'memory')
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Memory monitor error: {e}")
+
+    def ceiling_exceeded(self):
+        """Why no new context should be started right now, or None"""
+        if not self.ceiling:
+            return None
+        rss = process_tree_rss()
+        if rss <= self.ceiling:
+            return None
+        self.refused += 1
+        MEMORY_EVENTS.inc(kind='ceiling')
+        return f"Memory ceiling reached ({rss / MB:.0f} of {self.ceiling / MB:.0f} MiB), not starting another browser"
+
+    def report(self, lease):
+        """Memory section of a flow result for lease"""
+        if os.path.isdir('/proc') and getattr(lease.pooled, 'marker', None) is not None:
+            rss = self._browser_rss(lease.pooled, process_table())
+            if rss is not None:
+                lease.peak_rss = max(getattr(lease, 'peak_rss', 0), rss)
+        return {
+            'peak_rss_bytes': getattr(lease, 'peak_rss', 0),
+            'budget_bytes': self.budget,
+            'browser_pid': getattr(lease.pooled, 'pid', None),
+        }
+
+    def stats(self):
+        with self._lock:
+            tracked = len(self._leases)
+        return {
+            'tracked_leases': tracked,
+            'budget_bytes': self.budget,
+            'ceiling_bytes': self.ceiling,
+            'over_budget': self.over_budget,
+            'refused': self.refused,
+        }
+
+
+memory_monitor = MemoryMonitor()
+
+metrics.gauge('bot_process_tree_rss_bytes', 'RSS of the bot and all of its browsers', process_tree_rss)
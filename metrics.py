@@ -0,0 +1,205 @@
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+# Seconds; covers fast locator hits up to full-length navigation timeouts
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + list(extra or [])
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self._values = {}
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.func is not None:
+            try:
+                return [(self.name, (), self.func())]
+            except Exception:
+                return []
+        return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def samples(self):
+        out = []
+        for key, entry in self._values.items():
+            for bound, count in zip(self.buckets, entry['counts']):
+                out.append((self.name + '_bucket', key + (('le', bound),), count))
+            out.append((self.name + '_bucket', key + (('le', '+Inf'),), entry['count']))
+            out.append((self.name + '_sum', key, entry['sum']))
+            out.append((self.name + '_count', key, entry['count']))
+        return out
+
+
+def _register(metric):
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name, help_text):
+    return _register(Counter(name, help_text))
+
+
+def gauge(name, help_text, func=None):
+    """Register a gauge; with func, its value is read at scrape time"""
+    metric = _register(Gauge(name, help_text, func))
+    if func is not None:
+        metric.func = func
+    return metric
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, buckets))
+
+
+def render():
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        with _lock:
+            samples = metric.samples()
+        for name, key, value in samples:
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+STEP_DURATION = histogram('signup_step_duration_seconds', 'Duration of each named step of the signup flow')
+FLOW_DURATION = histogram('signup_flow_duration_seconds', 'Total duration of signup step 1 / step 2')
+FLOW_RESULTS = counter('signup_results_total', 'Signup results by flow and status')
+
+
+# Callables receiving (flow, step, seconds) for every timed step, e.g. benchmarks
+step_listeners = []
+
+# Callables receiving (flow, step, seconds, outcome), e.g. tracing
+span_listeners = []
+
+
+def _notify_span(flow, step, elapsed, outcome):
+    for listener in step_listeners:
+        listener(flow, step, elapsed)
+    for listener in span_listeners:
+        try:
+            listener(flow, step, elapsed, outcome)
+        except Exception as e:
+            print(f"⚠️ Span listener error: {e}")
+
+
+@contextmanager
+def step_timer(flow, step):
+    """
+    Time one named step, e.g. with step_timer('step1', 'navigate_home') as span:
+
+    The step's outcome is 'ok', the name of the exception that escaped it,
+    or whatever the block stores in span['outcome'].
+    """
+    started = time.perf_counter()
+    span = {'outcome': 'ok'}
+    try:
+        yield span
+    except BaseException as e:
+        if span['outcome'] == 'ok':
+            span['outcome'] = type(e).__name__
+        raise
+    finally:
+        record_step(flow, step, time.perf_counter() - started, span['outcome'])
+
+
+def record_step(flow, step, elapsed, outcome='ok'):
+    """Record a step timed elsewhere (a browser worker process) exactly as step_timer does"""
+    STEP_DURATION.observe(elapsed, flow=flow, step=step)
+    _notify_span(flow, step, elapsed, outcome)
+
+
+def record_result(flow):
+    """Decorator: time a step function and count the status of its result dict"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = 'exception'
+            try:
+                result = func(*args, **kwargs)
+                status = result.get('status', 'unknown')
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                FLOW_DURATION.observe(elapsed, flow=flow)
+                FLOW_RESULTS.inc(flow=flow, status=status)
+                _notify_span(flow, 'total', elapsed, status)
+        return wrapper
+    return decorator
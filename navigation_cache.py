@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+import metrics
+
+# How long a learned shortcut to the email form is trusted; NAV_CACHE_TTL=0 disables it
+NAV_CACHE_TTL = float(os.environ.get('NAV_CACHE_TTL', 1800))
+# How long a URL whose direct load did not show the email form is kept out of the cache
+NAV_CACHE_BACKOFF = float(os.environ.get('NAV_CACHE_BACKOFF', NAV_CACHE_TTL))
+
+NAV_CACHE_LOOKUPS = metrics.counter('signup_nav_cache_total', 'Email form shortcut lookups by result (hit, miss, cold)')
+NAV_CACHE_SAVED = metrics.counter('signup_nav_cache_seconds_saved_total', 'Seconds saved by skipping the homepage path')
+NAV_CACHE_WASTED = metrics.counter('signup_nav_cache_seconds_wasted_total', 'Seconds spent on shortcuts that did not work')
+
+
+class NavigationCache:
+    """
+    Remembers the URL where step 1 found the email textbox.
+
+    The full path (homepage, signup button, popup, Ride, Sign up, forward)
+    only exists to get there, so later flows can load the stored URL
+    directly. Where the path ended up is only a candidate: the textbox may
+    have needed an in-page click there, so the next flow tries it once and
+    it is trusted after that load showed the textbox. A shortcut that
+    fails is dropped and its URL is not stored again for NAV_CACHE_BACKOFF,
+    so a page that never opens on the form costs one failed try per
+    backoff instead of one per flow.
+    """
+
+    def __init__(self, ttl=NAV_CACHE_TTL, backoff=NAV_CACHE_BACKOFF):
+        self.ttl = ttl
+        self.backoff = backoff
+        self.hits = 0
+        self.misses = 0
+        self.cold = 0
+        self.seconds_saved = 0.0
+        self.seconds_wasted = 0.0
+        self._entries = {}
+        # key -> {'url', 'until'} for shortcuts whose direct load just failed
+        self._rejected = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached shortcut URL for key, or None if there is no fresh one"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.cold += 1
+        if entry is None:
+            NAV_CACHE_LOOKUPS.inc(result='cold')
+            return None
+        return entry['url']
+
+    def store(self, key, url, path_seconds):
+        """Record where the full path ended up and how long it took, as a candidate shortcut"""
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            rejected = self._rejected.get(key)
+            if rejected is not None and rejected['until'] <= now:
+                del self._rejected[key]
+                rejected = None
+            previous = self._entries.get(key) or rejected
+            if previous is not None:
+                # Smooth the full-path cost so one slow run doesn't inflate savings
+                path_seconds = 0.7 * previous['path_seconds'] + 0.3 * path_seconds
+            if rejected is not None and rejected['url'] == url:
+                # Just failed as a direct load; keep only the path cost for later savings
+                rejected['path_seconds'] = path_seconds
+                return
+            self._entries[key] = {'url': url, 'stored_at': now, 'path_seconds': path_seconds, 'verified': False}
+
+    def record_hit(self, key, seconds):
+        """The shortcut showed the email textbox after `seconds`; it is trusted from now on"""
+        with self._lock:
+            entry = self._entries.get(key)
+            saved = max(0.0, entry['path_seconds'] - seconds) if entry is not None else 0.0
+            if entry is not None:
+                entry['verified'] = True
+            self.hits += 1
+            self.seconds_saved += saved
+        NAV_CACHE_LOOKUPS.inc(result='hit')
+        NAV_CACHE_SAVED.inc(saved)
+        return saved
+
+    def record_miss(self, key, seconds):
+        """The shortcut failed; forget it and keep its URL out until the backoff passes"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._rejected[key] = {
+                    'url': entry['url'],
+                    'until': time.monotonic() + self.backoff,
+                    'path_seconds': entry['path_seconds'],
+                }
+            self.misses += 1
+            self.seconds_wasted += seconds
+        NAV_CACHE_LOOKUPS.inc(result='miss')
+        NAV_CACHE_WASTED.inc(seconds)
+
+    def stats(self):
+        with self._lock:
+            tried = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'verified': sum(1 for entry in self._entries.values() if entry['verified']),
+                'rejected': len(self._rejected),
+                'hits': self.hits,
+                'misses': self.misses,
+                'cold': self.cold,
+                'hit_ratio': self.hits / tried if tried else 0.0,
+                'seconds_saved': self.seconds_saved,
+                'seconds_wasted': self.seconds_wasted,
+            }
+
+
+navigation_cache = NavigationCache()
@@ -0,0 +1,92 @@
+import os
+import threading
+import metrics
+from session_registry import SessionRegistry
+
+# Start step 1's navigation as soon as /create arrives, before the user sends an email
+PREWARM = os.environ.get('PREWARM', '1') != '0'
+# A prewarmed context nobody claims within this many seconds is closed
+PREWARM_TIMEOUT = float(os.environ.get('PREWARM_TIMEOUT', 120))
+# Contexts parked (or being prepared) on the email form at once
+PREWARM_MAX_SESSIONS = int(os.environ.get('PREWARM_MAX_SESSIONS', 2))
+
+PREWARM_EVENTS = metrics.counter('signup_prewarm_total', 'Speculative step 1 prefixes by outcome')
+
+
+class PrewarmCache:
+    """
+    Browser contexts already parked on the email form, one per user.
+
+    A prefix is reserved before it starts so at most max_sessions run or
+    wait at once. take() hands a parked session to step 1 (a hit); one that
+    expires, is cancelled or is replaced has its lease released and counts
+    as waste. The session dict holds the lease, context, page, route stats,
+    console buffer and the PlanRun that walked the prefix.
+    """
+
+    def __init__(self, timeout=PREWARM_TIMEOUT, max_sessions=PREWARM_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions = SessionRegistry('prewarmed_sessions', ttl=timeout)
+        self.sessions.add_listener(self._discard)
+        self.counts = {'started': 0, 'hit': 0, 'wasted': 0, 'failed': 0, 'skipped': 0}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _count(self, outcome, reason=None):
+        with self._lock:
+            self.counts[outcome] += 1
+        PREWARM_EVENTS.inc(outcome=reason or outcome)
+
+    def reserve(self):
+        """Claim room for one prefix; False when max_sessions are already in use"""
+        with self._lock:
+            if not PREWARM or len(self.sessions) + self._pending >= self.max_sessions:
+                self.counts['skipped'] += 1
+                PREWARM_EVENTS.inc(outcome='skipped')
+                return False
+            self._pending += 1
+            return True
+
+    def put(self, user_id, session):
+        """Park a prefix that reached the email form (ends its reservation)"""
+        with self._lock:
+            self._pending -= 1
+        self.sessions.evict(user_id, 'replaced')
+        self.sessions[user_id] = session
+        self._count('started')
+
+    def abandon(self):
+        """End a reservation whose prefix failed"""
+        with self._lock:
+            self._pending -= 1
+        self._count('failed')
+
+    def has(self, user_id):
+        return user_id in self.sessions
+
+    def take(self, user_id):
+        """The user's parked session for step 1, or None"""
+        session = self.sessions.pop(user_id)
+        if session is not None:
+            self._count('hit')
+        return session
+
+    def cancel(self, user_id, reason='cancelled'):
+        return self.sessions.evict(user_id, reason)
+
+    def _discard(self, user_id, session, reason):
+        self._count('wasted', reason)
+        session['lease'].release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+            stats['pending'] = self._pending
+        used = stats['hit'] + stats['wasted']
+        stats['parked'] = len(self.sessions)
+        stats['hit_ratio'] = stats['hit'] / used if used else 0.0
+        stats['waste_ratio'] = stats['wasted'] / used if used else 0.0
+        return stats
+
+
+prewarm_cache = PrewarmCache()
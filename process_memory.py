@@ -0,0 +1,132 @@
+import os
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _read_stat(pid):
+    """(ppid, rss_bytes) for pid from /proc, or None if it is gone"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, so split after its closing paren
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[1]), int(fields[21]) * _PAGE_SIZE
+
+
+def process_table():
+    table = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            info = _read_stat(int(name))
+            if info is not None:
+                table[int(name)] = info
+    return table
+
+
+def descendants(pid, table=None):
+    """pid plus every process below it"""
+    table = table if table is not None else process_table()
+    children = {}
+    for child, (ppid, _rss) in table.items():
+        children.setdefault(ppid, []).append(child)
+    found = []
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        if current in table:
+            found.append(current)
+        stack.extend(children.get(current, []))
+    return found
+
+
+def _read_cmdline(pid):
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+    except OSError:
+        return ''
+
+
+def find_process(marker, table=None):
+    """Topmost process whose command line contains marker, or None"""
+    if not os.path.isdir('/proc'):
+        return None
+    table = table if table is not None else process_table()
+    matches = {pid for pid in table if marker in _read_cmdline(pid)}
+    for pid in matches:
+        if table[pid][0] not in matches:
+            return pid
+    return None
+
+
+def tree_rss(pid, table):
+    return sum(table[p][1] for p in descendants(pid, table))
+
+
+def process_tree_rss(pid=None):
+    """Resident memory in bytes of pid (default: this process) and its descendants"""
+    if not os.path.isdir('/proc'):
+        return 0
+    table = process_table()
+    return tree_rss(pid or os.getpid(), table)
+
+
+def total_memory():
+    """Physical memory in bytes from /proc/meminfo, or None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _cgroup_limit_files():
+    """Candidate memory limit files for this process's cgroup, v2 first"""
+    paths = []
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                hierarchy, controllers, path = line.rstrip('\n').split(':', 2)
+                if path == '/':
+                    continue
+                if hierarchy == '0':
+                    paths.append(f'/sys/fs/cgroup{path}/memory.max')
+                elif 'memory' in controllers.split(','):
+                    paths.append(f'/sys/fs/cgroup/memory{path}/memory.limit_in_bytes')
+    except (OSError, ValueError):
+        pass
+    paths.append('/sys/fs/cgroup/memory.max')
+    paths.append('/sys/fs/cgroup/memory/memory.limit_in_bytes')
+    return paths
+
+
+def cgroup_memory_limit():
+    """The container's memory limit in bytes from cgroup v2 or v1, or None when unlimited"""
+    for path in _cgroup_limit_files():
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == 'max':
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            continue
+        # v1 reports "no limit" as a huge number rather than 'max'
+        total = total_memory()
+        if total and limit >= total:
+            return None
+        return limit
+    return None
+
+
+def memory_limit():
+    """Memory the bot may use before the OOM killer steps in: the cgroup limit, else MemTotal"""
+    return cgroup_memory_limit() or total_memory()
@@ -0,0 +1,190 @@
+import os
+import re
+import threading
+from asset_cache import install_asset_cache, install_asset_cache_async
+
+RESOURCE_PROFILE = os.environ.get('RESOURCE_PROFILE', 'dom-only')
+
+# Third-party analytics/ads/beacons the flow never needs
+TRACKER_PATTERNS = [
+    r'google-analytics\.com',
+    r'googletagmanager\.com',
+    r'doubleclick\.net',
+    r'googleadservices\.com',
+    r'connect\.facebook\.net',
+    r'bat\.bing\.com',
+    r'hotjar\.com',
+    r'segment\.(io|com)',
+    r'amplitude\.com',
+    r'optimizely\.com',
+    r'/beacon(/|\?|$)',
+    r'/collect(/|\?|$)',
+]
+
+# Named profiles: resource types and URL patterns to abort
+PROFILES = {
+    'full': {
+        'resource_types': [],
+        'url_patterns': [],
+    },
+    'lean': {
+        'resource_types': ['image', 'media', 'font'],
+        'url_patterns': [],
+    },
+    'dom-only': {
+        'resource_types': ['image', 'media', 'font', 'texttrack', 'manifest'],
+        'url_patterns': TRACKER_PATTERNS,
+    },
+}
+
+# Typical transfer sizes used to estimate what a blocked request would have cost
+ESTIMATED_BYTES = {
+    'image': 40000,
+    'media': 250000,
+    'font': 30000,
+    'texttrack': 2000,
+    'manifest': 1000,
+    'script': 60000,
+    'xhr': 2000,
+    'fetch': 2000,
+    'other': 1000,
+}
+
+# Load condition per navigation, e.g. SIGNUP_WAIT_UNTIL_HOME=networkidle
+WAIT_UNTIL = {
+    'home': os.environ.get('SIGNUP_WAIT_UNTIL_HOME', 'domcontentloaded'),
+    'popup': os.environ.get('SIGNUP_WAIT_UNTIL_POPUP', 'domcontentloaded'),
+}
+
+
+class BlockingProfile:
+    def __init__(self, name, resource_types, url_patterns):
+        self.name = name
+        self.resource_types = set(resource_types)
+        self.url_patterns = [re.compile(p) for p in url_patterns]
+
+    def should_block(self, request):
+        # Never block the page itself
+        if request.resource_type == 'document':
+            return False
+        if request.resource_type in self.resource_types:
+            return True
+        return any(p.search(request.url) for p in self.url_patterns)
+
+
+def get_profile(name=None):
+    name = name or RESOURCE_PROFILE
+    if name not in PROFILES:
+        print(f"⚠️ Unknown resource profile '{name}', using 'full'")
+        name = 'full'
+    spec = PROFILES[name]
+    extra = [p for p in os.environ.get('RESOURCE_BLOCK_PATTERNS', '').split(',') if p]
+    return BlockingProfile(name, spec['resource_types'], spec['url_patterns'] + extra)
+
+
+class RouteStats:
+    """Requests allowed and blocked for one flow"""
+
+    def __init__(self, profile_name):
+        self.profile = profile_name
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type = {}
+        self.bytes_loaded = 0
+        self.bytes_saved_estimate = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record_blocked(self, request):
+        resource_type = request.resource_type
+        with self._lock:
+            self.blocked += 1
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            self.bytes_saved_estimate += ESTIMATED_BYTES.get(resource_type, ESTIMATED_BYTES['other'])
+
+    def record_allowed(self, request):
+        with self._lock:
+            self.allowed += 1
+
+    def record_response(self, response):
+        try:
+            length = int(response.headers.get('content-length', 0))
+        except ValueError:
+            length = 0
+        with self._lock:
+            self.bytes_loaded += length
+
+    def record_cache_hit(self, size):
+        with self._lock:
+            self.cache_hits += 1
+            self.cache_bytes_saved += size
+
+    def record_cache_miss(self):
+        with self._lock:
+            self.cache_misses += 1
+
+    def report(self):
+        with self._lock:
+            cache_lookups = self.cache_hits + self.cache_misses
+            return {
+                'profile': self.profile,
+                'requests_allowed': self.allowed,
+                'requests_blocked': self.blocked,
+                'blocked_by_type': dict(self.blocked_by_type),
+                'bytes_loaded': self.bytes_loaded,
+                'bytes_saved_estimate': self.bytes_saved_estimate,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_ratio': self.cache_hits / cache_lookups if cache_lookups else 0.0,
+                'cache_bytes_saved': self.cache_bytes_saved,
+            }
+
+
+def install_resource_blocking(context, profile_name=None):
+    """Abort requests the profile does not need; returns the flow's RouteStats"""
+    profile = get_profile(profile_name)
+    stats = RouteStats(profile.name)
+    # Routes run newest first, so blocked requests never reach the cache
+    install_asset_cache(context, stats)
+
+    def handle(route):
+        request = route.request
+        if profile.should_block(request):
+            stats.record_blocked(request)
+            route.abort()
+        else:
+            stats.record_allowed(request)
+            # Let any earlier-registered handler (or the network) take it
+            route.fallback()
+
+    if profile.resource_types or profile.url_patterns:
+        context.route('**/*', handle)
+    else:
+        context.on('request', stats.record_allowed)
+    context.on('response', stats.record_response)
+    return stats
+
+
+async def install_resource_blocking_async(context, profile_name=None):
+    """install_resource_blocking for playwright.async_api contexts"""
+    profile = get_profile(profile_name)
+    stats = RouteStats(profile.name)
+    await install_asset_cache_async(context, stats)
+
+    async def handle(route):
+        request = route.request
+        if profile.should_block(request):
+            stats.record_blocked(request)
+            await route.abort()
+        else:
+            stats.record_allowed(request)
+            await route.fallback()
+
+    if profile.resource_types or profile.url_patterns:
+        await context.route('**/*', handle)
+    else:
+        context.on('request', stats.record_allowed)
+    context.on('response', stats.record_response)
+    return stats
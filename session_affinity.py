@@ -0,0 +1,209 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+import socketserver
+
+# Only needed when several bot processes share one webhook; a single process keeps every chat anyway
+SESSION_AFFINITY = os.environ.get('SESSION_AFFINITY', '0') != '0'
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', '/tmp/automate-sessions.db')
+SESSION_SOCKET_DIR = os.environ.get('SESSION_SOCKET_DIR', '/tmp/automate-workers')
+WORKER_HEARTBEAT_INTERVAL = float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 5))
+# A worker that misses this many heartbeats is treated as dead and loses its chats
+WORKER_DEAD_AFTER = WORKER_HEARTBEAT_INTERVAL * 3
+FORWARD_TIMEOUT = float(os.environ.get('SESSION_FORWARD_TIMEOUT', 5))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_owners (
+    chat_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    claimed_at REAL NOT NULL
+);
+"""
+
+
+class _ForwardHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        raw = self.rfile.read()
+        try:
+            accepted = self.server.dispatch(raw)
+            self.wfile.write(b'ok' if accepted else b'busy')
+        except Exception as e:
+            print(f"❌ Forwarded update failed: {e}")
+            self.wfile.write(b'error')
+
+
+class _ForwardServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class SessionAffinity:
+    """
+    Records which worker process owns each chat in a shared SQLite database
+    and forwards updates for a chat to its owner over a Unix socket.
+
+    The live browser page and telebot's next-step handler for a chat only
+    exist in the process that started its flow, so every later update for
+    that chat has to be handled there.
+    """
+
+    def __init__(self, dispatch, db_path=SESSION_DB_PATH, socket_dir=SESSION_SOCKET_DIR):
+        self.dispatch = dispatch
+        self.db_path = db_path
+        self.socket_dir = socket_dir
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.address = os.path.join(socket_dir, f"worker-{os.getpid()}.sock")
+        self.forwarded = 0
+        self.forward_failures = 0
+        self._server = None
+        self._lock = threading.Lock()
+        # One connection for the process: webhook requests each arrive on a new thread
+        self._conn = None
+        self._db_lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        """Run one statement on the shared connection and return its first row"""
+        with self._db_lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                self._conn = conn
+            return self._conn.execute(sql, params).fetchone()
+
+    def start(self):
+        with self._lock:
+            if self._server is not None:
+                return self
+            os.makedirs(self.socket_dir, exist_ok=True)
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self._server = _ForwardServer(self.address, _ForwardHandler)
+            self._server.dispatch = self.dispatch
+            threading.Thread(target=self._server.serve_forever, name='affinity-listener', daemon=True).start()
+            self._heartbeat()
+            threading.Thread(target=self._heartbeat_forever, name='affinity-heartbeat', daemon=True).start()
+            print(f"🔗 Worker {self.worker_id} listening on {self.address}")
+        return self
+
+    def _heartbeat(self):
+        self._execute(
+            'INSERT OR REPLACE INTO workers (worker_id, pid, address, heartbeat) VALUES (?, ?, ?, ?)',
+            (self.worker_id, os.getpid(), self.address, time.time())
+        )
+
+    def _heartbeat_forever(self):
+        while True:
+            time.sleep(WORKER_HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+                self._execute(
+                    'DELETE FROM chat_owners WHERE worker_id IN '
+                    '(SELECT worker_id FROM workers WHERE heartbeat < ?)',
+                    (time.time() - WORKER_DEAD_AFTER,)
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ Affinity heartbeat error: {e}")
+
+    def owner(self, chat_id):
+        """(worker_id, address) of the live worker owning chat_id, or None"""
+        return self._execute(
+            'SELECT w.worker_id, w.address FROM chat_owners c JOIN workers w ON w.worker_id = c.worker_id '
+            'WHERE c.chat_id = ? AND w.heartbeat >= ?',
+            (str(chat_id), time.time() - WORKER_DEAD_AFTER)
+        )
+
+    def claim(self, chat_id):
+        """Make this worker the owner of chat_id"""
+        self.start()
+        self._execute(
+            'INSERT OR REPLACE INTO chat_owners (chat_id, worker_id, claimed_at) VALUES (?, ?, ?)',
+            (str(chat_id), self.worker_id, time.time())
+        )
+
+    def release(self, chat_id):
+        """Give up chat_id if this worker owns it"""
+        self._execute(
+            'DELETE FROM chat_owners WHERE chat_id = ? AND worker_id = ?',
+            (str(chat_id), self.worker_id)
+        )
+
+    def forward(self, chat_id, raw):
+        """
+        Send a raw update to the worker that owns chat_id.
+
+        Returns 'forwarded', 'busy' when the owner's queue is full, or
+        'local' when this worker should handle it itself: nobody owns the
+        chat, we own it, or the owner could not be reached.
+        """
+        owner = self.owner(chat_id)
+        if owner is None or owner[0] == self.worker_id:
+            return 'local'
+
+        worker_id, address = owner
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(FORWARD_TIMEOUT)
+                sock.connect(address)
+                sock.sendall(raw)
+                sock.shutdown(socket.SHUT_WR)
+                reply = sock.recv(16)
+            if reply == b'busy':
+                return 'busy'
+            if reply != b'ok':
+                raise OSError(f"worker replied {reply!r}")
+            self.forwarded += 1
+            return 'forwarded'
+        except OSError as e:
+            print(f"⚠️ Could not forward chat {chat_id} to {worker_id}: {e}")
+            self.forward_failures += 1
+            self._execute('DELETE FROM chat_owners WHERE chat_id = ? AND worker_id = ?', (str(chat_id), worker_id))
+            return 'local'
+
+    def stats(self):
+        owned = self._execute(
+            'SELECT COUNT(*) FROM chat_owners WHERE worker_id = ?', (self.worker_id,)
+        )[0]
+        return {
+            'worker_id': self.worker_id,
+            'owned_chats': owned,
+            'forwarded': self.forwarded,
+            'forward_failures': self.forward_failures,
+        }
+
+
+class LocalAffinity:
+    """Single-process stand-in, the default (SESSION_AFFINITY unset or 0)"""
+
+    worker_id = 'local'
+
+    def start(self):
+        return self
+
+    def owner(self, chat_id):
+        return None
+
+    def claim(self, chat_id):
+        pass
+
+    def release(self, chat_id):
+        pass
+
+    def forward(self, chat_id, raw):
+        return 'local'
+
+    def stats(self):
+        return {'worker_id': self.worker_id, 'owned_chats': 0, 'forwarded': 0, 'forward_failures': 0}
+
+
+def create_affinity(dispatch):
+    if SESSION_AFFINITY:
+        return SessionAffinity(dispatch)
+    return LocalAffinity()
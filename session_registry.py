@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+SESSION_TTL = float(os.environ.get('SESSION_TTL', 600))
+SESSION_REAP_INTERVAL = float(os.environ.get('SESSION_REAP_INTERVAL', 15))
+
+
+class SessionRegistry:
+    """
+    Dict-like session store with an idle TTL and an LRU size cap.
+
+    Reading or writing a key refreshes it. Entries that sit idle for longer
+    than `ttl` seconds, or that fall off the end when `max_size` is exceeded,
+    are evicted and every listener is called with (key, value, reason).
+    Plain `del`/`pop` remove an entry without notifying listeners.
+    """
+
+    def __init__(self, name, ttl=SESSION_TTL, max_size=None, reap_interval=SESSION_REAP_INTERVAL):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reap_interval = reap_interval
+        self.evictions = {'expired': 0, 'capacity': 0, 'evicted': 0}
+        self._data = OrderedDict()
+        self._touched = {}
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._reaper = None
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+        self.start_reaper()
+
+    def start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or not self.ttl:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name=f"{self.name}-reaper", daemon=True)
+            self._reaper.start()
+
+    def _touch(self, key):
+        self._data.move_to_end(key)
+        self._touched[key] = time.time()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._data[key]
+            self._touch(key)
+            return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._touch(key)
+            overflow = []
+            while self.max_size and len(self._data) > self.max_size:
+                old_key, old_value = self._data.popitem(last=False)
+                self._touched.pop(old_key, None)
+                overflow.append((old_key, old_value))
+        for old_key, old_value in overflow:
+            self._notify(old_key, old_value, 'capacity')
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            self._touched.pop(key, None)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._touched.pop(key, None)
+            return self._data.pop(key, default)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def evict(self, key, reason='evicted'):
+        """Remove key and notify listeners; returns False if it was not present"""
+        with self._lock:
+            if key not in self._data:
+                return False
+            value = self.pop(key)
+        self._notify(key, value, reason)
+        return True
+
+    def evict_if_idle(self, key, cutoff, reason='expired'):
+        """Evict key only if it was last touched before cutoff; False if it was refreshed or is gone"""
+        with self._lock:
+            touched = self._touched.get(key)
+            if touched is None or touched >= cutoff:
+                return False
+            value = self.pop(key)
+        self._notify(key, value, reason)
+        return True
+
+    def reap(self):
+        """Evict every entry idle for longer than the TTL"""
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [key for key, touched in self._touched.items() if touched < cutoff]
+        # An entry refreshed since the scan (a step just picked it up) stays
+        return sum(1 for key in expired if self.evict_if_idle(key, cutoff))
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"⚠️ {self.name} reaper error: {e}")
+
+    def _notify(self, key, value, reason):
+        self.evictions[reason] = self.evictions.get(reason, 0) + 1
+        print(f"⌛ {self.name}: evicting {key} ({reason})")
+        for callback in self._listeners:
+            try:
+                callback(key, value, reason)
+            except Exception as e:
+                print(f"⚠️ {self.name} eviction listener error: {e}")
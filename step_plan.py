@@ -0,0 +1,339 @@
+import os
+import time
+from collections import deque
+from metrics import step_timer
+from browser_pool import sync_timeout_error
+
+# Most recent steps kept per flow for failure reports
+PLAN_HISTORY = int(os.environ.get('SIGNUP_PLAN_HISTORY', 50))
+
+
+class Target:
+    """
+    One way of finding an element.
+
+    by is 'role', 'text', 'test_id' or 'css'. A target with delay (ms) only
+    competes once the step has been waiting that long, which lets a likely
+    alternative (e.g. a popup that is still opening) win over a fallback
+    that is already on screen. In a search_popups step the delay is the
+    time a popup gets to open.
+    """
+
+    def __init__(self, label, by, value, name=None, state='visible', delay=0):
+        self.label = label
+        self.by = by
+        self.value = value
+        self.name = name
+        self.state = state
+        self.delay = delay
+
+    def locate(self, page):
+        if self.by == 'role':
+            locator = page.get_by_role(self.value, name=self.name)
+        elif self.by == 'text':
+            locator = page.get_by_text(self.value)
+        elif self.by == 'test_id':
+            locator = page.get_by_test_id(self.value)
+        else:
+            locator = page.locator(self.value)
+        return locator.first
+
+    def awaitable(self, page):
+        """locate() narrowed to elements in this target's state, for combining with or_()"""
+        locator = self.locate(page)
+        return locator.filter(visible=True) if self.state == 'visible' else locator
+
+    def present(self, locator):
+        return locator.is_visible() if self.state == 'visible' else locator.count() > 0
+
+    async def present_async(self, locator):
+        return await locator.is_visible() if self.state == 'visible' else await locator.count() > 0
+
+
+class Step:
+    """
+    One entry of a plan.
+
+    action is 'goto' (value is the URL), 'click', 'fill' (value is the text),
+    'wait' (just find one of the targets) or 'url_change' (wait until the
+    page leaves the URL it had when the plan started). All targets are raced
+    in one event-driven wait on their or_() union and the first one present
+    wins; listing order breaks ties. A search_popups step first waits for a
+    popup (up to its longest target delay) and races on the newest page once
+    it reached wait_until, the load condition goto uses too. An optional
+    step that fails is logged and skipped, a required one stops the plan
+    with StepFailed. outcomes maps a target label to a result that ends the
+    plan early when that target wins.
+    """
+
+    def __init__(self, name, action, targets=(), value=None, timeout=30000, optional=False,
+                 search_popups=False, outcomes=None, error='{detail}', wait_until='domcontentloaded'):
+        self.name = name
+        self.action = action
+        self.targets = list(targets)
+        self.value = value
+        self.timeout = timeout
+        self.optional = optional
+        self.search_popups = search_popups
+        self.outcomes = outcomes or {}
+        self.error = error
+        self.wait_until = wait_until
+
+
+class StepFailed(Exception):
+    def __init__(self, step, detail):
+        self.step = step
+        self.message = step.error.format(detail=detail)
+        super().__init__(self.message)
+
+
+class NoTargetFound(Exception):
+    pass
+
+
+class PlanRun:
+    """
+    State shared by the plans of one flow: the page being driven, what
+    matched, and a bounded in-memory history of the steps run so far (pass
+    step 1's history to step 2's run to keep one timeline).
+    """
+
+    def __init__(self, context, page, flow, history=None):
+        self.context = context
+        self.page = page
+        self.flow = flow
+        self.start_url = page.url
+        self.matched = {}
+        self.history = history if history is not None else deque(maxlen=PLAN_HISTORY)
+
+    def record(self, step, outcome, started):
+        try:
+            url = self.page.url
+        except Exception:
+            url = None
+        self.history.append({
+            'ts': time.time(),
+            'flow': self.flow,
+            'step': step.name,
+            'outcome': outcome,
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'url': url,
+        })
+
+    def follow_newest_page(self, step):
+        # A popup opened by this step is where the flow continues, even if nothing in it matched
+        pages = self.candidate_pages(step)
+        if pages:
+            self.page = pages[0]
+
+    def candidate_pages(self, step):
+        if not step.search_popups or self.context is None:
+            return [self.page]
+        # Newest first, so a freshly opened popup is preferred over its opener
+        return [p for p in reversed(self.context.pages) if not p.is_closed()]
+
+
+def _not_found(step):
+    labels = ', '.join(t.label for t in step.targets)
+    return NoTargetFound(f"none of [{labels}] appeared within {step.timeout}ms")
+
+
+def _race_window(step, started):
+    """(targets competing now, ms until the race changes) for a step that started at `started`"""
+    waited_ms = (time.monotonic() - started) * 1000
+    active = [t for t in step.targets if t.delay <= waited_ms]
+    later = [t.delay for t in step.targets if t.delay > waited_ms]
+    return active, min(later + [step.timeout]) - waited_ms
+
+
+def _union(page, targets):
+    locator = None
+    for target in targets:
+        candidate = target.awaitable(page)
+        locator = candidate if locator is None else locator.or_(candidate)
+    return locator.first
+
+
+def _popup_grace(run, step):
+    """How long a search_popups step waits for a popup; 0 when one is already open"""
+    if run.candidate_pages(step)[0] is not run.page:
+        return 0
+    return max((t.delay for t in step.targets), default=0)
+
+
+def _winner(page, targets):
+    for target in targets:
+        locator = target.locate(page)
+        try:
+            if target.present(locator):
+                return page, target, locator
+        except Exception:
+            pass
+    return None
+
+
+def _race(run, step):
+    """First (page, target, locator) present among the step's targets, or NoTargetFound"""
+    started = time.monotonic()
+    if step.search_popups:
+        grace = _popup_grace(run, step)
+        if grace:
+            try:
+                run.page.wait_for_event('popup', timeout=grace)
+            except sync_timeout_error():
+                pass
+        opener = run.page
+        run.follow_newest_page(step)
+        if run.page is not opener:
+            try:
+                run.page.wait_for_load_state(step.wait_until, timeout=step.timeout)
+            except sync_timeout_error():
+                pass
+    page = run.page
+    while True:
+        active, window_ms = _race_window(step, started)
+        found = _winner(page, active)
+        if found:
+            return found
+        if window_ms <= 0:
+            raise _not_found(step)
+        try:
+            if active:
+                _union(page, active).wait_for(state='attached', timeout=window_ms)
+            else:
+                # Every target is still held back by its delay
+                page.wait_for_timeout(window_ms)
+        except sync_timeout_error():
+            pass
+
+
+def _run_step(run, step):
+    if step.action == 'goto':
+        run.page.goto(step.value, wait_until=step.wait_until, timeout=step.timeout)
+        return None
+    if step.action == 'url_change':
+        run.page.wait_for_url(lambda url: url != run.start_url, timeout=step.timeout)
+        return None
+
+    page, target, locator = _race(run, step)
+    run.page = page
+    if step.action == 'click':
+        locator.click(timeout=step.timeout)
+    elif step.action == 'fill':
+        locator.fill(step.value, timeout=step.timeout)
+    return target.label
+
+
+def run_plan(run, plan):
+    """Execute plan's steps in order; returns the outcome that ended it early, if any"""
+    for step in plan:
+        started = time.monotonic()
+        with step_timer(run.flow, step.name) as span:
+            try:
+                label = _run_step(run, step)
+                if label:
+                    span['outcome'] = label
+            except Exception as e:
+                if not step.optional:
+                    print(f"❌ {run.flow} {step.name} failed: {e}")
+                    span['outcome'] = 'failed'
+                    raise StepFailed(step, e)
+                print(f"⚠️ {run.flow} {step.name} skipped: {e}")
+                span['outcome'] = 'skipped'
+                run.follow_newest_page(step)
+                continue
+            finally:
+                run.record(step, span['outcome'], started)
+        run.matched[step.name] = label
+        print(f"✅ {run.flow} {step.name}" + (f": {label}" if label else ""))
+        if label in step.outcomes:
+            return step.outcomes[label]
+    return None
+
+
+async def _winner_async(page, targets):
+    for target in targets:
+        locator = target.locate(page)
+        try:
+            if await target.present_async(locator):
+                return page, target, locator
+        except Exception:
+            pass
+    return None
+
+
+async def _race_async(run, step):
+    started = time.monotonic()
+    if step.search_popups:
+        grace = _popup_grace(run, step)
+        if grace:
+            try:
+                await run.page.wait_for_event('popup', timeout=grace)
+            except sync_timeout_error():
+                pass
+        opener = run.page
+        run.follow_newest_page(step)
+        if run.page is not opener:
+            try:
+                await run.page.wait_for_load_state(step.wait_until, timeout=step.timeout)
+            except sync_timeout_error():
+                pass
+    page = run.page
+    while True:
+        active, window_ms = _race_window(step, started)
+        found = await _winner_async(page, active)
+        if found:
+            return found
+        if window_ms <= 0:
+            raise _not_found(step)
+        try:
+            if active:
+                await _union(page, active).wait_for(state='attached', timeout=window_ms)
+            else:
+                await page.wait_for_timeout(window_ms)
+        except sync_timeout_error():
+            pass
+
+
+async def _run_step_async(run, step):
+    if step.action == 'goto':
+        await run.page.goto(step.value, wait_until=step.wait_until, timeout=step.timeout)
+        return None
+    if step.action == 'url_change':
+        await run.page.wait_for_url(lambda url: url != run.start_url, timeout=step.timeout)
+        return None
+
+    page, target, locator = await _race_async(run, step)
+    run.page = page
+    if step.action == 'click':
+        await locator.click(timeout=step.timeout)
+    elif step.action == 'fill':
+        await locator.fill(step.value, timeout=step.timeout)
+    return target.label
+
+
+async def run_plan_async(run, plan):
+    """run_plan for playwright.async_api pages"""
+    for step in plan:
+        started = time.monotonic()
+        with step_timer(run.flow, step.name) as span:
+            try:
+                label = await _run_step_async(run, step)
+                if label:
+                    span['outcome'] = label
+            except Exception as e:
+                if not step.optional:
+                    print(f"❌ {run.flow} {step.name} failed: {e}")
+                    span['outcome'] = 'failed'
+                    raise StepFailed(step, e)
+                print(f"⚠️ {run.flow} {step.name} skipped: {e}")
+                span['outcome'] = 'skipped'
+                run.follow_newest_page(step)
+                continue
+            finally:
+                run.record(step, span['outcome'], started)
+        run.matched[step.name] = label
+        print(f"✅ {run.flow} {step.name}" + (f": {label}" if label else ""))
+        if label in step.outcomes:
+            return step.outcomes[label]
+    return None
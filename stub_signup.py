@@ -0,0 +1,51 @@
+"""
+Browserless stand-in for the signup engine, selected with SIGNUP_ENGINE=stub.
+
+Each step sleeps for a configurable latency and returns the same result
+dicts as create_account, so the bot, admission control and metrics can be
+load-tested without Playwright or the real site.
+"""
+import os
+import time
+import random
+import threading
+
+STUB_STEP1_MS = float(os.environ.get('STUB_STEP1_MS', 3000))
+STUB_STEP2_MS = float(os.environ.get('STUB_STEP2_MS', 1500))
+# Step latencies are drawn uniformly from latency +/- jitter
+STUB_JITTER = float(os.environ.get('STUB_JITTER', 0.2))
+STUB_CAPTCHA_RATE = float(os.environ.get('STUB_CAPTCHA_RATE', 0.0))
+STUB_ERROR_RATE = float(os.environ.get('STUB_ERROR_RATE', 0.0))
+
+# Users whose step 1 reached the (pretend) OTP page
+_waiting = set()
+_lock = threading.Lock()
+
+
+def _sleep(latency_ms):
+    time.sleep(max(0.0, latency_ms * random.uniform(1 - STUB_JITTER, 1 + STUB_JITTER)) / 1000)
+
+
+def _stub_report():
+    return {'requests': 0, 'blocked': 0, 'stub': True}
+
+
+def run_uber_signup_step1(email, user_id):
+    _sleep(STUB_STEP1_MS)
+    roll = random.random()
+    if roll < STUB_ERROR_RATE:
+        return {"status": "error", "message": "Stub engine: injected failure", "network": _stub_report()}
+    if roll < STUB_ERROR_RATE + STUB_CAPTCHA_RATE:
+        return {"status": "captcha_required", "message": "CAPTCHA verification required", "network": _stub_report()}
+    with _lock:
+        _waiting.add(user_id)
+    return {"status": "otp_ready", "message": "Reached OTP page successfully", "network": _stub_report()}
+
+
+def run_uber_signup_step2(otp_code, user_id):
+    with _lock:
+        if user_id not in _waiting:
+            return {"status": "error", "message": "No active browser session found"}
+        _waiting.discard(user_id)
+    _sleep(STUB_STEP2_MS)
+    return {"status": "success", "message": "Account created successfully!", "network": _stub_report()}
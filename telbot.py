@@ -1,13 +1,27 @@
 import os
-import requests
 from requests.sessions import Session
-import ssl
 import telebot
 import threading
 import flask
 from flask import Flask, request
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from create_account import run_uber_signup_step1, run_uber_signup_step2
+from create_account import (
+    run_uber_signup_step1, run_uber_signup_step2, prewarm_signup, cancel_prewarm, prewarm_stats,
+    maintain_browser_pool, browser_sessions, get_browser_choice, SIGNUP_ENGINE,
+)
+from worker_pool import ChatWorkerPool
+from session_registry import SessionRegistry
+from session_affinity import create_affinity
+from admission import AdmissionController, QUEUED, REJECTED
+from circuit_breaker import CircuitBreaker, AdaptiveConcurrency, watch_flow, OPEN
+from navigation_cache import navigation_cache
+from prewarm import prewarm_cache
+from memory_budget import memory_monitor
+import failure_capture
+from asset_cache import get_asset_cache
+import metrics
+from telegram_outbox import Outbox, install_connection_pool
+from ingestion import INGESTION_MODE, WebhookTransport, PollingTransport, ACCEPTED, FORWARDED, BUSY, DUPLICATE
+from update_dedup import UpdateDeduplicator, DUPLICATES_SUPPRESSED
 
 # Monkey-patch Session to always disable SSL verification
 old_request = Session.request
@@ -26,16 +40,194 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
 # Create bot instance and Flask app
-bot = telebot.TeleBot(TOKEN)
+# Handlers run on our own worker pool, so telebot must not spawn its own threads
+bot = telebot.TeleBot(TOKEN, threaded=False)
 app = Flask(__name__)
 
-# Store user sessions
-user_sessions = {}
+# Outgoing messages share one keep-alive pool and go through a rate-limited queue
+install_connection_pool()
+outbox = Outbox(bot)
+
+# Store user sessions (idle ones expire together with their browser session)
+MAX_USER_SESSIONS = int(os.environ.get('MAX_USER_SESSIONS', 1000))
+user_sessions = SessionRegistry('user_sessions', max_size=MAX_USER_SESSIONS)
+
+def expire_chat_session(chat_id, session, reason):
+    """Drop whatever is left of an evicted chat and tell the user"""
+    browser_sessions.evict(chat_id, reason)
+    cancel_prewarm(chat_id)
+    update_workers.unpin(chat_id)
+    signup_admission.release(chat_id)
+    session_affinity.release(chat_id)
+    bot.clear_step_handler_by_chat_id(chat_id)
+    outbox.end_status(chat_id)
+    if reason == 'memory':
+        outbox.send(chat_id, """
+🧠 The signup page used more memory than allowed, so I had to close its browser.
+
+Please start again with /create.
+        """)
+        return
+    outbox.send(chat_id, """
+⌛ Your signup session expired and the browser was closed.
+
+Start again with /create whenever you're ready!
+    """)
+
+def expire_browser_session(chat_id, session, reason):
+    user_sessions.evict(chat_id, reason)
+
+user_sessions.add_listener(expire_chat_session)
+browser_sessions.add_listener(expire_browser_session)
+
+# Updates are processed off the request thread; a chat's updates run in order on any free worker
+update_workers = ChatWorkerPool(idle_callback=maintain_browser_pool)
+
+def pin_chat(chat_id):
+    """Keep the chat on the current worker while its sync Playwright objects live on this thread"""
+    if SIGNUP_ENGINE == 'sync':
+        update_workers.pin(chat_id)
+
+metrics.gauge('signup_browser_sessions', 'Live browser sessions waiting for an OTP', lambda: len(browser_sessions))
+metrics.gauge('bot_user_sessions', 'Chats with an active signup session', lambda: len(user_sessions))
+metrics.gauge('update_queue_depth', 'Updates waiting for a worker', update_workers.queue_depth)
+metrics.gauge('outbox_queue_depth', 'Outgoing Telegram calls waiting to be sent', outbox.workers.queue_depth)
+metrics.gauge('update_workers_busy', 'Workers currently processing an update', lambda: update_workers.stats()['busy_workers'])
+
+def update_chat_id(update):
+    """Chat id used to order an update, falling back to its update_id"""
+    for message in (update.message, update.edited_message):
+        if message is not None:
+            return message.chat.id
+    if update.callback_query is not None and update.callback_query.message is not None:
+        return update.callback_query.message.chat.id
+    return update.update_id
+
+# Telegram redelivers slow webhook calls; a repeated email update must not start a second browser
+seen_updates = UpdateDeduplicator()
+
+def enqueue_update(update):
+    """Queue an update on its chat's worker: ACCEPTED, DUPLICATE or BUSY"""
+    if not seen_updates.claim(update.update_id):
+        return DUPLICATE
+    if update_workers.submit(update_chat_id(update), bot.process_new_updates, [update]):
+        return ACCEPTED
+    # Not taken, so its redelivery must not count as a duplicate
+    seen_updates.forget(update.update_id)
+    return BUSY
+
+def dispatch_forwarded_update(raw):
+    """Handle an update another worker process routed to us"""
+    return enqueue_update(telebot.types.Update.de_json(raw.decode('utf-8'))) != BUSY
+
+def ingest_update(raw):
+    """
+    The one pipeline every transport feeds: route a raw update to the process
+    owning its chat, or queue it on the chat's worker here.
+    """
+    update = telebot.types.Update.de_json(raw.decode('utf-8'))
+    routed = session_affinity.forward(update_chat_id(update), raw)
+    if routed == 'forwarded':
+        return FORWARDED
+    if routed == 'busy':
+        return BUSY
+    return enqueue_update(update)
+
+# With several worker processes, a chat's updates must reach the process holding its browser
+session_affinity = create_affinity(dispatch_forwarded_update)
+
+def dispatch_admitted_flow(chat_id, start):
+    """Run a flow that just left the wait queue on its chat's worker"""
+    if not update_workers.submit(chat_id, start):
+        signup_admission.release(chat_id)
+        outbox.send(chat_id, "🚦 The bot is overloaded right now. Please try /create again in a few minutes.")
+
+def notify_queue_position(chat_id, position):
+    outbox.status(chat_id, f"⏳ All browsers are busy. You are #{position} in line, I'll start as soon as one frees up...")
+
+# Caps concurrent browsers; extra signups wait in a bounded line or are turned away
+signup_admission = AdmissionController(dispatch_admitted_flow, on_position=notify_queue_position)
+
+metrics.gauge('signup_flows_active', 'Signup flows holding a browser slot', lambda: signup_admission.stats()['active'])
+metrics.gauge('signup_flows_waiting', 'Signup flows waiting for a browser slot', lambda: signup_admission.stats()['waiting'])
+
+# Step 1 results trip the breaker when the site keeps failing and steer the slot count
+signup_breaker = CircuitBreaker()
+adaptive_concurrency = AdaptiveConcurrency(signup_admission.set_limit, max_limit=signup_admission.max_active)
+watch_flow('step1', signup_breaker, adaptive_concurrency)
+
+metrics.gauge('signup_concurrency_limit', 'Current limit on concurrent signup flows', lambda: signup_admission.max_active)
+metrics.gauge('signup_breaker_open', '1 while new signups are refused by the circuit breaker', lambda: int(signup_breaker.state == OPEN))
+
+def reply_breaker_open(message):
+    minutes = max(1, round(signup_breaker.retry_after() / 60))
+    outbox.reply_to(message, f"""
+🔌 Uber signups are failing for everyone right now (errors or CAPTCHAs), so I've paused new attempts instead of making you wait for the same failure.
+
+Please try /create again in about {minutes} min.
+    """)
+
+def run_prewarm(chat_id):
+    if prewarm_signup(chat_id):
+        # Step 1 must pick the parked browser up on this thread
+        pin_chat(chat_id)
+
+def start_prewarm(chat_id):
+    """
+    Walk a browser to the email form while the user is still typing.
+    
+    Queued behind the chat's earlier updates, so it finishes before the
+    email message is handled, and a parked browser pins the chat to the
+    worker that launched it. Only started while a browser slot is free, so
+    the email is likely admitted straight away.
+    """
+    if signup_admission.stats()['available'] > 0:
+        update_workers.submit(chat_id, run_prewarm, chat_id)
+
+def release_prewarm(chat_id, session, reason):
+    # A parked browser nobody claimed no longer ties the chat to its worker
+    update_workers.unpin(chat_id)
+
+prewarm_cache.sessions.add_listener(release_prewarm)
+
+metrics.gauge('signup_prewarmed_sessions', 'Browsers parked on the email form waiting for an email', lambda: prewarm_stats()['parked'])
+
+def reply_signup_in_flight(message):
+    DUPLICATES_SUPPRESSED.inc(kind='signup')
+    outbox.reply_to(message, """
+⏳ A signup is already running for this chat.
+
+Let it finish (or send the OTP if I asked for one) before starting another.
+    """)
+
+def readiness():
+    """(ready, details) from the signup capacity left on this instance"""
+    stats = signup_admission.stats()
+    stats['ready'] = signup_admission.ready()
+    stats['update_queue_depth'] = update_workers.queue_depth()
+    stats['breaker'] = signup_breaker.state
+    return stats['ready'], stats
 
 def start_health_server():
     """Start a simple HTTP server for Render's health checks"""
-    port = int(os.environ.get('PORT', 10000))
-    server = HTTPServer(('0.0.0.0', port), SimpleHTTPRequestHandler)
+    import json
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    
+    class ReadinessHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ready, details = readiness()
+            body = json.dumps(details).encode('utf-8')
+            self.send_response(200 if ready else 503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    port = int(os.environ.get('HEALTH_PORT', os.environ.get('PORT', 10000)))
+    server = HTTPServer(('0.0.0.0', port), ReadinessHandler)
     print(f"🌐 Health server starting on port {port}")
     server.serve_forever()
 
@@ -57,15 +249,25 @@ Commands:
 
 Ready to automate your learning! 🚀
     """
-    bot.reply_to(message, welcome_text)
+    outbox.reply_to(message, welcome_text)
 
 @bot.message_handler(commands=['status'])
 def bot_status(message):
-    bot.reply_to(message, "✅ Bot is running on Render and ready!")
+    outbox.reply_to(message, "✅ Bot is running on Render and ready!")
 
 @bot.message_handler(commands=['create'])
 def start_signup(message):
-    bot.reply_to(message, """
+    if signup_breaker.is_open():
+        reply_breaker_open(message)
+        return
+    
+    if signup_admission.holds(message.chat.id):
+        reply_signup_in_flight(message)
+        return
+    
+    # The next-step handler and browser for this chat will live in this process
+    session_affinity.claim(message.chat.id)
+    outbox.reply_to(message, """
 📧 Please send me the email address you want to use for the Uber account:
 
 🔄 **New Smart Flow:**
@@ -77,23 +279,58 @@ def start_signup(message):
 Much better than asking for OTP before it exists! 🎯
     """)
     bot.register_next_step_handler(message, process_email)
+    start_prewarm(message.chat.id)
 
 def process_email(message):
     email = message.text.strip()
     
     # Basic email validation
     if '@' not in email or '.' not in email:
-        bot.reply_to(message, "❌ That doesn't look like a valid email. Please try again:")
+        outbox.reply_to(message, "❌ That doesn't look like a valid email. Please try again:")
         bot.register_next_step_handler(message, process_email)
         return
     
+    # One browser per chat: updates of a chat run in order, so nothing can slip in between check and submit
+    if signup_admission.holds(message.chat.id):
+        reply_signup_in_flight(message)
+        return
+    
     # Store email in user session
     user_sessions[message.chat.id] = {
         'email': email,
         'step': 'processing_email'
     }
     
-    bot.reply_to(message, f"""
+    if not signup_breaker.allow():
+        del user_sessions[message.chat.id]
+        cancel_prewarm(message.chat.id)
+        update_workers.unpin(message.chat.id)
+        session_affinity.release(message.chat.id)
+        reply_breaker_open(message)
+        return
+    
+    admission = signup_admission.submit(message.chat.id, lambda: run_email_step(message, email))
+    if admission == REJECTED:
+        del user_sessions[message.chat.id]
+        cancel_prewarm(message.chat.id)
+        update_workers.unpin(message.chat.id)
+        session_affinity.release(message.chat.id)
+        outbox.reply_to(message, """
+🚦 Too many signups are running right now and the waiting line is full.
+
+Please try again with /create in a few minutes.
+        """)
+        return
+    if admission == QUEUED:
+        user_sessions[message.chat.id]['step'] = 'queued'
+        return
+    
+    run_email_step(message, email)
+
+def run_email_step(message, email):
+    """Step 1 for a chat that holds a browser slot"""
+    user_sessions.get(message.chat.id, {})['step'] = 'processing_email'
+    outbox.status(message.chat.id, f"""
 ✅ Email: {email}
 
 🚀 Starting automation...
@@ -103,14 +340,23 @@ def process_email(message):
 Please wait...
     """)
     
+    waiting_for_otp = False
     try:
+        # The browser session step 2 needs is created on this thread
+        pin_chat(message.chat.id)
         # Run STEP 1: Navigate and enter email until OTP page
         result = run_uber_signup_step1(email=email, user_id=message.chat.id)
+        chat_session = user_sessions.get(message.chat.id)
         
-        if result["status"] == "otp_ready":
-            user_sessions[message.chat.id]['step'] = 'waiting_for_otp'
+        if result["status"] == "otp_ready" and chat_session is None:
+            # The chat expired while step 1 ran (and was told so); nobody will send its OTP
+            browser_sessions.evict(message.chat.id, 'expired')
+            
+        elif result["status"] == "otp_ready":
+            chat_session['step'] = 'waiting_for_otp'
+            waiting_for_otp = True
             
-            bot.send_message(message.chat.id, f"""
+            outbox.send(message.chat.id, f"""
 🎉 Perfect! I've successfully:
 ✅ Navigated to Uber signup
 ✅ Entered your email: {email}
@@ -124,7 +370,7 @@ The browser is waiting and ready for your real OTP...
             bot.register_next_step_handler(message, process_real_otp)
             
         elif result["status"] == "captcha_required":
-            bot.send_message(message.chat.id, """
+            outbox.send(message.chat.id, """
 🤖 CAPTCHA Challenge Detected!
 
 This is completely normal when learning automation. 
@@ -138,8 +384,17 @@ For learning purposes, this shows you:
 Try again with /create - sometimes CAPTCHAs don't appear!
             """)
             
+        elif result["status"] == "unavailable":
+            outbox.send(message.chat.id, f"""
+🧯 I couldn't start a browser for you right now:
+
+🔧 {result['message']}
+
+This is on my side, not Uber's. Please try /create again in a few minutes.
+            """)
+            
         elif result["status"] == "error":
-            bot.send_message(message.chat.id, f"""
+            outbox.send(message.chat.id, f"""
 ❌ Issue during email entry phase:
 
 🔧 Error: {result['message']}
@@ -153,10 +408,10 @@ Try again with /create or check the logs!
             """)
             
         else:
-            bot.send_message(message.chat.id, f"📊 Unexpected result: {result}")
+            outbox.send(message.chat.id, f"📊 Unexpected result: {result}")
             
     except Exception as e:
-        bot.send_message(message.chat.id, f"""
+        outbox.send(message.chat.id, f"""
 💥 Unexpected error during automation:
 
 {str(e)}
@@ -167,14 +422,18 @@ Please try again with /create
     
     finally:
         # Don't clear session yet - we need it for OTP step
-        pass
+        if not waiting_for_otp:
+            update_workers.unpin(message.chat.id)
+            signup_admission.release(message.chat.id)
+            session_affinity.release(message.chat.id)
+            outbox.end_status(message.chat.id)
 
 def process_real_otp(message):
     otp = message.text.strip()
     
     # Basic OTP validation
     if len(otp) != 4 or not otp.isdigit():
-        bot.reply_to(message, """
+        outbox.reply_to(message, """
 ❌ OTP should be exactly 4 digits. 
 
 Please check your email and send the correct 4-digit code:
@@ -183,17 +442,18 @@ Please check your email and send the correct 4-digit code:
         return
     
     # Check if session exists
-    if message.chat.id not in user_sessions:
-        bot.reply_to(message, """
+    session = user_sessions.get(message.chat.id)
+    if session is None:
+        outbox.reply_to(message, """
 ❌ Session expired or not found. 
 
 Please start over with /create
         """)
         return
     
-    email = user_sessions[message.chat.id]['email']
+    email = session['email']
     
-    bot.reply_to(message, f"""
+    outbox.status(message.chat.id, f"""
 🔐 Received OTP: {otp}
 📧 For email: {email}
 
@@ -206,7 +466,7 @@ Please start over with /create
         result = run_uber_signup_step2(otp_code=otp, user_id=message.chat.id)
         
         if result["status"] == "success":
-            bot.send_message(message.chat.id, f"""
+            outbox.send(message.chat.id, f"""
 🎉 AMAZING! Account Creation Successful!
 
 ✅ {result['message']}
@@ -219,7 +479,7 @@ Great job learning automation! 🚀
             """)
             
         elif result["status"] == "completed":
-            bot.send_message(message.chat.id, f"""
+            outbox.send(message.chat.id, f"""
 ✅ Process Completed!
 
 📋 {result['message']}
@@ -230,7 +490,7 @@ Good work! 🎯
             """)
             
         elif result["status"] == "error":
-            bot.send_message(message.chat.id, f"""
+            outbox.send(message.chat.id, f"""
 ❌ Issue during OTP entry:
 
 🔧 {result['message']}
@@ -243,11 +503,20 @@ This could be due to:
 You may need to start over with /create
             """)
             
+        elif result["status"] == "unavailable":
+            outbox.send(message.chat.id, f"""
+🧯 The browser holding your signup went away before the code could be entered:
+
+🔧 {result['message']}
+
+This is on my side, not Uber's. Please start over with /create in a few minutes.
+            """)
+            
         else:
-            bot.send_message(message.chat.id, f"📊 Result: {result}")
+            outbox.send(message.chat.id, f"📊 Result: {result}")
             
     except Exception as e:
-        bot.send_message(message.chat.id, f"""
+        outbox.send(message.chat.id, f"""
 💥 Error during OTP processing:
 
 {str(e)}
@@ -260,8 +529,12 @@ The browser session may have been lost. Please try /create again.
         # Clear user session
         if message.chat.id in user_sessions:
             del user_sessions[message.chat.id]
+        update_workers.unpin(message.chat.id)
+        signup_admission.release(message.chat.id)
+        session_affinity.release(message.chat.id)
+        outbox.end_status(message.chat.id)
         
-        bot.send_message(message.chat.id, """
+        outbox.send(message.chat.id, """
 Want to try creating another account? Use /create
 
 Thanks for learning automation! 🤖✨
@@ -270,7 +543,7 @@ Thanks for learning automation! 🤖✨
 # Handle any other messages
 @bot.message_handler(func=lambda message: True)
 def handle_other(message):
-    bot.reply_to(message, """
+    outbox.reply_to(message, """
 🤔 I didn't understand that command.
 
 Available commands:
@@ -282,33 +555,76 @@ Available commands:
 Use /create to begin the automation process!
     """)
 
+def create_transport(mode=INGESTION_MODE):
+    """Ingestion transport for mode ('webhook' or 'polling'), both feeding ingest_update"""
+    if mode == 'polling':
+        return PollingTransport(bot, ingest_update)
+    if mode != 'webhook':
+        raise ValueError(f"Unknown INGESTION_MODE {mode!r} (expected 'webhook' or 'polling')")
+    render_url = os.environ.get('RENDER_EXTERNAL_URL', 'https://your-app.onrender.com')
+    return WebhookTransport(bot, ingest_update, f"{render_url}/{TOKEN}")
+
+transport = create_transport()
+
 # Flask webhook routes
 @app.route('/' + TOKEN, methods=['POST'])
 def getMessage():
-    json_string = request.get_data().decode('utf-8')
-    update = telebot.types.Update.de_json(json_string)
-    bot.process_new_updates([update])
-    return "!", 200
+    if transport.name != 'webhook':
+        return "webhook disabled", 404
+    # A full pipeline answers 503 so Telegram redelivers later
+    return transport.handle(request.get_data())
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route("/health")
+def health():
+    ready, details = readiness()
+    return flask.jsonify(details), 200 if ready else 503
+
+@app.route("/workers")
+def worker_stats():
+    stats = update_workers.stats()
+    stats['affinity'] = session_affinity.stats()
+    stats['outbox'] = outbox.stats()
+    stats['admission'] = signup_admission.stats()
+    stats['breaker'] = signup_breaker.stats()
+    stats['concurrency'] = adaptive_concurrency.stats()
+    stats['navigation_cache'] = navigation_cache.stats()
+    stats['prewarm'] = prewarm_stats()
+    stats['memory'] = memory_monitor.stats()
+    stats['failure_reports'] = failure_capture.writer.stats()
+    stats['ingestion'] = transport.stats()
+    stats['dedup'] = seen_updates.stats()
+    cache = get_asset_cache()
+    stats['asset_cache'] = cache.stats() if cache is not None else None
+    if SIGNUP_ENGINE == 'process':
+        import browser_workers
+        stats['browser_workers'] = browser_workers.get_worker_pool().stats()
+    return flask.jsonify(stats), 200
 
 @app.route("/")
 def webhook():
-    render_url = os.environ.get('RENDER_EXTERNAL_URL', 'https://your-app.onrender.com')
-    webhook_url = f"{render_url}/{TOKEN}"
-    bot.remove_webhook()
-    bot.set_webhook(url=webhook_url)
-    return f"Webhook set to {webhook_url}", 200
-
-# Start the server
-if __name__ == "__main__":
-    print("🤖 Bot is starting in webhook mode...")
+    if transport.name != 'webhook':
+        return "Running in long-polling mode, no webhook to set", 200
+    transport.start()
+    return f"Webhook set to {transport.url}", 200
+
+def main():
+    """Start the configured transport and serve the webhook, health and metrics routes"""
+    print(f"🤖 Bot is starting in {transport.name} mode...")
+    if SIGNUP_ENGINE != 'stub':
+        # Measure the installed browsers once (or load the saved choice) before any flow launches one
+        get_browser_choice()
+    update_workers.start()
     
-    # Set webhook on startup
-    render_url = os.environ.get('RENDER_EXTERNAL_URL', 'https://your-app.onrender.com')
-    webhook_url = f"{render_url}/{TOKEN}"
-    bot.remove_webhook()
-    bot.set_webhook(url=webhook_url)
-    print(f"✅ Webhook set to: {webhook_url}")
+    # Polling runs beside Flask, which still serves /health, /metrics and /workers
+    transport.start()
     
-    # Start Flask server
     port = int(os.environ.get('PORT', 10000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
+
+# Start the server
+if __name__ == "__main__":
+    main()
\ No newline at end of file
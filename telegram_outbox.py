@@ -0,0 +1,219 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper, types
+from telebot.apihelper import ApiTelegramException
+from worker_pool import ChatWorkerPool, RetryLater
+
+# Telegram allows roughly 30 messages/s overall and about 1/s per chat
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_GLOBAL_BURST = float(os.environ.get('TELEGRAM_GLOBAL_BURST', 30))
+TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_CHAT_BURST = float(os.environ.get('TELEGRAM_CHAT_BURST', 3))
+TELEGRAM_POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', 16))
+TELEGRAM_SENDERS = int(os.environ.get('TELEGRAM_SENDERS', 4))
+TELEGRAM_SEND_RETRIES = int(os.environ.get('TELEGRAM_SEND_RETRIES', 3))
+
+
+class TokenBucket:
+    """Classic token bucket; take() returns how long until a token is free (0 once taken)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Give back a token taken for a call that did not go out"""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def idle_since(self):
+        return self.updated
+
+
+def install_connection_pool(pool_size=TELEGRAM_POOL_SIZE):
+    """Make telebot share one keep-alive session with a sized connection pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    apihelper.session = session
+    return session
+
+
+class _StatusMessage:
+    def __init__(self):
+        self.message_id = None
+        # Latest queued update that later status() calls may still overwrite
+        self.open_update = None
+
+
+class _StatusUpdate:
+    def __init__(self, text):
+        self.text = text
+        # 429 answers so far, shared by every attempt at this update
+        self.retries = 0
+
+
+class _Message:
+    def __init__(self, text, kwargs):
+        self.text = text
+        self.kwargs = kwargs
+        self.retries = 0
+
+
+class Outbox:
+    """
+    Asynchronous, rate-limited sender for bot messages.
+
+    send() and status() return immediately. Messages for one chat are
+    delivered in order, each once both the chat's token bucket and the
+    global one have a token. A throttled message goes back to the head of
+    its chat's queue with a not-before time instead of sleeping, so the
+    sender threads keep delivering to other chats. status() keeps one progress message per
+    chat: the first call sends it, later calls edit it, and updates that pile
+    up before delivery collapse into a single edit with the latest text
+    (never reordering them past a message queued with send()).
+    """
+
+    def __init__(self, bot, senders=TELEGRAM_SENDERS):
+        self.bot = bot
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST)
+        self.workers = ChatWorkerPool(workers=senders, queue_size=1000, name='outbox')
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self._chat_buckets = {}
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self._chat_buckets) > 10000:
+                    self._prune_buckets()
+                bucket = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def _prune_buckets(self):
+        cutoff = time.monotonic() - 60
+        for chat_id in [c for c, b in self._chat_buckets.items() if b.idle_since() < cutoff]:
+            del self._chat_buckets[chat_id]
+
+    def _call(self, rate_chat_id, job, func, *args, **kwargs):
+        """
+        Call the Bot API under both rate limits. Raises RetryLater while a
+        bucket is empty or Telegram answers 429, so the pool runs the job
+        again after the wait.
+        """
+        chat_bucket = self._chat_bucket(rate_chat_id)
+        wait = chat_bucket.take()
+        if wait > 0:
+            raise RetryLater(wait)
+        wait = self.global_bucket.take()
+        if wait > 0:
+            chat_bucket.refund()
+            raise RetryLater(wait)
+        try:
+            return func(*args, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 429 or job.retries == TELEGRAM_SEND_RETRIES:
+                raise
+            job.retries += 1
+            self.rate_limited += 1
+            retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+            print(f"⚠️ Telegram rate limit for chat {rate_chat_id}, retrying in {retry_after}s")
+            raise RetryLater(retry_after)
+
+    def send(self, chat_id, text, reply_to=None, **kwargs):
+        """Queue a new message; reply_to is the message being answered"""
+        if reply_to is not None:
+            kwargs['reply_parameters'] = types.ReplyParameters(reply_to.message_id)
+        with self._lock:
+            state = self._status.get(chat_id)
+            if state is not None:
+                # Later status updates must not jump ahead of this message
+                state.open_update = None
+        return self.workers.submit(chat_id, self._deliver, chat_id, _Message(text, kwargs))
+
+    def reply_to(self, message, text, **kwargs):
+        return self.send(message.chat.id, text, reply_to=message, **kwargs)
+
+    def _deliver(self, chat_id, message):
+        try:
+            self._call(chat_id, message, self.bot.send_message, chat_id, message.text, **message.kwargs)
+            self.sent += 1
+        except RetryLater:
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Could not send message to {chat_id}: {e}")
+
+    def status(self, chat_id, text):
+        """Show progress in the chat's single status message"""
+        with self._lock:
+            state = self._status.setdefault(chat_id, _StatusMessage())
+            if state.open_update is not None:
+                state.open_update.text = text
+                self.coalesced += 1
+                return True
+            update = _StatusUpdate(text)
+            state.open_update = update
+        return self.workers.submit(chat_id, self._deliver_status, chat_id, state, update)
+
+    def _deliver_status(self, chat_id, state, update):
+        with self._lock:
+            if state.open_update is update:
+                state.open_update = None
+            text = update.text
+            message_id = state.message_id
+        try:
+            if message_id is None:
+                message = self._call(chat_id, update, self.bot.send_message, chat_id, text)
+                with self._lock:
+                    state.message_id = message.message_id
+                self.sent += 1
+            else:
+                self._call(chat_id, update, self.bot.edit_message_text, text, chat_id=chat_id, message_id=message_id)
+                self.edited += 1
+        except RetryLater:
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Could not update status for {chat_id}: {e}")
+
+    def end_status(self, chat_id):
+        """Forget the chat's status message so the next flow starts a new one"""
+        with self._lock:
+            state = self._status.pop(chat_id, None)
+            if state is not None:
+                state.open_update = None
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'edited': self.edited,
+            'coalesced': self.coalesced,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'queue_depth': self.workers.queue_depth(),
+        }
@@ -0,0 +1,103 @@
+"""
+Summarise a trace file written by tracing.py.
+
+    python trace_report.py                     # the bot's TRACE_FILE
+    python trace_report.py --trace 3f2a9c0d1b4e5f60
+    python trace_report.py old_traces.jsonl --since 3600 --json report.json
+
+Prints p50/p95/p99 latency and outcomes per step, and for --trace the
+waterfall of one flow's spans in the order they finished.
+"""
+import sys
+import json
+import time
+import argparse
+
+from bench_signup import percentile
+from tracing import TRACE_FILE
+
+
+def read_spans(paths, since=None):
+    cutoff = time.time() - since if since else None
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('kind') != 'span':
+                    continue
+                if cutoff and record.get('ts', 0) < cutoff:
+                    continue
+                yield record
+
+
+def step_breakdown(spans):
+    steps = {}
+    for span in spans:
+        entry = steps.setdefault((span['flow'], span['step']), {'durations': [], 'outcomes': {}})
+        entry['durations'].append(span['duration_ms'])
+        outcome = span.get('outcome', 'ok')
+        entry['outcomes'][outcome] = entry['outcomes'].get(outcome, 0) + 1
+
+    report = {}
+    for (flow, step), entry in sorted(steps.items()):
+        durations = entry['durations']
+        report[f"{flow}.{step}"] = {
+            'count': len(durations),
+            'mean_ms': sum(durations) / len(durations),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'total_ms': sum(durations),
+            'outcomes': entry['outcomes'],
+        }
+    return report
+
+
+def print_breakdown(report):
+    print(f"{'step':<30}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  outcomes")
+    for name, s in report.items():
+        outcomes = ', '.join(f"{k}={v}" for k, v in sorted(s['outcomes'].items()))
+        print(f"{name:<30}{s['count']:>6}{s['p50_ms']:>10.0f}{s['p95_ms']:>10.0f}{s['p99_ms']:>10.0f}  {outcomes}")
+
+
+def print_waterfall(spans, trace_id):
+    spans = sorted((s for s in spans if s.get('trace_id') == trace_id), key=lambda s: s['ts'])
+    if not spans:
+        print(f"No spans for trace {trace_id}")
+        return
+    # Spans are logged when they end, so their start is ts - duration
+    origin = min(s['ts'] - s['duration_ms'] / 1000 for s in spans)
+    print(f"Trace {trace_id} (user {spans[0].get('user_id')})")
+    for s in spans:
+        start_ms = (s['ts'] - origin) * 1000 - s['duration_ms']
+        print(f"  {start_ms:>9.0f} ms  +{s['duration_ms']:>8.0f} ms  {s['flow']}.{s['step']:<24} {s.get('outcome', '')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-step latency breakdown of signup traces')
+    parser.add_argument('files', nargs='*', default=[TRACE_FILE], help=f'trace files (default {TRACE_FILE})')
+    parser.add_argument('--trace', default=None, help='show the spans of one trace id')
+    parser.add_argument('--since', type=float, default=None, help='only spans from the last N seconds')
+    parser.add_argument('--json', default=None, help='also write the breakdown to this file')
+    args = parser.parse_args(argv)
+
+    spans = list(read_spans(args.files, args.since))
+    if args.trace:
+        print_waterfall(spans, args.trace)
+        return 0
+
+    report = step_breakdown(spans)
+    traces = len({s.get('trace_id') for s in spans})
+    print(f"📊 {len(spans)} spans from {traces} traces")
+    print_breakdown(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
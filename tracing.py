@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import queue
+import uuid
+import atexit
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import metrics
+
+# JSON-lines trace output; TRACE_FILE= (empty) turns tracing off
+TRACE_FILE = os.environ.get(
+    'TRACE_FILE', os.path.join(os.path.expanduser('~'), '.cache/automate/signup_traces.jsonl')
+)
+TRACE_MAX_MB = float(os.environ.get('TRACE_MAX_MB', 50))
+TRACE_BACKUPS = int(os.environ.get('TRACE_BACKUPS', 3))
+TRACE_QUEUE_SIZE = int(os.environ.get('TRACE_QUEUE_SIZE', 10000))
+
+TRACE_DROPPED = metrics.counter('trace_events_dropped_total', 'Trace events dropped because the writer fell behind')
+
+# (trace_id, user_id) of the flow running in this thread or asyncio task
+_current = contextvars.ContextVar('trace', default=(None, None))
+
+# Correlation id per user, so step 2 joins the trace step 1 started
+_trace_ids = OrderedDict()
+_trace_ids_lock = threading.Lock()
+MAX_TRACKED_USERS = 10000
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.trace, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: events are dropped when the queue is full"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            TRACE_DROPPED.inc()
+
+    def prepare(self, record):
+        # The formatter runs on the listener thread; keep the record as is
+        return record
+
+
+logger = logging.getLogger('automate.trace')
+logger.propagate = False
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _setup():
+    """Attach the queue handler and start the writer thread on first use"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None or not TRACE_FILE:
+            return
+        directory = os.path.dirname(TRACE_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            TRACE_FILE, maxBytes=int(TRACE_MAX_MB * 1024 * 1024), backupCount=TRACE_BACKUPS
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        events = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        logger.addHandler(_DroppingQueueHandler(events))
+        logger.setLevel(logging.INFO)
+        _listener = QueueListener(events, file_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def begin(user_id, new=False):
+    """
+    Bind the calling thread/task to user_id's trace and return its id.
+
+    new=True starts a fresh trace (a new signup attempt); otherwise the
+    user's current one is reused, or created if there is none.
+    """
+    with _trace_ids_lock:
+        trace_id = None if new else _trace_ids.get(user_id)
+        if trace_id is None:
+            trace_id = uuid.uuid4().hex[:16]
+            _trace_ids[user_id] = trace_id
+            while len(_trace_ids) > MAX_TRACKED_USERS:
+                _trace_ids.popitem(last=False)
+        _trace_ids.move_to_end(user_id)
+    _current.set((trace_id, user_id))
+    return trace_id
+
+
+def current_trace():
+    return _current.get()
+
+
+def event(kind, **fields):
+    """Queue one trace event tagged with the current correlation id"""
+    if not TRACE_FILE:
+        return
+    _setup()
+    trace_id, user_id = _current.get()
+    record = {
+        'ts': time.time(),
+        'kind': kind,
+        'trace_id': trace_id,
+        'user_id': user_id,
+        'pid': os.getpid(),
+        'thread': threading.current_thread().name,
+    }
+    record.update(fields)
+    logger.info(kind, extra={'trace': record})
+
+
+def record_span(flow, step, seconds, outcome):
+    event('span', flow=flow, step=step, duration_ms=round(seconds * 1000, 3), outcome=outcome)
+
+
+metrics.span_listeners.append(record_span)
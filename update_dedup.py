@@ -0,0 +1,60 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import metrics
+
+# Telegram redelivers an unacknowledged update for a while; remember ids this long
+UPDATE_DEDUP_WINDOW = float(os.environ.get('UPDATE_DEDUP_WINDOW', 600))
+UPDATE_DEDUP_SIZE = int(os.environ.get('UPDATE_DEDUP_SIZE', 50000))
+
+DUPLICATES_SUPPRESSED = metrics.counter('duplicates_suppressed_total', 'Redelivered updates and repeat signups that were dropped, by kind')
+
+
+class UpdateDeduplicator:
+    """
+    Remembers recently taken update_ids so a redelivered update is dropped
+    before it reaches a handler.
+
+    Ids are kept in arrival order and forgotten once they are older than
+    `window` seconds or more than `max_size` are held, whichever comes
+    first. An update that could not be queued is forgotten again so its
+    redelivery goes through.
+    """
+
+    def __init__(self, window=UPDATE_DEDUP_WINDOW, max_size=UPDATE_DEDUP_SIZE):
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.duplicates = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        # Caller holds the lock; ids were inserted in time order
+        cutoff = now - self.window
+        while self._seen:
+            update_id, seen_at = next(iter(self._seen.items()))
+            if seen_at >= cutoff and len(self._seen) <= self.max_size:
+                break
+            self._seen.popitem(last=False)
+
+    def claim(self, update_id):
+        """True the first time update_id is seen within the window, False for a duplicate"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if update_id in self._seen:
+                self.duplicates += 1
+                DUPLICATES_SUPPRESSED.inc(kind='update')
+                return False
+            self._seen[update_id] = now
+            return True
+
+    def forget(self, update_id):
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.time())
+            return {'tracked': len(self._seen), 'duplicates': self.duplicates, 'window': self.window}
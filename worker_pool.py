@@ -0,0 +1,228 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 4))
+# Updates allowed to wait, per worker thread
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', 100))
+WORKER_IDLE_INTERVAL = float(os.environ.get('WORKER_IDLE_INTERVAL', 30))
+
+
+class RetryLater(Exception):
+    """Raised by a queued call to run it again after `delay` seconds, ahead of the chat's later calls"""
+
+    def __init__(self, delay):
+        super().__init__(f"retry in {delay:.2f}s")
+        self.delay = delay
+
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.thread = None
+        # Chats pinned to this worker that have an update ready to run
+        self.ready = deque()
+        self.busy = False
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.failed = 0
+
+
+class ChatWorkerPool:
+    """
+    Bounded pool of worker threads for incoming updates.
+
+    Every chat has its own queue and at most one of its updates runs at a
+    time, so updates from the same chat run in order while different chats
+    run in parallel on whichever worker is free. A chat whose state is bound
+    to a thread (a sync Playwright session) is pinned to the worker running
+    it with pin(); its updates then wait for that worker alone until unpin().
+
+    A call that raises RetryLater is put back at the head of its chat's
+    queue and the chat sleeps until the delay has passed, while the worker
+    goes on with other chats.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS, queue_size=UPDATE_QUEUE_SIZE,
+                 idle_callback=None, idle_interval=WORKER_IDLE_INTERVAL, name='update-worker'):
+        self.name = name
+        self.idle_callback = idle_callback
+        self.idle_interval = idle_interval
+        self.started_at = time.time()
+        self.rejected = 0
+        self._workers = [_Worker(i) for i in range(max(1, workers))]
+        self.max_pending = max(1, queue_size) * len(self._workers)
+        self._chats = {}
+        self._running = set()
+        self._ready = deque()
+        self._pins = {}
+        # (due, seq, chat_id) for chats waiting out a RetryLater
+        self._delayed = []
+        self._seq = itertools.count()
+        self.retried = 0
+        self._pending = 0
+        self._current = threading.local()
+        self._cond = threading.Condition()
+        self._started = False
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return self
+            for worker in self._workers:
+                worker.thread = threading.Thread(
+                    target=self._run, args=(worker,),
+                    name=f"{self.name}-{worker.index}", daemon=True
+                )
+                worker.thread.start()
+            self._started = True
+        return self
+
+    def submit(self, chat_id, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) behind the chat's earlier updates; False if the pool is full"""
+        self.start()
+        with self._cond:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                print(f"⚠️ {self.name} queue full ({self._pending} waiting), rejecting update for chat {chat_id}")
+                return False
+            calls = self._chats.setdefault(chat_id, deque())
+            calls.append((func, args, kwargs))
+            self._pending += 1
+            if len(calls) == 1 and chat_id not in self._running:
+                self._make_ready(chat_id)
+        return True
+
+    def pin(self, chat_id):
+        """Run the chat's later updates on the calling worker (no-op off the pool's threads)"""
+        worker = getattr(self._current, 'worker', None)
+        if worker is None:
+            return False
+        with self._cond:
+            self._pins[chat_id] = worker
+        return True
+
+    def unpin(self, chat_id):
+        with self._cond:
+            return self._pins.pop(chat_id, None) is not None
+
+    def _make_ready(self, chat_id):
+        # Caller holds the lock
+        worker = self._pins.get(chat_id)
+        if worker is not None:
+            worker.ready.append(chat_id)
+        else:
+            self._ready.append(chat_id)
+        self._cond.notify_all()
+
+    def _take(self, worker):
+        # Caller holds the lock; pinned chats first, they have nowhere else to go
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._make_ready(heapq.heappop(self._delayed)[2])
+        if worker.ready:
+            chat_id = worker.ready.popleft()
+        elif self._ready:
+            chat_id = self._ready.popleft()
+        else:
+            return None
+        self._running.add(chat_id)
+        self._pending -= 1
+        return chat_id, self._chats[chat_id].popleft()
+
+    def _retry(self, chat_id, call, delay):
+        with self._cond:
+            self.retried += 1
+            self._running.discard(chat_id)
+            self._chats[chat_id].appendleft(call)
+            self._pending += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), chat_id))
+            self._cond.notify_all()
+
+    def _finish(self, chat_id):
+        with self._cond:
+            self._running.discard(chat_id)
+            if self._chats[chat_id]:
+                self._make_ready(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    def _run(self, worker):
+        self._current.worker = worker
+        # Lets the callback prepare per-thread state (browsers) before the first update arrives
+        self._idle(worker)
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.idle_interval
+                job = self._take(worker)
+                while job is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if self._delayed:
+                        remaining = min(remaining, max(0.0, self._delayed[0][0] - time.monotonic()))
+                    # Woken for every ready chat, including ones pinned elsewhere
+                    self._cond.wait(remaining)
+                    job = self._take(worker)
+            if job is None:
+                self._idle(worker)
+                continue
+
+            chat_id, call = job
+            func, args, kwargs = call
+            worker.busy = True
+            started = time.time()
+            retry = None
+            try:
+                func(*args, **kwargs)
+            except RetryLater as e:
+                retry = e.delay
+            except Exception as e:
+                worker.failed += 1
+                print(f"💥 Worker {worker.index} error: {e}")
+            finally:
+                worker.busy_seconds += time.time() - started
+                worker.busy = False
+                if retry is not None:
+                    self._retry(chat_id, call, retry)
+                else:
+                    worker.processed += 1
+                    self._finish(chat_id)
+
+            with self._cond:
+                idle = not worker.ready and not self._ready
+            if idle:
+                self._idle(worker)
+
+    def _idle(self, worker):
+        if self.idle_callback is None:
+            return
+        try:
+            self.idle_callback()
+        except Exception as e:
+            print(f"⚠️ Worker {worker.index} idle callback error: {e}")
+
+    def queue_depth(self):
+        return self._pending
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        busy = sum(1 for w in self._workers if w.busy)
+        with self._cond:
+            chats = len(self._chats)
+            pinned = len(self._pins)
+        return {
+            'workers': len(self._workers),
+            'busy_workers': busy,
+            'queue_depth': self.queue_depth(),
+            'queued_chats': chats,
+            'pinned_chats': pinned,
+            'utilisation': round(sum(w.busy_seconds for w in self._workers) / (elapsed * len(self._workers)), 4),
+            'processed': sum(w.processed for w in self._workers),
+            'failed': sum(w.failed for w in self._workers),
+            'rejected': self.rejected,
+            'retried': self.retried,
+        }